@@ -4,7 +4,7 @@ Simple, reliable API that works everywhere.
 Now with WebSocket support for real-time zone delivery.
 """
 print("DEBUG: Starting app.py imports...", flush=True)
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, g, Response
 print("DEBUG: Imported Flask", flush=True)
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit, join_room, leave_room
@@ -17,27 +17,78 @@ from datetime import datetime, timedelta, timezone
 import logging
 import secrets
 import string
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 import hmac
 import hashlib
 import requests
 import traceback
+import threading
+import time
+from functools import lru_cache
+from scheduler import LeaderScheduler
+from email_outbox import EmailOutbox, SendGridTransport, SMTPTransport, FallbackTransport
+from health_prober import HealthProber
+import async_runtime
+import socketio_queue
+from metrics import MetricsRegistry
+from sql_profiler import SQLProfiler
+from json_provider import FastJSONProvider, SocketIOJSON
+from compression import ResponseOptimizer, strong_etag
+from panel_cache import PanelCache, diff_keyed, new_rows
+from presence import PresenceRegistry
 
 app = Flask(__name__)
+# orjson-backed jsonify()/get_json() (stdlib fallback); datetimes serialize as 'Z'-suffixed UTC
+app.json = FastJSONProvider(app)
 
 # Initialize SocketIO for real-time zone delivery
-# Using threading mode for Azure compatibility (works with sync gunicorn workers)
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading', logger=False, engineio_logger=False)
+# async_mode follows the gunicorn worker class (eventlet in startup.txt, threading
+# under the dev server); override with SOCKETIO_ASYNC_MODE
+# SOCKETIO_MESSAGE_QUEUE (e.g. redis://...) lets any worker emit to rooms hosted on another
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=async_runtime.ASYNC_MODE, logger=False, engineio_logger=False,
+                    json=SocketIOJSON, **socketio_queue.socketio_options())
+SOCKETIO_DISTRIBUTED = socketio_queue.message_queue_url() is not None
+# Under green workers a blocking query would stall every socket on the worker
+async_runtime.install_green_psycopg2()
 
 # WebSocket connection tracking for dashboard metrics
 websocket_stats = {
     'connected_clients': {},  # sid -> {connected_at, symbols}
     'total_connections': 0,
-    'server_start_time': datetime.now(timezone.utc).isoformat()
+    'server_start_time': datetime.now(timezone.utc).isoformat(),
+    'message_queue': socketio_queue.describe()  # "memory" = this process only
 }
 
+# The one definition of "online": a license is online while any source (bot heartbeat,
+# API call, copier follower, socket) touched it within PRESENCE_TTL_SECONDS.
+# Session ownership (who may run a symbol) stays in active_sessions.
+PRESENCE_TTL_SECONDS = float(os.environ.get("PRESENCE_TTL_SECONDS", "120"))
+presence = PresenceRegistry(ttl_seconds=PRESENCE_TTL_SECONDS)
+
+# Prometheus metrics (exported at /metrics); shards are per OS thread
+metrics = MetricsRegistry(threading_module=async_runtime.real_threading)
+http_requests_total = metrics.counter(
+    "quotrading_http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+http_request_duration = metrics.histogram(
+    "quotrading_http_request_duration_seconds", "HTTP request latency by route", ("method", "route"))
+rate_limit_rejections_total = metrics.counter(
+    "quotrading_rate_limit_rejections_total", "Requests rejected by the per-license rate limiter", ("endpoint",))
+copier_signals_broadcast_total = metrics.counter(
+    "quotrading_copier_signals_broadcast_total", "Copier signals received from masters", ("action",))
+copier_signals_delivered_total = metrics.counter(
+    "quotrading_copier_signals_delivered_total", "Copier signals handed to followers", ("channel",))
+
+# SQL profiler (per worker, /api/admin/sql-profile): times every statement by fingerprint
+# and captures EXPLAIN for statements slower than SQL_SLOW_QUERY_MS
+SQL_PROFILER_ENABLED = os.environ.get("SQL_PROFILER_ENABLED", "true").lower() == "true"
+_sql_profiler = SQLProfiler(
+    slow_ms=float(os.environ.get("SQL_SLOW_QUERY_MS", "250")),
+    explain=os.environ.get("SQL_PROFILER_EXPLAIN", "true").lower() == "true",
+    enabled=SQL_PROFILER_ENABLED,
+    threading_module=async_runtime.real_threading
+)
+# Dict-row cursor for call sites that want timing; plain RealDictCursor stays untimed
+ProfiledDictCursor = _sql_profiler.profiled(RealDictCursor) if SQL_PROFILER_ENABLED else RealDictCursor
+
 # Security: Request size limit (prevent memory exhaustion attacks)
 app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024  # 10MB max request size
 
@@ -108,6 +159,8 @@ SMTP_SERVER = os.environ.get("SMTP_SERVER", "smtp.gmail.com")
 SMTP_PORT = int(os.environ.get("SMTP_PORT", "587"))
 SMTP_USERNAME = os.environ.get("SMTP_USERNAME", "")
 SMTP_PASSWORD = os.environ.get("SMTP_PASSWORD", "")
+# An explicit SMTP_SERVER enables SMTP without credentials (e.g. a local aiosmtpd stand-in)
+SMTP_CONFIGURED = bool(os.environ.get("SMTP_SERVER")) or bool(SMTP_USERNAME and SMTP_PASSWORD)
 FROM_EMAIL = os.environ.get("FROM_EMAIL", "noreply@quotrading.com")
 
 # Download link for the bot EXE (Azure Blob Storage)
@@ -120,6 +173,10 @@ SESSION_TIMEOUT_SECONDS = int(os.environ.get("SESSION_TIMEOUT_SECONDS", "60"))
 
 # Connection pool for PostgreSQL (reuse connections)
 _db_pool = None
+# Separate pool for real OS threads (email, health probes) under eventlet
+_offload_db_pool = None
+_offload_db_pool_lock = async_runtime.real_threading.Lock()
+OFFLOAD_DB_POOL_MAX = int(os.environ.get("OFFLOAD_DB_POOL_MAX", "4"))
 
 def mask_sensitive(value: str, visible_chars: int = 4) -> str:
     """Mask sensitive data for logging (e.g., 'ABC123XYZ' -> 'ABC1...XYZ')
@@ -183,756 +240,560 @@ def format_datetime_utc(dt):
     
     return iso_str
 
-def send_license_email(email, license_key, whop_user_id=None, whop_membership_id=None):
-    logging.info(f"🔍 send_license_email() called for {mask_email(email)}, license {mask_sensitive(license_key)}")
-    logging.info(f"🔍 SENDGRID_API_KEY present: {bool(SENDGRID_API_KEY)}")
-    logging.info(f"🔍 FROM_EMAIL: {FROM_EMAIL}")
+def render_license_email(license_key, whop_user_id=None, whop_membership_id=None):
+    """Render the license key email (subject, html_body)"""
+    subject = "🚀 Your QuoTrading AI License Key"
+    
+    # Build Whop ID display if available
+    whop_id_html = ""
+    if whop_user_id:
+        whop_id_html = f"""<p style="color: #334155; font-size: 14px; line-height: 1.6; margin: 0;">
+                            <strong>Whop ID:</strong> <a href="https://whop.com" style="color: #667eea; text-decoration: none;">{whop_user_id}</a>
+                        </p>"""
+    
+    # Build order link for footer if we have membership ID
+    order_link_html = ""
+    if whop_membership_id:
+        order_link_html = f"""
+                        <div style="background: #f8fafc; padding: 20px; border-radius: 8px; margin: 24px 0 0 0; text-align: center;">
+                            <p style="color: #64748b; font-size: 14px; line-height: 1.6; margin: 0 0 12px 0;">
+                                <strong>Order Details</strong>
+                            </p>
+                            <p style="color: #334155; font-size: 13px; line-height: 1.6; margin: 0 0 12px 0;">
+                                Invoice: R-{whop_membership_id[-8:]}
+                            </p>
+                            <p style="margin: 0;">
+                                <a href="https://whop.com/hub/memberships/{whop_membership_id}" style="display: inline-block; background: #667eea; color: #ffffff; padding: 10px 20px; border-radius: 6px; text-decoration: none; font-size: 14px; font-weight: 600; margin-right: 8px;">Access Order</a>
+                                <a href="https://whop.com/hub/memberships/{whop_membership_id}/invoice" style="display: inline-block; background: #ffffff; color: #667eea; padding: 10px 20px; border-radius: 6px; text-decoration: none; font-size: 14px; font-weight: 600; border: 2px solid #667eea;">View Invoice</a>
+                            </p>
+                        </div>
+        """
     
-    try:
-        subject = "🚀 Your QuoTrading AI License Key"
-        
-        # Build Whop ID display if available
-        whop_id_html = ""
-        if whop_user_id:
-            whop_id_html = f"""<p style="color: #334155; font-size: 14px; line-height: 1.6; margin: 0;">
-                                <strong>Whop ID:</strong> <a href="https://whop.com" style="color: #667eea; text-decoration: none;">{whop_user_id}</a>
-                            </p>"""
-        
-        # Build order link for footer if we have membership ID
-        order_link_html = ""
-        if whop_membership_id:
-            order_link_html = f"""
-                            <div style="background: #f8fafc; padding: 20px; border-radius: 8px; margin: 24px 0 0 0; text-align: center;">
-                                <p style="color: #64748b; font-size: 14px; line-height: 1.6; margin: 0 0 12px 0;">
-                                    <strong>Order Details</strong>
-                                </p>
-                                <p style="color: #334155; font-size: 13px; line-height: 1.6; margin: 0 0 12px 0;">
-                                    Invoice: R-{whop_membership_id[-8:]}
-                                </p>
-                                <p style="margin: 0;">
-                                    <a href="https://whop.com/hub/memberships/{whop_membership_id}" style="display: inline-block; background: #667eea; color: #ffffff; padding: 10px 20px; border-radius: 6px; text-decoration: none; font-size: 14px; font-weight: 600; margin-right: 8px;">Access Order</a>
-                                    <a href="https://whop.com/hub/memberships/{whop_membership_id}/invoice" style="display: inline-block; background: #ffffff; color: #667eea; padding: 10px 20px; border-radius: 6px; text-decoration: none; font-size: 14px; font-weight: 600; border: 2px solid #667eea;">View Invoice</a>
-                                </p>
-                            </div>
-            """
-        
-        html_body = f"""
+    html_body = f"""
 <!DOCTYPE html>
 <html>
 <head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+<meta charset="UTF-8">
+<meta name="viewport" content="width=device-width, initial-scale=1.0">
 </head>
 <body style="margin: 0; padding: 0; background-color: #f8fafc; font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif;">
-    <table width="100%" cellpadding="0" cellspacing="0" style="background-color: #f8fafc; padding: 40px 20px;">
-        <tr>
-            <td align="center">
-                <table width="600" cellpadding="0" cellspacing="0" style="background-color: #ffffff; border-radius: 16px; box-shadow: 0 4px 6px rgba(0, 0, 0, 0.07); overflow: hidden;">
-                    
-                    <!-- Header -->
-                    <tr>
-                        <td style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 40px; text-align: center;">
-                            <h1 style="color: #ffffff; margin: 0; font-size: 28px; font-weight: 700; letter-spacing: -0.5px;">
-                                Welcome to QuoTrading AI
-                            </h1>
-                            <p style="color: rgba(255, 255, 255, 0.9); margin: 10px 0 0 0; font-size: 16px;">
-                                Your AI-powered trading journey starts now
-                            </p>
-                        </td>
-                    </tr>
-                    
-                    <!-- Whop ID Section -->
-                    <tr>
-                        <td style="background: #f8fafc; padding: 20px 40px; border-bottom: 1px solid #e2e8f0;">
-                            {whop_id_html}
-                        </td>
-                    </tr>
-                    
-                    <!-- License Key Box -->
-                    <tr>
-                        <td style="padding: 40px;">
-                            <p style="color: #334155; font-size: 16px; line-height: 1.6; margin: 0 0 24px 0;">
-                                Thank you for subscribing! Your license key is unique to your account — do not share it. Save this email for future reference.
-                            </p>
-                            
-                            <div style="background: #f8fafc; border-left: 4px solid #667eea; padding: 24px; border-radius: 8px; margin: 24px 0;">
-                                <p style="color: #64748b; font-size: 13px; font-weight: 600; text-transform: uppercase; letter-spacing: 0.5px; margin: 0 0 12px 0;">
-                                    Your License Key
-                                </p>
-                                <p style="font-size: 26px; font-weight: 900; color: #667eea; letter-spacing: 2px; font-family: 'Courier New', monospace; margin: 0; word-break: break-all; line-height: 1.4; background: #f1f5f9; padding: 16px; border-radius: 6px; border: 3px solid #667eea;">
-                                    {license_key}
-                                </p>
-                            </div>
-                            
-                            <!-- Getting Started -->
-                            <h2 style="color: #1e293b; font-size: 20px; font-weight: 700; margin: 32px 0 16px 0;">
-                                Getting Started
-                            </h2>
-                            
-                            <table width="100%" cellpadding="0" cellspacing="0" style="margin: 0 0 24px 0;">
-                                <tr>
-                                    <td style="padding: 8px 0;">
-                                        <p style="color: #334155; font-size: 15px; line-height: 1.6; margin: 0;">
-                                            <strong style="color: #667eea;">1.</strong> <strong>Download the AI</strong> — Check your email for the download link
-                                        </p>
-                                    </td>
-                                </tr>
-                                <tr>
-                                    <td style="padding: 8px 0;">
-                                        <p style="color: #334155; font-size: 15px; line-height: 1.6; margin: 0;">
-                                            <strong style="color: #667eea;">2.</strong> <strong>Launch the application</strong> — Run the QuoTrading AI on your computer
-                                        </p>
-                                    </td>
-                                </tr>
-                                <tr>
-                                    <td style="padding: 8px 0;">
-                                        <p style="color: #334155; font-size: 15px; line-height: 1.6; margin: 0;">
-                                            <strong style="color: #667eea;">3.</strong> <strong>Enter your license key</strong> — Paste the key above when prompted
-                                        </p>
-                                    </td>
-                                </tr>
-                                <tr>
-                                    <td style="padding: 8px 0;">
-                                        <p style="color: #334155; font-size: 15px; line-height: 1.6; margin: 0;">
-                                            <strong style="color: #667eea;">4.</strong> <strong>Connect your broker</strong> — Enter your brokerage API credentials (username and API key)
-                                        </p>
-                                    </td>
-                                </tr>
-                                <tr>
-                                    <td style="padding: 8px 0;">
-                                        <p style="color: #334155; font-size: 15px; line-height: 1.6; margin: 0;">
-                                            <strong style="color: #667eea;">5.</strong> <strong>Start trading</strong> — Begin using AI-powered market analysis
-                                        </p>
-                                    </td>
-                                </tr>
-                            </table>
-                            
-                            <!-- Important Notes -->
-                            <div style="background: #fef3c7; border-left: 4px solid #f59e0b; padding: 16px 20px; border-radius: 8px; margin: 24px 0 16px 0;">
-                                <p style="color: #92400e; font-size: 14px; font-weight: 600; margin: 0 0 12px 0;">
-                                    ⚠️ Important Information
-                                </p>
-                                <p style="color: #78350f; font-size: 14px; line-height: 1.8; margin: 0;">
-                                    • You'll need API credentials from your broker to connect (contact your broker for API access)
-                                </p>
-                            </div>
-                        </td>
-                    </tr>
-                    
-                    <!-- Order Details Section -->
-                    <tr>
-                        <td style="padding: 0 40px 24px 40px;">
-                            {order_link_html}
-                        </td>
-                    </tr>
-                    
-                    <!-- Support Section -->
-                    <tr>
-                        <td style="padding: 0 40px 40px 40px;">
-                            <h2 style="color: #1e293b; font-size: 20px; font-weight: 700; margin: 0 0 16px 0;">
-                                Need Help?
-                            </h2>
-                            <p style="color: #334155; font-size: 15px; line-height: 1.6; margin: 0 0 12px 0;">
-                                <strong>📧 Email Support:</strong>
-                                <a href="mailto:support@quotrading.com" style="color: #667eea; text-decoration: none;">support@quotrading.com</a>
-                            </p>
-                            <p style="color: #334155; font-size: 15px; line-height: 1.6; margin: 0;">
-                                <strong>💬 Discord Community:</strong> <a href="https://discord.gg/mak4h8MygE" style="color: #667eea; text-decoration: none;">Join our Discord</a> for live support and to connect with other traders
+<table width="100%" cellpadding="0" cellspacing="0" style="background-color: #f8fafc; padding: 40px 20px;">
+    <tr>
+        <td align="center">
+            <table width="600" cellpadding="0" cellspacing="0" style="background-color: #ffffff; border-radius: 16px; box-shadow: 0 4px 6px rgba(0, 0, 0, 0.07); overflow: hidden;">
+                
+                <!-- Header -->
+                <tr>
+                    <td style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 40px; text-align: center;">
+                        <h1 style="color: #ffffff; margin: 0; font-size: 28px; font-weight: 700; letter-spacing: -0.5px;">
+                            Welcome to QuoTrading AI
+                        </h1>
+                        <p style="color: rgba(255, 255, 255, 0.9); margin: 10px 0 0 0; font-size: 16px;">
+                            Your AI-powered trading journey starts now
+                        </p>
+                    </td>
+                </tr>
+                
+                <!-- Whop ID Section -->
+                <tr>
+                    <td style="background: #f8fafc; padding: 20px 40px; border-bottom: 1px solid #e2e8f0;">
+                        {whop_id_html}
+                    </td>
+                </tr>
+                
+                <!-- License Key Box -->
+                <tr>
+                    <td style="padding: 40px;">
+                        <p style="color: #334155; font-size: 16px; line-height: 1.6; margin: 0 0 24px 0;">
+                            Thank you for subscribing! Your license key is unique to your account — do not share it. Save this email for future reference.
+                        </p>
+                        
+                        <div style="background: #f8fafc; border-left: 4px solid #667eea; padding: 24px; border-radius: 8px; margin: 24px 0;">
+                            <p style="color: #64748b; font-size: 13px; font-weight: 600; text-transform: uppercase; letter-spacing: 0.5px; margin: 0 0 12px 0;">
+                                Your License Key
                             </p>
-                        </td>
-                    </tr>
-                    
-                    <!-- Footer -->
-                    <tr>
-                        <td style="background: #f8fafc; padding: 32px; text-align: center; border-top: 1px solid #e2e8f0;">
-                            <p style="color: #64748b; font-size: 13px; line-height: 1.6; margin: 0 0 8px 0;">
-                                Your subscription renews monthly and can be managed anytime from your Whop dashboard.
+                            <p style="font-size: 26px; font-weight: 900; color: #667eea; letter-spacing: 2px; font-family: 'Courier New', monospace; margin: 0; word-break: break-all; line-height: 1.4; background: #f1f5f9; padding: 16px; border-radius: 6px; border: 3px solid #667eea;">
+                                {license_key}
                             </p>
-                            <p style="color: #94a3b8; font-size: 12px; margin: 0 0 12px 0;">
-                                © 2025 QuoTrading. All rights reserved.
+                        </div>
+                        
+                        <!-- Getting Started -->
+                        <h2 style="color: #1e293b; font-size: 20px; font-weight: 700; margin: 32px 0 16px 0;">
+                            Getting Started
+                        </h2>
+                        
+                        <table width="100%" cellpadding="0" cellspacing="0" style="margin: 0 0 24px 0;">
+                            <tr>
+                                <td style="padding: 8px 0;">
+                                    <p style="color: #334155; font-size: 15px; line-height: 1.6; margin: 0;">
+                                        <strong style="color: #667eea;">1.</strong> <strong>Download the AI</strong> — Check your email for the download link
+                                    </p>
+                                </td>
+                            </tr>
+                            <tr>
+                                <td style="padding: 8px 0;">
+                                    <p style="color: #334155; font-size: 15px; line-height: 1.6; margin: 0;">
+                                        <strong style="color: #667eea;">2.</strong> <strong>Launch the application</strong> — Run the QuoTrading AI on your computer
+                                    </p>
+                                </td>
+                            </tr>
+                            <tr>
+                                <td style="padding: 8px 0;">
+                                    <p style="color: #334155; font-size: 15px; line-height: 1.6; margin: 0;">
+                                        <strong style="color: #667eea;">3.</strong> <strong>Enter your license key</strong> — Paste the key above when prompted
+                                    </p>
+                                </td>
+                            </tr>
+                            <tr>
+                                <td style="padding: 8px 0;">
+                                    <p style="color: #334155; font-size: 15px; line-height: 1.6; margin: 0;">
+                                        <strong style="color: #667eea;">4.</strong> <strong>Connect your broker</strong> — Enter your brokerage API credentials (username and API key)
+                                    </p>
+                                </td>
+                            </tr>
+                            <tr>
+                                <td style="padding: 8px 0;">
+                                    <p style="color: #334155; font-size: 15px; line-height: 1.6; margin: 0;">
+                                        <strong style="color: #667eea;">5.</strong> <strong>Start trading</strong> — Begin using AI-powered market analysis
+                                    </p>
+                                </td>
+                            </tr>
+                        </table>
+                        
+                        <!-- Important Notes -->
+                        <div style="background: #fef3c7; border-left: 4px solid #f59e0b; padding: 16px 20px; border-radius: 8px; margin: 24px 0 16px 0;">
+                            <p style="color: #92400e; font-size: 14px; font-weight: 600; margin: 0 0 12px 0;">
+                                ⚠️ Important Information
                             </p>
-                            <p style="color: #94a3b8; font-size: 11px; margin: 0;">
-                                This is a transactional email for your license purchase. To manage your subscription, visit 
-                                <a href="https://whop.com/hub/memberships" style="color: #667eea; text-decoration: none;">Whop Dashboard</a>
+                            <p style="color: #78350f; font-size: 14px; line-height: 1.8; margin: 0;">
+                                • You'll need API credentials from your broker to connect (contact your broker for API access)
                             </p>
-                        </td>
-                    </tr>
-                    
-                </table>
-            </td>
-        </tr>
-    </table>
+                        </div>
+                    </td>
+                </tr>
+                
+                <!-- Order Details Section -->
+                <tr>
+                    <td style="padding: 0 40px 24px 40px;">
+                        {order_link_html}
+                    </td>
+                </tr>
+                
+                <!-- Support Section -->
+                <tr>
+                    <td style="padding: 0 40px 40px 40px;">
+                        <h2 style="color: #1e293b; font-size: 20px; font-weight: 700; margin: 0 0 16px 0;">
+                            Need Help?
+                        </h2>
+                        <p style="color: #334155; font-size: 15px; line-height: 1.6; margin: 0 0 12px 0;">
+                            <strong>📧 Email Support:</strong>
+                            <a href="mailto:support@quotrading.com" style="color: #667eea; text-decoration: none;">support@quotrading.com</a>
+                        </p>
+                        <p style="color: #334155; font-size: 15px; line-height: 1.6; margin: 0;">
+                            <strong>💬 Discord Community:</strong> <a href="https://discord.gg/mak4h8MygE" style="color: #667eea; text-decoration: none;">Join our Discord</a> for live support and to connect with other traders
+                        </p>
+                    </td>
+                </tr>
+                
+                <!-- Footer -->
+                <tr>
+                    <td style="background: #f8fafc; padding: 32px; text-align: center; border-top: 1px solid #e2e8f0;">
+                        <p style="color: #64748b; font-size: 13px; line-height: 1.6; margin: 0 0 8px 0;">
+                            Your subscription renews monthly and can be managed anytime from your Whop dashboard.
+                        </p>
+                        <p style="color: #94a3b8; font-size: 12px; margin: 0 0 12px 0;">
+                            © 2025 QuoTrading. All rights reserved.
+                        </p>
+                        <p style="color: #94a3b8; font-size: 11px; margin: 0;">
+                            This is a transactional email for your license purchase. To manage your subscription, visit 
+                            <a href="https://whop.com/hub/memberships" style="color: #667eea; text-decoration: none;">Whop Dashboard</a>
+                        </p>
+                    </td>
+                </tr>
+                
+            </table>
+        </td>
+    </tr>
+</table>
 </body>
 </html>
-    """
-        
-        # Try SendGrid first (preferred), fall back to SMTP
-        if SENDGRID_API_KEY:
-            logging.info(f"🔍 Attempting SendGrid email to {mask_email(email)}")
-            try:
-                payload = {
-                    "personalizations": [{"to": [{"email": email}]}],
-                    "from": {"email": FROM_EMAIL, "name": "QuoTrading"},
-                    "reply_to": {"email": "support@quotrading.com", "name": "QuoTrading Support"},
-                    "subject": subject,
-                    "content": [{"type": "text/html", "value": html_body}],
-                    "tracking_settings": {
-                        "click_tracking": {"enable": True},
-                        "open_tracking": {"enable": True}
-                    },
-                    "mail_settings": {
-                        "bypass_list_management": {"enable": False},
-                        "footer": {"enable": False}
-                    }
-                }
-                # Don't log payload - contains email addresses
+"""
+    
+    return subject, html_body
+
+def send_license_email(email, license_key, whop_user_id=None, whop_membership_id=None):
+    """Send the license key email to a new subscriber"""
+    logging.info(f"🔍 send_license_email() called for {mask_email(email)}, license {mask_sensitive(license_key)}")
+    subject, html_body = render_license_email(license_key, whop_user_id, whop_membership_id)
+    return queue_email(email, subject, html_body, "license")
+
+@lru_cache(maxsize=256)
+def render_renewal_email(renewal_date, next_billing_date, whop_membership_id=None):
+    """Render the subscription renewal email (subject, html_body)"""
+    subject = "✅ QuoTrading AI Subscription Renewed"
+    
+    # Build order link if we have membership ID
+    order_link_html = ""
+    if whop_membership_id:
+        order_link_html = f"""
+                        <div style="background: #f8fafc; padding: 20px; border-radius: 8px; margin: 24px 0 0 0; text-align: center;">
+                            <p style="margin: 0;">
+                                <a href="https://whop.com/hub/memberships/{whop_membership_id}" style="display: inline-block; background: #667eea; color: #ffffff; padding: 12px 24px; border-radius: 6px; text-decoration: none; font-size: 14px; font-weight: 600;">Manage Subscription</a>
+                            </p>
+                        </div>
+        """
+    
+    html_body = f"""
+<!DOCTYPE html>
+<html>
+<head>
+<meta charset="UTF-8">
+<meta name="viewport" content="width=device-width, initial-scale=1.0">
+</head>
+<body style="margin: 0; padding: 0; background-color: #f8fafc; font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif;">
+<table width="100%" cellpadding="0" cellspacing="0" style="background-color: #f8fafc; padding: 40px 20px;">
+    <tr>
+        <td align="center">
+            <table width="600" cellpadding="0" cellspacing="0" style="background-color: #ffffff; border-radius: 16px; box-shadow: 0 4px 6px rgba(0, 0, 0, 0.07); overflow: hidden;">
                 
-                response = requests.post(
-                    "https://api.sendgrid.com/v3/mail/send",
-                    headers={
-                        "Authorization": f"Bearer {SENDGRID_API_KEY}",
-                        "Content-Type": "application/json"
-                    },
-                    json=payload,
-                    timeout=10
-                )
-                logging.info(f"🔍 SendGrid response: status={response.status_code}")
+                <!-- Header -->
+                <tr>
+                    <td style="background: linear-gradient(135deg, #10b981 0%, #059669 100%); padding: 40px; text-align: center;">
+                        <h1 style="color: #ffffff; margin: 0; font-size: 28px; font-weight: 700; letter-spacing: -0.5px;">
+                            ✅ Subscription Renewed
+                        </h1>
+                        <p style="color: rgba(255, 255, 255, 0.9); margin: 10px 0 0 0; font-size: 16px;">
+                            Your QuoTrading AI subscription has been renewed
+                        </p>
+                    </td>
+                </tr>
                 
-                if response.status_code == 202:
-                    logging.info(f"✅ SendGrid email sent successfully to {mask_email(email)}")
-                    return True
-                else:
-                    logging.error(f"❌ SendGrid failed: {response.status_code}")
-                    logging.warning(f"Trying SMTP fallback")
-            except Exception as e:
-                logging.error(f"❌ SendGrid exception: {type(e).__name__}: {str(e)}")
-                logging.warning(f"Trying SMTP fallback")
-        else:
-            logging.warning(f"⚠️ SENDGRID_API_KEY not configured")
-        
-        # Fallback to SMTP (Gmail, etc.)
-        if SMTP_USERNAME and SMTP_PASSWORD:
-            logging.info(f"🔍 Attempting SMTP email to {mask_email(email)}")
-            try:
-                msg = MIMEMultipart('alternative')
-                msg['Subject'] = subject
-                msg['From'] = FROM_EMAIL
-                msg['To'] = email
-                msg.attach(MIMEText(html_body, 'html'))
+                <!-- Content -->
+                <tr>
+                    <td style="padding: 40px;">
+                        <p style="color: #334155; font-size: 16px; line-height: 1.6; margin: 0 0 24px 0;">
+                            Great news! Your monthly QuoTrading AI subscription was successfully renewed on <strong>{renewal_date}</strong>.
+                        </p>
+                        
+                        <div style="background: linear-gradient(135deg, #f1f5f9 0%, #e2e8f0 100%); border-left: 4px solid #10b981; padding: 24px; border-radius: 8px; margin: 24px 0;">
+                            <p style="color: #64748b; font-size: 13px; font-weight: 600; text-transform: uppercase; letter-spacing: 0.5px; margin: 0 0 12px 0;">
+                                Renewal Details
+                            </p>
+                            <p style="color: #334155; font-size: 15px; line-height: 1.8; margin: 0 0 8px 0;">
+                                <strong>Renewed:</strong> {renewal_date}
+                            </p>
+                            <p style="color: #334155; font-size: 15px; line-height: 1.8; margin: 0;">
+                                <strong>Next Billing Date:</strong> {next_billing_date}
+                            </p>
+                        </div>
+                        
+                        <p style="color: #334155; font-size: 15px; line-height: 1.6; margin: 24px 0 0 0;">
+                            Your AI continues to analyze markets and provide trading signals. No action needed — keep trading!
+                        </p>
+                        {order_link_html}
+                    </td>
+                </tr>
                 
-                with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-                    server.starttls()
-                    server.login(SMTP_USERNAME, SMTP_PASSWORD)
-                    server.send_message(msg)
-                logging.info(f"✅ SMTP email sent successfully to {mask_email(email)}")
-                return True
-            except Exception as e:
-                logging.error(f"❌ SMTP exception: {type(e).__name__}: {str(e)}")
-                logging.error(f"❌ No email method worked")
-                return False
-        else:
-            logging.error(f"❌ No email method configured - SMTP credentials missing")
-            return False
-            
-    except Exception as e:
-        logging.error(f"❌ CRITICAL ERROR in send_license_email: {type(e).__name__}: {str(e)}")
-        logging.error(f"Traceback: {traceback.format_exc()}")
-        return False
+                <!-- Footer -->
+                <tr>
+                    <td style="background: #f8fafc; padding: 32px; text-align: center; border-top: 1px solid #e2e8f0;">
+                        <p style="color: #64748b; font-size: 13px; line-height: 1.6; margin: 0 0 8px 0;">
+                            Questions? Contact <a href="mailto:support@quotrading.com" style="color: #667eea; text-decoration: none;">support@quotrading.com</a>
+                        </p>
+                        <p style="color: #94a3b8; font-size: 12px; margin: 0;">
+                            © 2025 QuoTrading. All rights reserved.
+                        </p>
+                    </td>
+                </tr>
+                
+            </table>
+        </td>
+    </tr>
+</table>
+</body>
+</html>
+"""
+    
+    return subject, html_body
 
 def send_renewal_email(email, renewal_date, next_billing_date, whop_membership_id=None):
     """Send subscription renewal confirmation email"""
     logging.info(f"🔍 Sending renewal email to {mask_email(email)}")
+    subject, html_body = render_renewal_email(renewal_date, next_billing_date, whop_membership_id)
+    return queue_email(email, subject, html_body, "renewal")
+
+@lru_cache(maxsize=256)
+def render_cancellation_email(cancellation_date, access_until_date, whop_membership_id=None):
+    """Render the subscription cancellation email (subject, html_body)"""
+    subject = "QuoTrading AI Subscription Cancelled"
+    
+    # Build reactivate link if we have membership ID
+    reactivate_link_html = ""
+    if whop_membership_id:
+        reactivate_link_html = f"""
+                        <div style="text-align: center; margin: 24px 0 0 0;">
+                            <p style="color: #334155; font-size: 15px; margin: 0 0 12px 0;">
+                                Changed your mind?
+                            </p>
+                            <a href="https://whop.com/hub/memberships/{whop_membership_id}" style="display: inline-block; background: #667eea; color: #ffffff; padding: 12px 24px; border-radius: 6px; text-decoration: none; font-size: 14px; font-weight: 600;">Reactivate Subscription</a>
+                        </div>
+        """
     
-    try:
-        subject = "✅ QuoTrading AI Subscription Renewed"
-        
-        # Build order link if we have membership ID
-        order_link_html = ""
-        if whop_membership_id:
-            order_link_html = f"""
-                            <div style="background: #f8fafc; padding: 20px; border-radius: 8px; margin: 24px 0 0 0; text-align: center;">
-                                <p style="margin: 0;">
-                                    <a href="https://whop.com/hub/memberships/{whop_membership_id}" style="display: inline-block; background: #667eea; color: #ffffff; padding: 12px 24px; border-radius: 6px; text-decoration: none; font-size: 14px; font-weight: 600;">Manage Subscription</a>
-                                </p>
-                            </div>
-            """
-        
-        html_body = f"""
+    html_body = f"""
 <!DOCTYPE html>
 <html>
 <head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+<meta charset="UTF-8">
+<meta name="viewport" content="width=device-width, initial-scale=1.0">
 </head>
 <body style="margin: 0; padding: 0; background-color: #f8fafc; font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif;">
-    <table width="100%" cellpadding="0" cellspacing="0" style="background-color: #f8fafc; padding: 40px 20px;">
-        <tr>
-            <td align="center">
-                <table width="600" cellpadding="0" cellspacing="0" style="background-color: #ffffff; border-radius: 16px; box-shadow: 0 4px 6px rgba(0, 0, 0, 0.07); overflow: hidden;">
-                    
-                    <!-- Header -->
-                    <tr>
-                        <td style="background: linear-gradient(135deg, #10b981 0%, #059669 100%); padding: 40px; text-align: center;">
-                            <h1 style="color: #ffffff; margin: 0; font-size: 28px; font-weight: 700; letter-spacing: -0.5px;">
-                                ✅ Subscription Renewed
-                            </h1>
-                            <p style="color: rgba(255, 255, 255, 0.9); margin: 10px 0 0 0; font-size: 16px;">
-                                Your QuoTrading AI subscription has been renewed
-                            </p>
-                        </td>
-                    </tr>
-                    
-                    <!-- Content -->
-                    <tr>
-                        <td style="padding: 40px;">
-                            <p style="color: #334155; font-size: 16px; line-height: 1.6; margin: 0 0 24px 0;">
-                                Great news! Your monthly QuoTrading AI subscription was successfully renewed on <strong>{renewal_date}</strong>.
-                            </p>
-                            
-                            <div style="background: linear-gradient(135deg, #f1f5f9 0%, #e2e8f0 100%); border-left: 4px solid #10b981; padding: 24px; border-radius: 8px; margin: 24px 0;">
-                                <p style="color: #64748b; font-size: 13px; font-weight: 600; text-transform: uppercase; letter-spacing: 0.5px; margin: 0 0 12px 0;">
-                                    Renewal Details
-                                </p>
-                                <p style="color: #334155; font-size: 15px; line-height: 1.8; margin: 0 0 8px 0;">
-                                    <strong>Renewed:</strong> {renewal_date}
-                                </p>
-                                <p style="color: #334155; font-size: 15px; line-height: 1.8; margin: 0;">
-                                    <strong>Next Billing Date:</strong> {next_billing_date}
-                                </p>
-                            </div>
-                            
-                            <p style="color: #334155; font-size: 15px; line-height: 1.6; margin: 24px 0 0 0;">
-                                Your AI continues to analyze markets and provide trading signals. No action needed — keep trading!
+<table width="100%" cellpadding="0" cellspacing="0" style="background-color: #f8fafc; padding: 40px 20px;">
+    <tr>
+        <td align="center">
+            <table width="600" cellpadding="0" cellspacing="0" style="background-color: #ffffff; border-radius: 16px; box-shadow: 0 4px 6px rgba(0, 0, 0, 0.07); overflow: hidden;">
+                
+                <!-- Header -->
+                <tr>
+                    <td style="background: linear-gradient(135deg, #64748b 0%, #475569 100%); padding: 40px; text-align: center;">
+                        <h1 style="color: #ffffff; margin: 0; font-size: 28px; font-weight: 700; letter-spacing: -0.5px;">
+                            Subscription Cancelled
+                        </h1>
+                        <p style="color: rgba(255, 255, 255, 0.9); margin: 10px 0 0 0; font-size: 16px;">
+                            We're sorry to see you go
+                        </p>
+                    </td>
+                </tr>
+                
+                <!-- Content -->
+                <tr>
+                    <td style="padding: 40px;">
+                        <p style="color: #334155; font-size: 16px; line-height: 1.6; margin: 0 0 24px 0;">
+                            Your QuoTrading AI subscription has been cancelled as of <strong>{cancellation_date}</strong>.
+                        </p>
+                        
+                        <div style="background: linear-gradient(135deg, #fef3c7 0%, #fde68a 100%); border-left: 4px solid #f59e0b; padding: 24px; border-radius: 8px; margin: 24px 0;">
+                            <p style="color: #92400e; font-size: 14px; font-weight: 600; margin: 0 0 12px 0;">
+                                ⚠️ Important Information
                             </p>
-                            {order_link_html}
-                        </td>
-                    </tr>
-                    
-                    <!-- Footer -->
-                    <tr>
-                        <td style="background: #f8fafc; padding: 32px; text-align: center; border-top: 1px solid #e2e8f0;">
-                            <p style="color: #64748b; font-size: 13px; line-height: 1.6; margin: 0 0 8px 0;">
-                                Questions? Contact <a href="mailto:support@quotrading.com" style="color: #667eea; text-decoration: none;">support@quotrading.com</a>
+                            <p style="color: #78350f; font-size: 14px; line-height: 1.8; margin: 0 0 8px 0;">
+                                • You'll retain access until <strong>{access_until_date}</strong>
                             </p>
-                            <p style="color: #94a3b8; font-size: 12px; margin: 0;">
-                                © 2025 QuoTrading. All rights reserved.
+                            <p style="color: #78350f; font-size: 14px; line-height: 1.8; margin: 0;">
+                                • No further charges will be made
                             </p>
-                        </td>
-                    </tr>
-                    
-                </table>
-            </td>
-        </tr>
-    </table>
-</body>
-</html>
-    """
-        
-        # Try SendGrid first
-        if SENDGRID_API_KEY:
-            logging.info(f"🔍 Attempting SendGrid renewal email to {mask_email(email)}")
-            try:
-                payload = {
-                    "personalizations": [{"to": [{"email": email}]}],
-                    "from": {"email": FROM_EMAIL, "name": "QuoTrading"},
-                    "subject": subject,
-                    "content": [{"type": "text/html", "value": html_body}]
-                }
-                
-                response = requests.post(
-                    "https://api.sendgrid.com/v3/mail/send",
-                    headers={
-                        "Authorization": f"Bearer {SENDGRID_API_KEY}",
-                        "Content-Type": "application/json"
-                    },
-                    json=payload
-                )
+                        </div>
+                        
+                        <p style="color: #334155; font-size: 15px; line-height: 1.6; margin: 24px 0 0 0;">
+                            Thank you for using QuoTrading AI. We'd love to have you back anytime!
+                        </p>
+                        {reactivate_link_html}
+                    </td>
+                </tr>
                 
-                logging.info(f"🔍 SendGrid response: status={response.status_code}")
+                <!-- Footer -->
+                <tr>
+                    <td style="background: #f8fafc; padding: 32px; text-align: center; border-top: 1px solid #e2e8f0;">
+                        <p style="color: #64748b; font-size: 13px; line-height: 1.6; margin: 0 0 8px 0;">
+                            Questions? Contact <a href="mailto:support@quotrading.com" style="color: #667eea; text-decoration: none;">support@quotrading.com</a>
+                        </p>
+                        <p style="color: #94a3b8; font-size: 12px; margin: 0;">
+                            © 2025 QuoTrading. All rights reserved.
+                        </p>
+                    </td>
+                </tr>
                 
-                if response.status_code == 202:
-                    logging.info(f"✅ SendGrid renewal email sent successfully to {mask_email(email)}")
-                    return True
-                else:
-                    logging.error(f"SendGrid renewal email failed: {response.status_code}")
-                    return False
-                    
-            except Exception as e:
-                logging.error(f"SendGrid renewal email error: {e}")
-                return False
-        else:
-            logging.error(f"❌ No email method configured")
-            return False
-            
-    except Exception as e:
-        logging.error(f"❌ ERROR in send_renewal_email: {e}")
-        return False
+            </table>
+        </td>
+    </tr>
+</table>
+</body>
+</html>
+"""
+    
+    return subject, html_body
 
 def send_cancellation_email(email, cancellation_date, access_until_date, whop_membership_id=None):
     """Send subscription cancellation confirmation email"""
     logging.info(f"🔍 Sending cancellation email to {mask_email(email)}")
+    subject, html_body = render_cancellation_email(cancellation_date, access_until_date, whop_membership_id)
+    return queue_email(email, subject, html_body, "cancellation")
+
+@lru_cache(maxsize=256)
+def render_payment_failed_email(retry_date, whop_membership_id=None):
+    """Render the payment failure email (subject, html_body)"""
+    subject = "⚠️ QuoTrading AI Payment Failed"
+    
+    # Build update payment link if we have membership ID
+    update_payment_html = ""
+    if whop_membership_id:
+        update_payment_html = f"""
+                        <div style="text-align: center; margin: 24px 0 0 0;">
+                            <a href="https://whop.com/hub/memberships/{whop_membership_id}" style="display: inline-block; background: #ef4444; color: #ffffff; padding: 12px 24px; border-radius: 6px; text-decoration: none; font-size: 14px; font-weight: 600;">Update Payment Method</a>
+                        </div>
+        """
     
-    try:
-        subject = "QuoTrading AI Subscription Cancelled"
-        
-        # Build reactivate link if we have membership ID
-        reactivate_link_html = ""
-        if whop_membership_id:
-            reactivate_link_html = f"""
-                            <div style="text-align: center; margin: 24px 0 0 0;">
-                                <p style="color: #334155; font-size: 15px; margin: 0 0 12px 0;">
-                                    Changed your mind?
-                                </p>
-                                <a href="https://whop.com/hub/memberships/{whop_membership_id}" style="display: inline-block; background: #667eea; color: #ffffff; padding: 12px 24px; border-radius: 6px; text-decoration: none; font-size: 14px; font-weight: 600;">Reactivate Subscription</a>
-                            </div>
-            """
-        
-        html_body = f"""
+    html_body = f"""
 <!DOCTYPE html>
 <html>
 <head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+<meta charset="UTF-8">
+<meta name="viewport" content="width=device-width, initial-scale=1.0">
 </head>
 <body style="margin: 0; padding: 0; background-color: #f8fafc; font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif;">
-    <table width="100%" cellpadding="0" cellspacing="0" style="background-color: #f8fafc; padding: 40px 20px;">
-        <tr>
-            <td align="center">
-                <table width="600" cellpadding="0" cellspacing="0" style="background-color: #ffffff; border-radius: 16px; box-shadow: 0 4px 6px rgba(0, 0, 0, 0.07); overflow: hidden;">
-                    
-                    <!-- Header -->
-                    <tr>
-                        <td style="background: linear-gradient(135deg, #64748b 0%, #475569 100%); padding: 40px; text-align: center;">
-                            <h1 style="color: #ffffff; margin: 0; font-size: 28px; font-weight: 700; letter-spacing: -0.5px;">
-                                Subscription Cancelled
-                            </h1>
-                            <p style="color: rgba(255, 255, 255, 0.9); margin: 10px 0 0 0; font-size: 16px;">
-                                We're sorry to see you go
-                            </p>
-                        </td>
-                    </tr>
-                    
-                    <!-- Content -->
-                    <tr>
-                        <td style="padding: 40px;">
-                            <p style="color: #334155; font-size: 16px; line-height: 1.6; margin: 0 0 24px 0;">
-                                Your QuoTrading AI subscription has been cancelled as of <strong>{cancellation_date}</strong>.
+<table width="100%" cellpadding="0" cellspacing="0" style="background-color: #f8fafc; padding: 40px 20px;">
+    <tr>
+        <td align="center">
+            <table width="600" cellpadding="0" cellspacing="0" style="background-color: #ffffff; border-radius: 16px; box-shadow: 0 4px 6px rgba(0, 0, 0, 0.07); overflow: hidden;">
+                
+                <!-- Header -->
+                <tr>
+                    <td style="background: linear-gradient(135deg, #ef4444 0%, #dc2626 100%); padding: 40px; text-align: center;">
+                        <h1 style="color: #ffffff; margin: 0; font-size: 28px; font-weight: 700; letter-spacing: -0.5px;">
+                            ⚠️ Payment Failed
+                        </h1>
+                        <p style="color: rgba(255, 255, 255, 0.9); margin: 10px 0 0 0; font-size: 16px;">
+                            Action required to continue your subscription
+                        </p>
+                    </td>
+                </tr>
+                
+                <!-- Content -->
+                <tr>
+                    <td style="padding: 40px;">
+                        <p style="color: #334155; font-size: 16px; line-height: 1.6; margin: 0 0 24px 0;">
+                            We were unable to process your recent payment for QuoTrading AI. This could be due to insufficient funds, an expired card, or a temporary issue with your payment method.
+                        </p>
+                        
+                        <div style="background: linear-gradient(135deg, #fee2e2 0%, #fecaca 100%); border-left: 4px solid #ef4444; padding: 24px; border-radius: 8px; margin: 24px 0;">
+                            <p style="color: #991b1b; font-size: 14px; font-weight: 600; margin: 0 0 12px 0;">
+                                ⚠️ Immediate Action Required
                             </p>
-                            
-                            <div style="background: linear-gradient(135deg, #fef3c7 0%, #fde68a 100%); border-left: 4px solid #f59e0b; padding: 24px; border-radius: 8px; margin: 24px 0;">
-                                <p style="color: #92400e; font-size: 14px; font-weight: 600; margin: 0 0 12px 0;">
-                                    ⚠️ Important Information
-                                </p>
-                                <p style="color: #78350f; font-size: 14px; line-height: 1.8; margin: 0 0 8px 0;">
-                                    • You'll retain access until <strong>{access_until_date}</strong>
-                                </p>
-                                <p style="color: #78350f; font-size: 14px; line-height: 1.8; margin: 0;">
-                                    • No further charges will be made
-                                </p>
-                            </div>
-                            
-                            <p style="color: #334155; font-size: 15px; line-height: 1.6; margin: 24px 0 0 0;">
-                                Thank you for using QuoTrading AI. We'd love to have you back anytime!
+                            <p style="color: #7f1d1d; font-size: 14px; line-height: 1.8; margin: 0 0 8px 0;">
+                                • Your subscription is temporarily suspended
                             </p>
-                            {reactivate_link_html}
-                        </td>
-                    </tr>
-                    
-                    <!-- Footer -->
-                    <tr>
-                        <td style="background: #f8fafc; padding: 32px; text-align: center; border-top: 1px solid #e2e8f0;">
-                            <p style="color: #64748b; font-size: 13px; line-height: 1.6; margin: 0 0 8px 0;">
-                                Questions? Contact <a href="mailto:support@quotrading.com" style="color: #667eea; text-decoration: none;">support@quotrading.com</a>
+                            <p style="color: #7f1d1d; font-size: 14px; line-height: 1.8; margin: 0;">
+                                • Payment will be retried on <strong>{retry_date}</strong>
                             </p>
-                            <p style="color: #94a3b8; font-size: 12px; margin: 0;">
-                                © 2025 QuoTrading. All rights reserved.
-                            </p>
-                        </td>
-                    </tr>
-                    
-                </table>
-            </td>
-        </tr>
-    </table>
-</body>
-</html>
-    """
-        
-        # Try SendGrid
-        if SENDGRID_API_KEY:
-            try:
-                payload = {
-                    "personalizations": [{"to": [{"email": email}]}],
-                    "from": {"email": FROM_EMAIL, "name": "QuoTrading"},
-                    "subject": subject,
-                    "content": [{"type": "text/html", "value": html_body}]
-                }
+                        </div>
+                        
+                        <p style="color: #334155; font-size: 15px; line-height: 1.6; margin: 24px 0 0 0;">
+                            <strong>To restore access:</strong> Please update your payment method below to avoid service interruption.
+                        </p>
+                        {update_payment_html}
+                    </td>
+                </tr>
                 
-                response = requests.post(
-                    "https://api.sendgrid.com/v3/mail/send",
-                    headers={
-                        "Authorization": f"Bearer {SENDGRID_API_KEY}",
-                        "Content-Type": "application/json"
-                    },
-                    json=payload
-                )
+                <!-- Footer -->
+                <tr>
+                    <td style="background: #f8fafc; padding: 32px; text-align: center; border-top: 1px solid #e2e8f0;">
+                        <p style="color: #64748b; font-size: 13px; line-height: 1.6; margin: 0 0 8px 0;">
+                            Questions? Contact <a href="mailto:support@quotrading.com" style="color: #667eea; text-decoration: none;">support@quotrading.com</a>
+                        </p>
+                        <p style="color: #94a3b8; font-size: 12px; margin: 0;">
+                            © 2025 QuoTrading. All rights reserved.
+                        </p>
+                    </td>
+                </tr>
                 
-                if response.status_code == 202:
-                    logging.info(f"✅ Cancellation email sent to {mask_email(email)}")
-                    return True
-                else:
-                    logging.error(f"Cancellation email failed: {response.status_code}")
-                    return False
-                    
-            except Exception as e:
-                logging.error(f"Cancellation email error: {e}")
-                return False
-        else:
-            logging.error(f"❌ No email method configured")
-            return False
-            
-    except Exception as e:
-        logging.error(f"❌ ERROR in send_cancellation_email: {e}")
-        return False
+            </table>
+        </td>
+    </tr>
+</table>
+</body>
+</html>
+"""
+    
+    return subject, html_body
 
 def send_payment_failed_email(email, retry_date, whop_membership_id=None):
     """Send payment failure notification email"""
     logging.info(f"🔍 Sending payment failed email to {mask_email(email)}")
+    subject, html_body = render_payment_failed_email(retry_date, whop_membership_id)
+    return queue_email(email, subject, html_body, "payment_failed")
+
+@lru_cache(maxsize=256)
+def render_subscription_expired_email(expiration_date):
+    """Render the subscription expiration email (subject, html_body)"""
+    subject = "QuoTrading AI Subscription Expired"
     
-    try:
-        subject = "⚠️ QuoTrading AI Payment Failed"
-        
-        # Build update payment link if we have membership ID
-        update_payment_html = ""
-        if whop_membership_id:
-            update_payment_html = f"""
-                            <div style="text-align: center; margin: 24px 0 0 0;">
-                                <a href="https://whop.com/hub/memberships/{whop_membership_id}" style="display: inline-block; background: #ef4444; color: #ffffff; padding: 12px 24px; border-radius: 6px; text-decoration: none; font-size: 14px; font-weight: 600;">Update Payment Method</a>
-                            </div>
-            """
-        
-        html_body = f"""
+    html_body = f"""
 <!DOCTYPE html>
 <html>
 <head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+<meta charset="UTF-8">
+<meta name="viewport" content="width=device-width, initial-scale=1.0">
 </head>
 <body style="margin: 0; padding: 0; background-color: #f8fafc; font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif;">
-    <table width="100%" cellpadding="0" cellspacing="0" style="background-color: #f8fafc; padding: 40px 20px;">
-        <tr>
-            <td align="center">
-                <table width="600" cellpadding="0" cellspacing="0" style="background-color: #ffffff; border-radius: 16px; box-shadow: 0 4px 6px rgba(0, 0, 0, 0.07); overflow: hidden;">
-                    
-                    <!-- Header -->
-                    <tr>
-                        <td style="background: linear-gradient(135deg, #ef4444 0%, #dc2626 100%); padding: 40px; text-align: center;">
-                            <h1 style="color: #ffffff; margin: 0; font-size: 28px; font-weight: 700; letter-spacing: -0.5px;">
-                                ⚠️ Payment Failed
-                            </h1>
-                            <p style="color: rgba(255, 255, 255, 0.9); margin: 10px 0 0 0; font-size: 16px;">
-                                Action required to continue your subscription
-                            </p>
-                        </td>
-                    </tr>
-                    
-                    <!-- Content -->
-                    <tr>
-                        <td style="padding: 40px;">
-                            <p style="color: #334155; font-size: 16px; line-height: 1.6; margin: 0 0 24px 0;">
-                                We were unable to process your recent payment for QuoTrading AI. This could be due to insufficient funds, an expired card, or a temporary issue with your payment method.
-                            </p>
-                            
-                            <div style="background: linear-gradient(135deg, #fee2e2 0%, #fecaca 100%); border-left: 4px solid #ef4444; padding: 24px; border-radius: 8px; margin: 24px 0;">
-                                <p style="color: #991b1b; font-size: 14px; font-weight: 600; margin: 0 0 12px 0;">
-                                    ⚠️ Immediate Action Required
-                                </p>
-                                <p style="color: #7f1d1d; font-size: 14px; line-height: 1.8; margin: 0 0 8px 0;">
-                                    • Your subscription is temporarily suspended
-                                </p>
-                                <p style="color: #7f1d1d; font-size: 14px; line-height: 1.8; margin: 0;">
-                                    • Payment will be retried on <strong>{retry_date}</strong>
-                                </p>
-                            </div>
-                            
-                            <p style="color: #334155; font-size: 15px; line-height: 1.6; margin: 24px 0 0 0;">
-                                <strong>To restore access:</strong> Please update your payment method below to avoid service interruption.
-                            </p>
-                            {update_payment_html}
-                        </td>
-                    </tr>
-                    
-                    <!-- Footer -->
-                    <tr>
-                        <td style="background: #f8fafc; padding: 32px; text-align: center; border-top: 1px solid #e2e8f0;">
-                            <p style="color: #64748b; font-size: 13px; line-height: 1.6; margin: 0 0 8px 0;">
-                                Questions? Contact <a href="mailto:support@quotrading.com" style="color: #667eea; text-decoration: none;">support@quotrading.com</a>
+<table width="100%" cellpadding="0" cellspacing="0" style="background-color: #f8fafc; padding: 40px 20px;">
+    <tr>
+        <td align="center">
+            <table width="600" cellpadding="0" cellspacing="0" style="background-color: #ffffff; border-radius: 16px; box-shadow: 0 4px 6px rgba(0, 0, 0, 0.07); overflow: hidden;">
+                
+                <!-- Header -->
+                <tr>
+                    <td style="background: linear-gradient(135deg, #64748b 0%, #475569 100%); padding: 40px; text-align: center;">
+                        <h1 style="color: #ffffff; margin: 0; font-size: 28px; font-weight: 700; letter-spacing: -0.5px;">
+                            Subscription Expired
+                        </h1>
+                        <p style="color: rgba(255, 255, 255, 0.9); margin: 10px 0 0 0; font-size: 16px;">
+                            Your QuoTrading AI access has ended
+                        </p>
+                    </td>
+                </tr>
+                
+                <!-- Content -->
+                <tr>
+                    <td style="padding: 40px;">
+                        <p style="color: #334155; font-size: 16px; line-height: 1.6; margin: 0 0 24px 0;">
+                            Your QuoTrading AI subscription expired on <strong>{expiration_date}</strong>. Your license key is no longer active.
+                        </p>
+                        
+                        <div style="background: linear-gradient(135deg, #f1f5f9 0%, #e2e8f0 100%); border-left: 4px solid #667eea; padding: 24px; border-radius: 8px; margin: 24px 0;">
+                            <p style="color: #475569; font-size: 14px; font-weight: 600; margin: 0 0 12px 0;">
+                                💡 Want to Continue Trading?
                             </p>
-                            <p style="color: #94a3b8; font-size: 12px; margin: 0;">
-                                © 2025 QuoTrading. All rights reserved.
+                            <p style="color: #64748b; font-size: 14px; line-height: 1.8; margin: 0;">
+                                Reactivate your subscription to regain access to AI-powered market analysis and trading signals.
                             </p>
-                        </td>
-                    </tr>
-                    
-                </table>
-            </td>
-        </tr>
-    </table>
-</body>
-</html>
-    """
-        
-        # Try SendGrid
-        if SENDGRID_API_KEY:
-            try:
-                payload = {
-                    "personalizations": [{"to": [{"email": email}]}],
-                    "from": {"email": FROM_EMAIL, "name": "QuoTrading"},
-                    "subject": subject,
-                    "content": [{"type": "text/html", "value": html_body}]
-                }
+                        </div>
+                        
+                        <div style="text-align: center; margin: 24px 0 0 0;">
+                            <a href="https://whop.com" style="display: inline-block; background: #667eea; color: #ffffff; padding: 12px 24px; border-radius: 6px; text-decoration: none; font-size: 14px; font-weight: 600;">Reactivate Subscription</a>
+                        </div>
+                        
+                        <p style="color: #64748b; font-size: 14px; line-height: 1.6; margin: 24px 0 0 0; text-align: center;">
+                            Thank you for being part of the QuoTrading community!
+                        </p>
+                    </td>
+                </tr>
                 
-                response = requests.post(
-                    "https://api.sendgrid.com/v3/mail/send",
-                    headers={
-                        "Authorization": f"Bearer {SENDGRID_API_KEY}",
-                        "Content-Type": "application/json"
-                    },
-                    json=payload
-                )
+                <!-- Footer -->
+                <tr>
+                    <td style="background: #f8fafc; padding: 32px; text-align: center; border-top: 1px solid #e2e8f0;">
+                        <p style="color: #64748b; font-size: 13px; line-height: 1.6; margin: 0 0 8px 0;">
+                            Questions? Contact <a href="mailto:support@quotrading.com" style="color: #667eea; text-decoration: none;">support@quotrading.com</a>
+                        </p>
+                        <p style="color: #94a3b8; font-size: 12px; margin: 0;">
+                            © 2025 QuoTrading. All rights reserved.
+                        </p>
+                    </td>
+                </tr>
                 
-                if response.status_code == 202:
-                    logging.info(f"✅ Payment failed email sent to {mask_email(email)}")
-                    return True
-                else:
-                    logging.error(f"Payment failed email failed: {response.status_code}")
-                    return False
-                    
-            except Exception as e:
-                logging.error(f"Payment failed email error: {e}")
-                return False
-        else:
-            logging.error(f"❌ No email method configured")
-            return False
-            
-    except Exception as e:
-        logging.error(f"❌ ERROR in send_payment_failed_email: {e}")
-        return False
+            </table>
+        </td>
+    </tr>
+</table>
+</body>
+</html>
+"""
+    
+    return subject, html_body
 
 def send_subscription_expired_email(email, expiration_date):
     """Send subscription expiration notification email"""
     logging.info(f"🔍 Sending subscription expired email to {mask_email(email)}")
-    
-    try:
-        subject = "QuoTrading AI Subscription Expired"
-        
-        html_body = f"""
-<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-</head>
-<body style="margin: 0; padding: 0; background-color: #f8fafc; font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif;">
-    <table width="100%" cellpadding="0" cellspacing="0" style="background-color: #f8fafc; padding: 40px 20px;">
-        <tr>
-            <td align="center">
-                <table width="600" cellpadding="0" cellspacing="0" style="background-color: #ffffff; border-radius: 16px; box-shadow: 0 4px 6px rgba(0, 0, 0, 0.07); overflow: hidden;">
-                    
-                    <!-- Header -->
-                    <tr>
-                        <td style="background: linear-gradient(135deg, #64748b 0%, #475569 100%); padding: 40px; text-align: center;">
-                            <h1 style="color: #ffffff; margin: 0; font-size: 28px; font-weight: 700; letter-spacing: -0.5px;">
-                                Subscription Expired
-                            </h1>
-                            <p style="color: rgba(255, 255, 255, 0.9); margin: 10px 0 0 0; font-size: 16px;">
-                                Your QuoTrading AI access has ended
-                            </p>
-                        </td>
-                    </tr>
-                    
-                    <!-- Content -->
-                    <tr>
-                        <td style="padding: 40px;">
-                            <p style="color: #334155; font-size: 16px; line-height: 1.6; margin: 0 0 24px 0;">
-                                Your QuoTrading AI subscription expired on <strong>{expiration_date}</strong>. Your license key is no longer active.
-                            </p>
-                            
-                            <div style="background: linear-gradient(135deg, #f1f5f9 0%, #e2e8f0 100%); border-left: 4px solid #667eea; padding: 24px; border-radius: 8px; margin: 24px 0;">
-                                <p style="color: #475569; font-size: 14px; font-weight: 600; margin: 0 0 12px 0;">
-                                    💡 Want to Continue Trading?
-                                </p>
-                                <p style="color: #64748b; font-size: 14px; line-height: 1.8; margin: 0;">
-                                    Reactivate your subscription to regain access to AI-powered market analysis and trading signals.
-                                </p>
-                            </div>
-                            
-                            <div style="text-align: center; margin: 24px 0 0 0;">
-                                <a href="https://whop.com" style="display: inline-block; background: #667eea; color: #ffffff; padding: 12px 24px; border-radius: 6px; text-decoration: none; font-size: 14px; font-weight: 600;">Reactivate Subscription</a>
-                            </div>
-                            
-                            <p style="color: #64748b; font-size: 14px; line-height: 1.6; margin: 24px 0 0 0; text-align: center;">
-                                Thank you for being part of the QuoTrading community!
-                            </p>
-                        </td>
-                    </tr>
-                    
-                    <!-- Footer -->
-                    <tr>
-                        <td style="background: #f8fafc; padding: 32px; text-align: center; border-top: 1px solid #e2e8f0;">
-                            <p style="color: #64748b; font-size: 13px; line-height: 1.6; margin: 0 0 8px 0;">
-                                Questions? Contact <a href="mailto:support@quotrading.com" style="color: #667eea; text-decoration: none;">support@quotrading.com</a>
-                            </p>
-                            <p style="color: #94a3b8; font-size: 12px; margin: 0;">
-                                © 2025 QuoTrading. All rights reserved.
-                            </p>
-                        </td>
-                    </tr>
-                    
-                </table>
-            </td>
-        </tr>
-    </table>
-</body>
-</html>
-    """
-        
-        # Try SendGrid
-        if SENDGRID_API_KEY:
-            try:
-                payload = {
-                    "personalizations": [{"to": [{"email": email}]}],
-                    "from": {"email": FROM_EMAIL, "name": "QuoTrading"},
-                    "subject": subject,
-                    "content": [{"type": "text/html", "value": html_body}]
-                }
-                
-                response = requests.post(
-                    "https://api.sendgrid.com/v3/mail/send",
-                    headers={
-                        "Authorization": f"Bearer {SENDGRID_API_KEY}",
-                        "Content-Type": "application/json"
-                    },
-                    json=payload
-                )
-                
-                if response.status_code == 202:
-                    logging.info(f"✅ Subscription expired email sent to {mask_email(email)}")
-                    return True
-                else:
-                    logging.error(f"Expired email failed: {response.status_code}")
-                    return False
-                    
-            except Exception as e:
-                logging.error(f"Expired email error: {e}")
-                return False
-        else:
-            logging.error(f"❌ No email method configured")
-            return False
-            
-    except Exception as e:
-        logging.error(f"❌ ERROR in send_subscription_expired_email: {e}")
-        return False
+    subject, html_body = render_subscription_expired_email(expiration_date)
+    return queue_email(email, subject, html_body, "subscription_expired")
 
 def generate_license_key():
     """Generate a unique license key"""
@@ -965,6 +826,7 @@ def check_rate_limit(license_key, endpoint="unknown"):
     # Check limit
     submission_count = len(_rate_limit_cache[license_key])
     if submission_count >= _RATE_LIMIT_MAX:
+        rate_limit_rejections_total.inc(endpoint=endpoint)
         # Log security event
         log_security_event(license_key, endpoint, submission_count, f"Rate limit exceeded: {submission_count}/{_RATE_LIMIT_MAX} in {_RATE_LIMIT_WINDOW}s")
         return False, f"Rate limit exceeded: {submission_count} submissions in last {_RATE_LIMIT_WINDOW}s (max {_RATE_LIMIT_MAX})"
@@ -973,6 +835,24 @@ def check_rate_limit(license_key, endpoint="unknown"):
     _rate_limit_cache[license_key].append(current_time)
     return True, "OK"
 
+def invalidate_license_caches(license_keys):
+    """Drop in-memory per-license state after licenses change status.
+    
+    Args:
+        license_keys: Keys whose state changed
+    """
+    for key in license_keys:
+        _rate_limit_cache.pop(key, None)
+
+def sweep_rate_limit_cache():
+    """Remove rate limit buckets with no submissions inside the window. Returns count removed."""
+    import time
+    cutoff = time.time() - _RATE_LIMIT_WINDOW
+    stale_keys = [key for key, stamps in list(_rate_limit_cache.items()) if not stamps or stamps[-1] < cutoff]
+    for key in stale_keys:
+        _rate_limit_cache.pop(key, None)
+    return len(stale_keys)
+
 def log_security_event(license_key, endpoint, attempts, reason):
     """Log security event (rate limit, suspicious activity) to database"""
     try:
@@ -1003,8 +883,18 @@ def log_security_event(license_key, endpoint, attempts, reason):
     except Exception as e:
         logging.error(f"Failed to log security event: {e}")
 
-def log_webhook_event(event_type, status, whop_id=None, user_id=None, email=None, details=None, error=None, payload=None):
-    """Log webhook event to database for debugging"""
+def log_webhook_event(event_type, status, whop_id=None, user_id=None, email=None, details=None, error=None, payload=None, cursor=None):
+    """Log webhook event to database for debugging
+    
+    Pass `cursor` to write inside the caller's transaction instead of on a new connection.
+    """
+    if cursor is not None:
+        cursor.execute("""
+            INSERT INTO webhook_events (event_type, whop_id, user_id, email, status, details, error, payload)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        """, (event_type, whop_id, user_id, email, status, details, error, json.dumps(payload) if payload else None))
+        return
+    
     try:
         conn = get_db_connection()
         if not conn:
@@ -1062,17 +952,58 @@ def init_db_pool():
         logging.error(f"❌ Failed to initialize connection pool: {e}")
         return None
 
-def get_db_connection():
-    """Get PostgreSQL database connection from pool with timeout protection"""
-    global _db_pool
+def init_offload_db_pool():
+    """Initialize the small real-lock pool used by offload OS threads"""
+    global _offload_db_pool
     
-    # Initialize pool if not exists
+    with _offload_db_pool_lock:
+        if _offload_db_pool is not None:
+            return _offload_db_pool
+        
+        try:
+            try:
+                _offload_db_pool = async_runtime.OffloadConnectionPool(
+                    0, OFFLOAD_DB_POOL_MAX,
+                    host=DB_HOST, database=DB_NAME, user=DB_USER, password=DB_PASSWORD,
+                    sslmode='require', connect_timeout=10
+                )
+                # Pool connects lazily (minconn=0), so verify credentials now
+                _offload_db_pool.putconn(_offload_db_pool.getconn())
+            except psycopg2.OperationalError:
+                # Fallback for flexible server format
+                user_with_server = f"{DB_USER}@{DB_HOST.split('.')[0]}" if '@' not in DB_USER else DB_USER
+                _offload_db_pool = async_runtime.OffloadConnectionPool(
+                    0, OFFLOAD_DB_POOL_MAX,
+                    host=DB_HOST, database=DB_NAME, user=user_with_server, password=DB_PASSWORD,
+                    sslmode='require', connect_timeout=10
+                )
+            logging.info(f"✅ Offload connection pool initialized (0-{OFFLOAD_DB_POOL_MAX} connections)")
+            return _offload_db_pool
+        except Exception as e:
+            logging.error(f"❌ Failed to initialize offload connection pool: {e}")
+            _offload_db_pool = None
+            return None
+
+def _current_db_pool():
+    """Pool for the calling thread: green/request threads vs offload OS threads"""
+    if async_runtime.on_offload_thread():
+        return _offload_db_pool or init_offload_db_pool()
     if _db_pool is None:
         init_db_pool()
-    
+    return _db_pool
+
+def _install_sql_profiler(conn):
+    """Make plain conn.cursor() calls timed (dict-row call sites pass ProfiledDictCursor)"""
+    if conn is not None and SQL_PROFILER_ENABLED:
+        conn.cursor_factory = _sql_profiler.profiled(psycopg2.extensions.cursor)
+    return conn
+
+def get_db_connection():
+    """Get PostgreSQL database connection from pool with timeout protection"""
     try:
-        if _db_pool:
-            conn = _db_pool.getconn()
+        db_pool = _current_db_pool()
+        if db_pool:
+            conn = db_pool.getconn()
             if conn:
                 # Set statement timeout to prevent slow queries from hanging
                 try:
@@ -1082,47 +1013,49 @@ def get_db_connection():
                     cur.close()
                 except:
                     pass
-                return conn
+                return _install_sql_profiler(conn)
         
         # Fallback to direct connection if pool fails
         logging.warning("Pool unavailable, creating direct connection")
-        try:
-            conn = psycopg2.connect(
-                host=DB_HOST,
-                database=DB_NAME,
-                user=DB_USER,
-                password=DB_PASSWORD,
-                sslmode='require',
-                connect_timeout=10
-            )
-            return conn
-        except psycopg2.OperationalError:
-            user_with_server = f"{DB_USER}@{DB_HOST.split('.')[0]}" if '@' not in DB_USER else DB_USER
-            conn = psycopg2.connect(
-                host=DB_HOST,
-                database=DB_NAME,
-                user=user_with_server,
-                password=DB_PASSWORD,
-                sslmode='require',
-                connect_timeout=10
-            )
-            return conn
+        return _install_sql_profiler(open_direct_connection())
             
     except Exception as e:
         logging.error(f"❌ Database connection failed: {e}")
         logging.error(f"   Host: {DB_HOST}, User: {DB_USER}, DB: {DB_NAME}")
         return None
 
+def open_direct_connection():
+    """Open a dedicated (non-pooled) PostgreSQL connection. Caller must close it."""
+    try:
+        return psycopg2.connect(
+            host=DB_HOST,
+            database=DB_NAME,
+            user=DB_USER,
+            password=DB_PASSWORD,
+            sslmode='require',
+            connect_timeout=10
+        )
+    except psycopg2.OperationalError:
+        # Fallback for flexible server format
+        user_with_server = f"{DB_USER}@{DB_HOST.split('.')[0]}" if '@' not in DB_USER else DB_USER
+        return psycopg2.connect(
+            host=DB_HOST,
+            database=DB_NAME,
+            user=user_with_server,
+            password=DB_PASSWORD,
+            sslmode='require',
+            connect_timeout=10
+        )
+
 def return_connection(conn):
     """Return connection to pool or close if from direct connection"""
-    global _db_pool
-    
     if conn is None:
         return
     
     try:
-        if _db_pool:
-            _db_pool.putconn(conn)
+        db_pool = _offload_db_pool if async_runtime.on_offload_thread() else _db_pool
+        if db_pool:
+            db_pool.putconn(conn)
         else:
             # Close direct connection if pool not available
             conn.close()
@@ -1133,6 +1066,50 @@ def return_connection(conn):
         except:
             pass
 
+# Email outbox: senders render + INSERT, worker threads do the network I/O
+EMAIL_OUTBOX_WORKERS = int(os.environ.get("EMAIL_OUTBOX_WORKERS", "2"))
+EMAIL_OUTBOX_BATCH_SIZE = int(os.environ.get("EMAIL_OUTBOX_BATCH_SIZE", "50"))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.environ.get("EMAIL_OUTBOX_MAX_ATTEMPTS", "6"))
+# Point at a local stand-in for testing (e.g. http://localhost:8025)
+SENDGRID_API_URL = os.environ.get("SENDGRID_API_URL", "https://api.sendgrid.com")
+SMTP_STARTTLS = os.environ.get("SMTP_STARTTLS", "true").lower() == "true"
+
+def build_email_transport():
+    """New transport for one outbox worker: SendGrid preferred, SMTP fallback"""
+    sendgrid = SendGridTransport(SENDGRID_API_KEY, FROM_EMAIL, base_url=SENDGRID_API_URL) if SENDGRID_API_KEY else None
+    smtp = None
+    if SMTP_CONFIGURED:
+        # Login is skipped when no credentials are set
+        smtp = SMTPTransport(SMTP_SERVER, SMTP_PORT, SMTP_USERNAME, SMTP_PASSWORD, FROM_EMAIL, starttls=SMTP_STARTTLS)
+    if sendgrid and smtp:
+        return FallbackTransport(sendgrid, smtp)
+    return sendgrid or smtp
+
+# Workers are real OS threads so SMTP/TLS work never runs on the eventlet hub
+_email_outbox = EmailOutbox(
+    get_db_connection, return_connection, build_email_transport,
+    workers=EMAIL_OUTBOX_WORKERS,
+    batch_size=EMAIL_OUTBOX_BATCH_SIZE,
+    max_attempts=EMAIL_OUTBOX_MAX_ATTEMPTS,
+    threading_module=async_runtime.real_threading
+)
+
+def queue_email(email, subject, html_body, template):
+    """Queue an email for delivery. Sends inline only if the outbox table is unreachable."""
+    if not email:
+        return False
+    
+    if _email_outbox.enqueue(email, subject, html_body, template) is not None:
+        logging.info(f"📧 Queued {template} email for {mask_email(email)}")
+        return True
+    
+    logging.warning(f"⚠️ Email outbox unavailable - sending {template} email inline")
+    try:
+        return _email_outbox.send_now(email, subject, html_body)
+    except Exception as e:
+        logging.error(f"❌ Inline {template} email failed: {type(e).__name__}: {e}")
+        return False
+
 def validate_license(license_key: str):
     """Validate license key against PostgreSQL database
     
@@ -1153,7 +1130,7 @@ def validate_license(license_key: str):
         return False, "Database connection failed", None
     
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+        with conn.cursor(cursor_factory=ProfiledDictCursor) as cursor:
             cursor.execute("""
                 SELECT license_key, email, license_type, license_status, 
                        license_expiration, created_at
@@ -1187,6 +1164,7 @@ def validate_license(license_key: str):
                 VALUES (%s, %s, %s, %s)
             """, (license_key, '/api/main', '{"action": "validate"}', 200))
             conn.commit()
+            presence.touch(license_key, 'api')
             
             return True, f"Valid {user['license_type']} license", user['license_expiration']
             
@@ -1217,8 +1195,13 @@ def hello():
     }), 200
 
 
+_active_sessions_table_ready = False
+
 def ensure_active_sessions_table(conn):
     """Ensure the active_sessions table exists for multi-symbol session tracking."""
+    global _active_sessions_table_ready
+    if _active_sessions_table_ready:
+        return
     try:
         with conn.cursor() as cursor:
             cursor.execute("""
@@ -1232,11 +1215,102 @@ def ensure_active_sessions_table(conn):
                     UNIQUE(license_key, symbol)
                 )
             """)
+            # Sessions claimed at license validation can be adopted by a heartbeat carrying their token
+            cursor.execute("""
+                ALTER TABLE active_sessions
+                ADD COLUMN IF NOT EXISTS adoption_token VARCHAR(64),
+                DROP COLUMN IF EXISTS pending_adoption
+            """)
             conn.commit()
+            _active_sessions_table_ready = True
     except Exception as e:
         logging.error(f"Error creating active_sessions table: {e}")
 
 
+def claim_symbol_sessions(cursor, license_key, symbols, device_fingerprint, allow_same_device=True,
+                          adoption_token=None, session_token=None):
+    """
+    Atomically claim (or refresh) the sessions for license+symbols in one statement.
+    
+    The upsert only overwrites an existing row when it belongs to the same device
+    (if allow_same_device) or has gone stale, so admission and ownership are decided
+    by the row lock - two devices racing can never both win. Rows are locked in
+    symbol order so concurrent batches cannot deadlock.
+    Runs inside the caller's transaction; the caller commits.
+    
+    adoption_token: claim made at license validation - stored on the rows and handed
+                    back to the validating client, so a process it starts can adopt
+                    the session even if it reports a different device fingerprint
+    session_token: heartbeat claim - takes over rows holding this adoption token (once;
+                   the token is cleared). Same-device refreshes keep a pending token.
+    
+    Returns: (claimed_symbols: list, conflicts: {symbol: conflict_info})
+    """
+    cursor.execute("""
+        WITH wanted AS (
+            SELECT DISTINCT unnest(%(symbols)s::text[]) AS symbol
+        ),
+        claim AS (
+            INSERT INTO active_sessions (license_key, symbol, device_fingerprint, last_heartbeat, adoption_token)
+            SELECT %(license_key)s, symbol, %(device)s, NOW(), %(adoption_token)s FROM wanted ORDER BY symbol
+            ON CONFLICT (license_key, symbol) DO UPDATE
+            SET device_fingerprint = EXCLUDED.device_fingerprint,
+                last_heartbeat = EXCLUDED.last_heartbeat,
+                adoption_token = CASE
+                    WHEN EXCLUDED.adoption_token IS NOT NULL THEN EXCLUDED.adoption_token
+                    WHEN active_sessions.adoption_token = %(session_token)s THEN NULL
+                    WHEN active_sessions.device_fingerprint = EXCLUDED.device_fingerprint THEN active_sessions.adoption_token
+                    ELSE NULL
+                END
+            WHERE (%(allow_same_device)s AND active_sessions.device_fingerprint = EXCLUDED.device_fingerprint)
+               OR active_sessions.adoption_token = %(session_token)s
+               OR active_sessions.last_heartbeat < NOW() - make_interval(secs => %(timeout)s)
+            RETURNING symbol
+        )
+        SELECT
+            w.symbol,
+            w.symbol IN (SELECT symbol FROM claim) AS claimed,
+            s.device_fingerprint,
+            GREATEST(0, %(timeout)s - EXTRACT(EPOCH FROM NOW() - s.last_heartbeat))::int AS seconds_remaining
+        FROM wanted w
+        LEFT JOIN active_sessions s ON s.license_key = %(license_key)s AND s.symbol = w.symbol
+        ORDER BY w.symbol
+    """, {
+        'license_key': license_key,
+        'symbols': list(symbols),
+        'device': device_fingerprint,
+        'allow_same_device': allow_same_device,
+        'adoption_token': adoption_token,
+        'session_token': session_token,
+        'timeout': SESSION_TIMEOUT_SECONDS
+    })
+    claimed_symbols, conflicts = [], {}
+    for symbol, claimed, owner_device, seconds_remaining in cursor.fetchall():
+        if claimed:
+            claimed_symbols.append(symbol)
+            continue
+        # The outer SELECT sees rows as they were before this statement; if a concurrent
+        # claim created the row, the owner is not visible yet but the claim still lost
+        conflicts[symbol] = {
+            'device_fingerprint': owner_device or 'unknown',
+            'seconds_remaining': SESSION_TIMEOUT_SECONDS if seconds_remaining is None else seconds_remaining
+        }
+    return claimed_symbols, conflicts
+
+
+def claim_symbol_session(cursor, license_key, symbol, device_fingerprint, allow_same_device=True,
+                         adoption_token=None, session_token=None):
+    """
+    Single-symbol claim_symbol_sessions().
+    
+    Returns: (claimed: bool, conflict_info: dict or None)
+    """
+    claimed_symbols, conflicts = claim_symbol_sessions(
+        cursor, license_key, [symbol], device_fingerprint, allow_same_device, adoption_token, session_token
+    )
+    return bool(claimed_symbols), conflicts.get(symbol)
+
+
 def check_symbol_session_conflict(conn, license_key, symbol, device_fingerprint, allow_same_device=True):
     """
     Check if there's an active session conflict for a specific symbol.
@@ -1369,11 +1443,24 @@ def validate_license_endpoint():
                     # Ensure active_sessions table exists
                     ensure_active_sessions_table(conn)
                     
-                    # Check for session conflict for this specific symbol
                     # For validation/login, use strict blocking (even same device)
-                    has_conflict, conflict_info = check_symbol_session_conflict(
-                        conn, license_key, symbol, device_fingerprint, allow_same_device=False
-                    )
+                    session_token = None
+                    if check_only:
+                        has_conflict, conflict_info = check_symbol_session_conflict(
+                            conn, license_key, symbol, device_fingerprint, allow_same_device=False
+                        )
+                    else:
+                        # Claim in the same statement that checks, so two devices
+                        # validating at once cannot both be admitted. The returned session_token
+                        # lets the process this client starts adopt the claim on its first heartbeat
+                        session_token = secrets.token_hex(16)
+                        with conn.cursor() as cursor:
+                            claimed, conflict_info = claim_symbol_session(
+                                cursor, license_key, symbol, device_fingerprint, allow_same_device=False,
+                                adoption_token=session_token
+                            )
+                        conn.commit()
+                        has_conflict = not claimed
                     
                     if has_conflict:
                         logging.warning(f"⚠️ BLOCKED - License {license_key} symbol {symbol} already in use by {conflict_info['device_fingerprint'][:8]}...")
@@ -1386,9 +1473,7 @@ def validate_license_endpoint():
                             "estimated_wait_seconds": conflict_info['seconds_remaining']
                         }), 403
                     
-                    # No conflict for this symbol - validation successful
-                    # NOTE: Sessions are NOT created during validation - only via heartbeat endpoint
-                    # (See legacy session path below for detailed explanation)
+                    # No conflict for this symbol - validation successful (and claimed unless check_only)
                     active_count = count_active_symbol_sessions(conn, license_key)
                     logging.info(f"✅ License validated for {license_key}/{symbol} ({active_count} active symbols)")
                     
@@ -1398,6 +1483,8 @@ def validate_license_endpoint():
                         "session_conflict": False,
                         "license_type": license_type,
                         "symbol": symbol,
+                        "session_claimed": not check_only,
+                        "session_token": session_token,
                         "active_symbols": active_count,
                         "expiry_date": license_expiration.isoformat() if license_expiration else None
                     }), 200
@@ -1543,6 +1630,7 @@ def api_heartbeat():
         symbol = data.get('symbol', 'COPIER')
         status = data.get('status', 'online')
         metadata = data.get('metadata', {})
+        session_token = data.get('session_token')
         
         if not license_key:
             return jsonify({"success": False, "message": "License key required"}), 400
@@ -1572,16 +1660,24 @@ def api_heartbeat():
                     conn.rollback()
                     return jsonify({"success": False, "message": "License not found"}), 404
                 
-                # Also upsert into active_sessions for multi-symbol support
-                cursor.execute("""
-                    INSERT INTO active_sessions (license_key, symbol, device_fingerprint, last_heartbeat)
-                    VALUES (%s, %s, %s, %s)
-                    ON CONFLICT (license_key, symbol)
-                    DO UPDATE SET device_fingerprint = EXCLUDED.device_fingerprint,
-                                  last_heartbeat = EXCLUDED.last_heartbeat
-                """, (license_key, symbol, device_fingerprint, datetime.now(timezone.utc)))
+                # Refresh our symbol session; a live session owned by another device is not taken over
+                # (except one claimed at license validation, adopted by presenting its session_token)
+                claimed, conflict_info = claim_symbol_session(
+                    cursor, license_key, symbol, device_fingerprint, session_token=session_token
+                )
+                if not claimed:
+                    conn.rollback()
+                    logging.warning(f"⚠️ Heartbeat rejected - {license_key[:8]}... {symbol} owned by {conflict_info['device_fingerprint'][:8]}...")
+                    return jsonify({
+                        "success": False,
+                        "session_conflict": True,
+                        "message": f"Symbol {symbol} is active on another device",
+                        "symbol": symbol,
+                        "estimated_wait_seconds": conflict_info['seconds_remaining']
+                    }), 409
                 
                 conn.commit()
+                presence.touch(license_key, 'heartbeat', symbol=symbol, status=status, metadata=metadata)
                 
                 logging.debug(f"💓 Heartbeat from {license_key[:8]}... on {symbol}")
                 
@@ -1599,6 +1695,138 @@ def api_heartbeat():
         return jsonify({"success": False, "message": str(e)}), 500
 
 
+MAX_HEARTBEAT_BATCH_SYMBOLS = 50
+_ADDITIVE_SESSION_METRICS = ('session_pnl', 'total_trades', 'winning_trades', 'losing_trades', 'position_pnl')
+
+def _merge_session_metadata(sessions):
+    """One presence metadata dict for a multi-symbol heartbeat: counters summed, symbols joined"""
+    merged = dict(sessions[0].get('metadata') or {})
+    for key in _ADDITIVE_SESSION_METRICS:
+        values = [(session.get('metadata') or {}).get(key) for session in sessions]
+        values = [value for value in values if isinstance(value, (int, float))]
+        if values:
+            merged[key] = sum(values)
+    total_trades = merged.get('total_trades')
+    if total_trades and isinstance(merged.get('winning_trades'), (int, float)):
+        merged['win_rate'] = round(merged['winning_trades'] / total_trades * 100, 1)
+    merged['symbol'] = ', '.join(session['symbol'] for session in sessions)
+    return merged
+
+
+def apply_heartbeat_batch(license_key, device_fingerprint, sessions, status='online', session_token=None):
+    """
+    Heartbeat several symbol sessions of one license in one transaction:
+    one users update plus one multi-row claim of active_sessions.
+    
+    sessions: [{"symbol": "ES", "metadata": {...}}, ...]
+    session_token: token from license validation, to adopt the sessions it claimed
+    Returns: (payload dict, HTTP status code)
+    """
+    if not license_key:
+        return {"success": False, "message": "License key required"}, 400
+    if not device_fingerprint:
+        return {"success": False, "message": "Device fingerprint required"}, 400
+    if not isinstance(sessions, list) or not sessions:
+        return {"success": False, "message": "sessions must be a non-empty list"}, 400
+    if len(sessions) > MAX_HEARTBEAT_BATCH_SYMBOLS:
+        return {"success": False, "message": f"At most {MAX_HEARTBEAT_BATCH_SYMBOLS} sessions per heartbeat"}, 400
+    
+    # Last entry wins if a symbol is listed twice
+    by_symbol = {}
+    for session in sessions:
+        symbol = session.get('symbol') if isinstance(session, dict) else None
+        if not symbol:
+            return {"success": False, "message": "Every session needs a symbol"}, 400
+        metadata = session.get('metadata') or {}
+        if not isinstance(metadata, dict):
+            return {"success": False, "message": "Session metadata must be an object"}, 400
+        by_symbol[str(symbol)] = {"symbol": str(symbol), "metadata": metadata}
+    
+    conn = get_db_connection()
+    if not conn:
+        return {"success": False, "message": "Database error"}, 500
+    
+    try:
+        ensure_active_sessions_table(conn)
+        
+        with conn.cursor() as cursor:
+            claimed, conflicts = claim_symbol_sessions(
+                cursor, license_key, list(by_symbol), device_fingerprint, session_token=session_token
+            )
+            if not claimed:
+                conn.rollback()
+                logging.warning(f"⚠️ Batch heartbeat rejected - {license_key[:8]}... all {len(conflicts)} symbols owned by another device")
+                return {
+                    "success": False,
+                    "session_conflict": True,
+                    "message": "All symbols are active on another device",
+                    "conflicts": conflicts
+                }, 409
+            
+            # The license's device only moves to the caller when no other device holds live sessions on it
+            cursor.execute("""
+                UPDATE users 
+                SET last_heartbeat = NOW(),
+                    device_fingerprint = CASE WHEN %s THEN %s ELSE device_fingerprint END
+                WHERE license_key = %s
+                RETURNING license_key
+            """, (not conflicts, device_fingerprint, license_key))
+            if not cursor.fetchone():
+                conn.rollback()
+                return {"success": False, "message": "License not found"}, 404
+        conn.commit()
+    finally:
+        return_connection(conn)
+    
+    live = [by_symbol[symbol] for symbol in claimed]
+    presence.touch(license_key, 'heartbeat', symbol=live[0]['symbol'], status=status,
+                   metadata=_merge_session_metadata(live),
+                   sessions={session['symbol']: session['metadata'] for session in live})
+    
+    if conflicts:
+        logging.warning(f"⚠️ Batch heartbeat from {license_key[:8]}... - {len(conflicts)} symbols owned by another device")
+    logging.debug(f"💓 Batch heartbeat from {license_key[:8]}... on {len(claimed)} symbols")
+    
+    return {
+        "success": True,
+        "message": "Heartbeat received",
+        "claimed": claimed,
+        "session_conflict": bool(conflicts),
+        "conflicts": conflicts,
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }, 200
+
+
+@app.route('/api/heartbeat/batch', methods=['POST'])
+def api_heartbeat_batch():
+    """
+    Multi-symbol heartbeat - one request per customer instead of one per symbol.
+    
+    Body: {
+        "license_key": "...",
+        "device_fingerprint": "...",
+        "status": "online",
+        "session_token": "...",  (optional, from validate-license)
+        "sessions": [{"symbol": "ES", "metadata": {...}}, {"symbol": "NQ", "metadata": {...}}]
+    }
+    Symbols held live by another device are reported in "conflicts" and not taken over;
+    409 only when every symbol conflicts.
+    """
+    try:
+        data = request.get_json() or {}
+        payload, status_code = apply_heartbeat_batch(
+            data.get('license_key'),
+            data.get('device_fingerprint'),
+            data.get('sessions'),
+            data.get('status', 'online'),
+            data.get('session_token')
+        )
+        return jsonify(payload), status_code
+    except Exception as e:
+        logging.error(f"Batch heartbeat error: {e}")
+        return jsonify({"success": False, "message": str(e)}), 500
+
+
 @app.route('/api/main', methods=['POST'])
 def main():
     """Main signal processing endpoint with license validation and session locking"""
@@ -1626,7 +1854,7 @@ def main():
             conn = get_db_connection()
             if conn:
                 try:
-                    with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                    with conn.cursor(cursor_factory=ProfiledDictCursor) as cursor:
                         # Check for active sessions (do NOT clear or modify)
                         cursor.execute("""
                             SELECT device_fingerprint, last_heartbeat
@@ -1879,176 +2107,422 @@ def create_license():
         logging.error(f"Error creating license: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
+# Whop retries slow responses, so the endpoint only verifies and stores the
+# raw event; the inbox worker applies it. Events are applied in arrival order
+# per membership and exactly once (effects + "done" commit together).
+WEBHOOK_INBOX_BATCH_SIZE = int(os.environ.get("WEBHOOK_INBOX_BATCH_SIZE", "20"))
+WEBHOOK_INBOX_MAX_ATTEMPTS = int(os.environ.get("WEBHOOK_INBOX_MAX_ATTEMPTS", "5"))
+WEBHOOK_INBOX_POLL_SECONDS = float(os.environ.get("WEBHOOK_INBOX_POLL_SECONDS", "5"))
+_webhook_inbox_ready = False
+_webhook_inbox_wake = threading.Event()
+
+def ensure_webhook_inbox_table(conn):
+    """Create the webhook inbox (raw events) and webhook_events (audit log) tables"""
+    global _webhook_inbox_ready
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS whop_webhook_inbox (
+                id BIGSERIAL PRIMARY KEY,
+                event_id VARCHAR(255) NOT NULL UNIQUE,
+                event_type VARCHAR(100),
+                membership_key VARCHAR(255),
+                payload JSONB NOT NULL,
+                status VARCHAR(20) NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+                claimed_at TIMESTAMP WITH TIME ZONE,
+                last_error TEXT,
+                received_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+                processed_at TIMESTAMP WITH TIME ZONE
+            )
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_whop_inbox_open
+            ON whop_webhook_inbox(membership_key, id) WHERE status IN ('pending', 'processing')
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS webhook_events (
+                id SERIAL PRIMARY KEY,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                event_type VARCHAR(100),
+                whop_id VARCHAR(100),
+                user_id VARCHAR(100),
+                email VARCHAR(255),
+                status VARCHAR(50),
+                details TEXT,
+                error TEXT,
+                payload JSONB
+            )
+        """)
+    conn.commit()
+    _webhook_inbox_ready = True
+
+def _whop_membership_key(data):
+    """Ordering key: events for the same membership are applied one at a time, in order"""
+    user = data.get('user') or {}
+    membership_id = data.get('membership_id') or data.get('id')
+    return str(membership_id or data.get('email') or user.get('email') or 'unknown')
+
 @app.route('/api/whop/webhook', methods=['POST'])
 def whop_webhook():
-    """Handle Whop webhook events for subscription management"""
+    """Handle Whop webhook events: verify, store once, acknowledge"""
     try:
-        payload = request.get_data()
+        raw_payload = request.get_data()
         headers = request.headers
-        
+
         # Verify signature if secret is set
         if WHOP_WEBHOOK_SECRET and 'X-Whop-Signature' in headers:
             signature = headers.get('X-Whop-Signature')
             expected_signature = hmac.new(
                 WHOP_WEBHOOK_SECRET.encode('utf-8'),
-                payload,
+                raw_payload,
                 hashlib.sha256
             ).hexdigest()
-            
+
             if not hmac.compare_digest(signature, expected_signature):
                 logging.warning("❌ Invalid Whop webhook signature")
                 return jsonify({"status": "error", "message": "Invalid signature"}), 401
-        
-        payload = json.loads(payload)
+
+        payload = json.loads(raw_payload)
 
         event_type = payload.get('action') # Whop often uses 'action' or 'type'
         if not event_type:
             event_type = payload.get('type')
-            
-        data = payload.get('data', {})
-        
-        logging.info(f"📬 Whop webhook: {event_type}")
-        
+
+        data = payload.get('data') or {}
+
+        # Redeliveries carry the same id; fall back to a hash of the body
+        event_id = str(payload.get('id') or headers.get('Webhook-Id') or hashlib.sha256(raw_payload).hexdigest())
+
         conn = get_db_connection()
         if not conn:
             return jsonify({"status": "error", "message": "Database error"}), 500
-            
+
         try:
+            if not _webhook_inbox_ready:
+                ensure_webhook_inbox_table(conn)
             with conn.cursor() as cursor:
-                # Handle Membership Activated / Payment Succeeded
-                if event_type in ['membership.activated', 'payment.succeeded']:
-                    email = data.get('email') or data.get('user', {}).get('email')
-                    membership_id = data.get('id')
-                    user_id = data.get('user_id') or data.get('user', {}).get('id')
-                    
-                    if email:
-                        # Check if user exists
-                        cursor.execute("SELECT license_key FROM users WHERE email = %s", (email,))
-                        existing = cursor.fetchone()
-                        
-                        if existing:
-                            # Reactivate existing
-                            cursor.execute("""
-                                UPDATE users 
-                                SET license_status = 'active', whop_membership_id = %s, whop_user_id = %s
-                                WHERE email = %s
-                            """, (membership_id, user_id, email))
-                            license_key = existing[0]
-                            logging.info(f"🔄 License reactivated for {mask_email(email)}")
-                            log_webhook_event(event_type, 'success', membership_id, user_id, email, f'Reactivated license')
-                        else:
-                            # Create new license
-                            license_key = generate_license_key()
-                            account_id = f"ACC-{secrets.token_hex(8).upper()}"
-                            cursor.execute("""
-                                INSERT INTO users (account_id, license_key, email, license_type, license_status, whop_membership_id, whop_user_id)
-                                VALUES (%s, %s, %s, %s, %s, %s, %s)
-                            """, (account_id, license_key, email, 'Monthly', 'active', membership_id, user_id))
-                            logging.info(f"🎉 License created from Whop: {mask_sensitive(license_key)} for {mask_email(email)}")
-                            log_webhook_event(event_type, 'success', membership_id, user_id, email, f'Created license {mask_sensitive(license_key)}')
-                            
-                            # Send email with Whop IDs
-                            email_sent = send_license_email(email, license_key, user_id, membership_id)
-                            if email_sent:
-                                logging.info(f"✅ Email successfully sent to {mask_email(email)}")
-                            else:
-                                logging.error(f"❌ Email failed to send to {mask_email(email)}")
-                        
-                        
-                        conn.commit()
-
-                # Handle Membership Cancelled / Deactivated
-                elif event_type in ['membership.cancelled', 'membership.deactivated', 'subscription.canceled']:
-                    membership_id = data.get('id')
-                    email = data.get('email') or data.get('user', {}).get('email')
-                    
-                    if membership_id:
-                        # Get user email if not provided
-                        if not email:
-                            cursor.execute("SELECT email FROM users WHERE whop_membership_id = %s", (membership_id,))
-                            result = cursor.fetchone()
-                            if result:
-                                email = result[0]
-                        
-                        cursor.execute("""
-                            UPDATE users 
-                            SET license_status = 'cancelled'
-                            WHERE whop_membership_id = %s
-                        """, (membership_id,))
-                    elif email:
-                        cursor.execute("""
-                            UPDATE users 
-                            SET license_status = 'cancelled'
-                            WHERE email = %s
-                        """, (email,))
-                        
-                    conn.commit()
-                    logging.info(f"❌ License cancelled via Whop webhook")
-                    
-                    # Send cancellation email
-                    if email:
-                        cancellation_date = datetime.now().strftime("%B %d, %Y")
-                        access_until = (datetime.now() + timedelta(days=30)).strftime("%B %d, %Y")
-                        send_cancellation_email(email, cancellation_date, access_until, membership_id)
-
-                # Handle Payment Failed
-                elif event_type == 'payment.failed':
-                    membership_id = data.get('membership_id') or data.get('id')
-                    email = data.get('email') or data.get('user', {}).get('email')
-                    
-                    if membership_id:
-                        # Get user email if not provided
-                        if not email:
-                            cursor.execute("SELECT email FROM users WHERE whop_membership_id = %s", (membership_id,))
-                            result = cursor.fetchone()
-                            if result:
-                                email = result[0]
-                        
-                        cursor.execute("""
-                            UPDATE users 
-                            SET license_status = 'suspended'
-                            WHERE whop_membership_id = %s
-                        """, (membership_id,))
-                        conn.commit()
-                        logging.warning(f"⚠️ License suspended (payment failed)")
-                        
-                        # Send payment failed email
-                        if email:
-                            retry_date = (datetime.now() + timedelta(days=3)).strftime("%B %d, %Y")
-                            send_payment_failed_email(email, retry_date, membership_id)
-                
-                # Handle Payment Succeeded (renewal)
-                elif event_type in ['payment.succeeded', 'membership.renewed']:
-                    membership_id = data.get('membership_id') or data.get('id')
-                    email = data.get('email') or data.get('user', {}).get('email')
-                    
-                    if membership_id and email:
-                        # Ensure license is active
-                        cursor.execute("""
-                            UPDATE users 
-                            SET license_status = 'active'
-                            WHERE whop_membership_id = %s
-                        """, (membership_id,))
-                        conn.commit()
-                        
-                        # Send renewal email
-                        renewal_date = datetime.now().strftime("%B %d, %Y")
-                        next_billing = (datetime.now() + timedelta(days=30)).strftime("%B %d, %Y")
-                        send_renewal_email(email, renewal_date, next_billing, membership_id)
-                        logging.info(f"✅ Renewal email sent to {mask_email(email)}")
-
+                cursor.execute("""
+                    INSERT INTO whop_webhook_inbox (event_id, event_type, membership_key, payload)
+                    VALUES (%s, %s, %s, %s)
+                    ON CONFLICT (event_id) DO NOTHING
+                    RETURNING id
+                """, (event_id, event_type, _whop_membership_key(data), json.dumps(payload)))
+                inserted = cursor.fetchone() is not None
+            conn.commit()
         finally:
             return_connection(conn)
+
+        if inserted:
+            logging.info(f"📬 Whop webhook queued: {event_type}")
+            _webhook_inbox_wake.set()
+        else:
+            logging.info(f"📬 Whop webhook duplicate ignored: {event_type}")
+
+        return jsonify({"status": "success", "event_id": event_id, "duplicate": not inserted}), 200
+
+    except Exception as e:
+        logging.error(f"Whop webhook error: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+def apply_whop_event(cursor, event_type, data):
+    """Apply one Whop event inside the caller's transaction (caller commits)"""
+    # Handle Membership Activated / Payment Succeeded
+    if event_type in ['membership.activated', 'payment.succeeded']:
+        email = data.get('email') or data.get('user', {}).get('email')
+        membership_id = data.get('id')
+        user_id = data.get('user_id') or data.get('user', {}).get('id')
+        
+        if email:
+            # Check if user exists
+            cursor.execute("SELECT license_key FROM users WHERE email = %s", (email,))
+            existing = cursor.fetchone()
             
-        return jsonify({"status": "success"}), 200
+            if existing:
+                # Reactivate existing
+                cursor.execute("""
+                    UPDATE users 
+                    SET license_status = 'active', whop_membership_id = %s, whop_user_id = %s
+                    WHERE email = %s
+                """, (membership_id, user_id, email))
+                license_key = existing[0]
+                logging.info(f"🔄 License reactivated for {mask_email(email)}")
+                log_webhook_event(event_type, 'success', membership_id, user_id, email, f'Reactivated license', cursor=cursor)
+            else:
+                # Create new license
+                license_key = generate_license_key()
+                account_id = f"ACC-{secrets.token_hex(8).upper()}"
+                cursor.execute("""
+                    INSERT INTO users (account_id, license_key, email, license_type, license_status, whop_membership_id, whop_user_id)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                """, (account_id, license_key, email, 'Monthly', 'active', membership_id, user_id))
+                logging.info(f"🎉 License created from Whop: {mask_sensitive(license_key)} for {mask_email(email)}")
+                log_webhook_event(event_type, 'success', membership_id, user_id, email, f'Created license {mask_sensitive(license_key)}', cursor=cursor)
+                
+                # Send email with Whop IDs
+                subject, html_body = render_license_email(license_key, user_id, membership_id)
+                _email_outbox.enqueue(email, subject, html_body, "license", cursor=cursor)
+                logging.info(f"📧 License email queued for {mask_email(email)}")
+
+    # Handle Membership Cancelled / Deactivated
+    elif event_type in ['membership.cancelled', 'membership.deactivated', 'subscription.canceled']:
+        membership_id = data.get('id')
+        email = data.get('email') or data.get('user', {}).get('email')
+        
+        if membership_id:
+            # Get user email if not provided
+            if not email:
+                cursor.execute("SELECT email FROM users WHERE whop_membership_id = %s", (membership_id,))
+                result = cursor.fetchone()
+                if result:
+                    email = result[0]
+            
+            cursor.execute("""
+                UPDATE users 
+                SET license_status = 'cancelled'
+                WHERE whop_membership_id = %s
+            """, (membership_id,))
+        elif email:
+            cursor.execute("""
+                UPDATE users 
+                SET license_status = 'cancelled'
+                WHERE email = %s
+            """, (email,))
+            
+        logging.info(f"❌ License cancelled via Whop webhook")
+        
+        # Send cancellation email
+        if email:
+            cancellation_date = datetime.now().strftime("%B %d, %Y")
+            access_until = (datetime.now() + timedelta(days=30)).strftime("%B %d, %Y")
+            subject, html_body = render_cancellation_email(cancellation_date, access_until, membership_id)
+            _email_outbox.enqueue(email, subject, html_body, "cancellation", cursor=cursor)
+
+    # Handle Payment Failed
+    elif event_type == 'payment.failed':
+        membership_id = data.get('membership_id') or data.get('id')
+        email = data.get('email') or data.get('user', {}).get('email')
+        
+        if membership_id:
+            # Get user email if not provided
+            if not email:
+                cursor.execute("SELECT email FROM users WHERE whop_membership_id = %s", (membership_id,))
+                result = cursor.fetchone()
+                if result:
+                    email = result[0]
+            
+            cursor.execute("""
+                UPDATE users 
+                SET license_status = 'suspended'
+                WHERE whop_membership_id = %s
+            """, (membership_id,))
+            logging.warning(f"⚠️ License suspended (payment failed)")
+            
+            # Send payment failed email
+            if email:
+                retry_date = (datetime.now() + timedelta(days=3)).strftime("%B %d, %Y")
+                subject, html_body = render_payment_failed_email(retry_date, membership_id)
+                _email_outbox.enqueue(email, subject, html_body, "payment_failed", cursor=cursor)
+    
+    # Handle Payment Succeeded (renewal)
+    elif event_type in ['payment.succeeded', 'membership.renewed']:
+        membership_id = data.get('membership_id') or data.get('id')
+        email = data.get('email') or data.get('user', {}).get('email')
+        
+        if membership_id and email:
+            # Ensure license is active
+            cursor.execute("""
+                UPDATE users 
+                SET license_status = 'active'
+                WHERE whop_membership_id = %s
+            """, (membership_id,))
+            
+            # Send renewal email
+            renewal_date = datetime.now().strftime("%B %d, %Y")
+            next_billing = (datetime.now() + timedelta(days=30)).strftime("%B %d, %Y")
+            subject, html_body = render_renewal_email(renewal_date, next_billing, membership_id)
+            _email_outbox.enqueue(email, subject, html_body, "renewal", cursor=cursor)
+            logging.info(f"📧 Renewal email queued for {mask_email(email)}")
+
+def process_webhook_inbox_batch():
+    """Claim and apply the next event of each waiting membership. Returns events claimed."""
+    conn = get_db_connection()
+    if not conn:
+        return 0
+
+    try:
+        if not _webhook_inbox_ready:
+            ensure_webhook_inbox_table(conn)
+        with conn.cursor() as cursor:
+            # Re-queue events whose worker died mid-processing
+            cursor.execute("""
+                UPDATE whop_webhook_inbox SET status = 'pending'
+                WHERE status = 'processing' AND claimed_at < NOW() - INTERVAL '10 minutes'
+            """)
+            # Only the oldest open event of a membership is eligible, so a
+            # cancellation is never applied before the activation it follows
+            cursor.execute("""
+                UPDATE whop_webhook_inbox
+                SET status = 'processing', attempts = attempts + 1, claimed_at = NOW()
+                WHERE id IN (
+                    SELECT w.id FROM whop_webhook_inbox w
+                    WHERE w.status = 'pending' AND w.next_attempt_at <= NOW()
+                    AND NOT EXISTS (
+                        SELECT 1 FROM whop_webhook_inbox e
+                        WHERE e.membership_key = w.membership_key
+                        AND e.id < w.id
+                        AND e.status IN ('pending', 'processing')
+                    )
+                    ORDER BY w.id
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id, event_type, payload, attempts
+            """, (WEBHOOK_INBOX_BATCH_SIZE,))
+            claimed = cursor.fetchall()
+        conn.commit()
+
+        for inbox_id, event_type, payload, attempts in sorted(claimed):
+            data = (payload or {}).get('data') or {}
+            try:
+                with conn.cursor() as cursor:
+                    apply_whop_event(cursor, event_type, data)
+                    cursor.execute("""
+                        UPDATE whop_webhook_inbox
+                        SET status = 'done', processed_at = NOW(), last_error = NULL
+                        WHERE id = %s
+                    """, (inbox_id,))
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                give_up = attempts >= WEBHOOK_INBOX_MAX_ATTEMPTS
+                logging.error(f"❌ Whop event {inbox_id} ({event_type}) failed (attempt {attempts}): {e}")
+                with conn.cursor() as cursor:
+                    cursor.execute("""
+                        UPDATE whop_webhook_inbox
+                        SET status = %s, last_error = %s,
+                            next_attempt_at = NOW() + make_interval(secs => %s)
+                        WHERE id = %s
+                    """, ('failed' if give_up else 'pending', str(e)[:1000], 15 * (2 ** (attempts - 1)), inbox_id))
+                    if give_up:
+                        log_webhook_event(event_type, 'error', error=str(e), payload=payload, cursor=cursor)
+                conn.commit()
+
+        if claimed:
+            _email_outbox.wake()
+        return len(claimed)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        return_connection(conn)
+
+def _webhook_inbox_loop():
+    """Apply queued Whop events; woken by the webhook endpoint, polls as a fallback"""
+    while True:
+        claimed = 0
+        try:
+            claimed = process_webhook_inbox_batch()
+        except Exception as e:
+            logging.error(f"Webhook inbox worker error: {e}")
+        if claimed < WEBHOOK_INBOX_BATCH_SIZE:
+            _webhook_inbox_wake.wait(WEBHOOK_INBOX_POLL_SECONDS)
+            _webhook_inbox_wake.clear()
+
+# ============================================================================
+# ADMIN DASHBOARD ENDPOINTS
+# ============================================================================
+
+# Dashboard panels are shared by their endpoints, /api/admin/snapshot and the
+# /admin Socket.IO push; each is queried at most once per TTL per worker
+ADMIN_PANEL_TTL_SECONDS = float(os.environ.get("ADMIN_PANEL_TTL_SECONDS", "5"))
+ADMIN_CHART_TTL_SECONDS = float(os.environ.get("ADMIN_CHART_TTL_SECONDS", "300"))
+_admin_panels = PanelCache()
+
+def _run_panel_query(query_func, *args):
+    """Run a panel query on its own pooled connection"""
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("Database connection failed")
+    try:
+        with conn.cursor(cursor_factory=ProfiledDictCursor) as cursor:
+            result = query_func(cursor, *args)
+        conn.commit()  # Some panels create their table on first use
+        return result
+    finally:
+        return_connection(conn)
 
-    except Exception as e:
-        logging.error(f"Whop webhook error: {e}")
-        return jsonify({"status": "error", "message": str(e)}), 500
+def _query_dashboard_stats(cursor):
+    # Total users
+    cursor.execute("SELECT COUNT(*) as total FROM users")
+    total_users = cursor.fetchone()['total']
+    
+    # Active licenses
+    cursor.execute("SELECT COUNT(*) as active FROM users WHERE license_status = 'ACTIVE'")
+    active_licenses = cursor.fetchone()['active']
+    
+    online_users = presence.count()
+    
+    # API calls in last 24 hours
+    cursor.execute("""
+        SELECT COUNT(*) as count FROM api_logs
+        WHERE created_at > NOW() - INTERVAL '24 hours'
+    """)
+    api_calls_24h = cursor.fetchone()['count']
+    
+    # NOTE: Trade/experience analytics removed from dashboard stats.
+    # Keeping these fields for backward compatibility with the admin UI.
+    total_trades = 0
+    total_pnl = 0.0
+    
+    # Calculate revenue metrics
+    pricing = {
+        'MONTHLY': 200.00,
+        'ANNUAL': 2000.00,
+        'TRIAL': 0.00,
+        'BETA': 0.00
+    }
+    
+    # Get active subscriptions breakdown
+    cursor.execute("""
+        SELECT COUNT(*) as count, UPPER(license_type) as type
+        FROM users
+        WHERE UPPER(license_status) = 'ACTIVE'
+        GROUP BY UPPER(license_type)
+    """)
+    active_breakdown = cursor.fetchall()
+    
+    # Calculate MRR (Monthly Recurring Revenue)
+    mrr = sum(
+        r['count'] * (pricing.get(r['type'], 0) if r['type'] == 'MONTHLY' 
+                     else pricing.get(r['type'], 0) / 12) 
+        for r in active_breakdown
+    )
+    
+    # Calculate ARR (Annual Recurring Revenue)
+    arr = mrr * 12
+    
+    return {
+        "users": {
+            "total": total_users,
+            "active": active_licenses,
+            "online_now": online_users
+        },
+        "api_calls": {
+            "last_24h": api_calls_24h
+        },
+        "trades": {
+            "total": total_trades,
+            "total_pnl": total_pnl
+        },
+        "revenue": {
+            "mrr": round(mrr, 2),
+            "arr": round(arr, 2),
+            "active_subscriptions": active_breakdown
+        }
+    }
 
-# ============================================================================
-# ADMIN DASHBOARD ENDPOINTS
-# ============================================================================
+_admin_panels.register('stats', lambda: _run_panel_query(_query_dashboard_stats), ADMIN_PANEL_TTL_SECONDS)
 
 @app.route('/api/admin/dashboard-stats', methods=['GET'])
 def admin_dashboard_stats():
@@ -2057,92 +2531,11 @@ def admin_dashboard_stats():
     if admin_key != ADMIN_API_KEY:
         return jsonify({"error": "Unauthorized"}), 401
     
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({"error": "Database connection failed"}), 500
-    
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            # Total users
-            cursor.execute("SELECT COUNT(*) as total FROM users")
-            total_users = cursor.fetchone()['total']
-            
-            # Active licenses
-            cursor.execute("SELECT COUNT(*) as active FROM users WHERE license_status = 'ACTIVE'")
-            active_licenses = cursor.fetchone()['active']
-            
-            # Online users (active in last 5 minutes based on API logs)
-            cursor.execute("""
-                SELECT COUNT(DISTINCT license_key) as online FROM api_logs
-                WHERE created_at > NOW() - INTERVAL '5 minutes'
-            """)
-            online_users = cursor.fetchone()['online']
-            
-            # API calls in last 24 hours
-            cursor.execute("""
-                SELECT COUNT(*) as count FROM api_logs
-                WHERE created_at > NOW() - INTERVAL '24 hours'
-            """)
-            api_calls_24h = cursor.fetchone()['count']
-            
-            # NOTE: Trade/experience analytics removed from dashboard stats.
-            # Keeping these fields for backward compatibility with the admin UI.
-            signal_exp_total = 0
-            signal_exp_24h = 0
-            total_trades = 0
-            total_pnl = 0.0
-            
-            # Calculate revenue metrics
-            pricing = {
-                'MONTHLY': 200.00,
-                'ANNUAL': 2000.00,
-                'TRIAL': 0.00,
-                'BETA': 0.00
-            }
-            
-            # Get active subscriptions breakdown
-            cursor.execute("""
-                SELECT COUNT(*) as count, UPPER(license_type) as type
-                FROM users
-                WHERE UPPER(license_status) = 'ACTIVE'
-                GROUP BY UPPER(license_type)
-            """)
-            active_breakdown = cursor.fetchall()
-            
-            # Calculate MRR (Monthly Recurring Revenue)
-            mrr = sum(
-                r['count'] * (pricing.get(r['type'], 0) if r['type'] == 'MONTHLY' 
-                             else pricing.get(r['type'], 0) / 12) 
-                for r in active_breakdown
-            )
-            
-            # Calculate ARR (Annual Recurring Revenue)
-            arr = mrr * 12
-            
-            return jsonify({
-                "users": {
-                    "total": total_users,
-                    "active": active_licenses,
-                    "online_now": online_users
-                },
-                "api_calls": {
-                    "last_24h": api_calls_24h
-                },
-                "trades": {
-                    "total": total_trades,
-                    "total_pnl": total_pnl
-                },
-                "revenue": {
-                    "mrr": round(mrr, 2),
-                    "arr": round(arr, 2),
-                    "active_subscriptions": active_breakdown
-                }
-            }), 200
+        return jsonify(_admin_panels.get('stats')), 200
     except Exception as e:
         logging.error(f"Dashboard stats error: {e}")
         return jsonify({"error": str(e)}), 500
-    finally:
-        return_connection(conn)
 
 # Discord bot status tracking
 _discord_bot_status = {
@@ -2188,13 +2581,7 @@ def discord_ticket_event():
     logging.info(f"Discord ticket event: {event}")
     return jsonify({"status": "ok"}), 200
 
-@app.route('/api/admin/discord-status', methods=['GET'])
-def admin_discord_status():
-    """Get Discord bot status for admin dashboard"""
-    admin_key = request.args.get('license_key') or request.args.get('admin_key')
-    if admin_key != ADMIN_API_KEY:
-        return jsonify({"error": "Unauthorized"}), 401
-    
+def _discord_status_payload():
     # Check if bot is still online (heartbeat within last 2 minutes)
     is_online = False
     if _discord_bot_status['last_heartbeat']:
@@ -2205,24 +2592,64 @@ def admin_discord_status():
         except:
             pass
     
-    # Calculate uptime
-    uptime_seconds = 0
-    if _discord_bot_status['uptime_start'] and is_online:
-        try:
-            start = datetime.fromisoformat(_discord_bot_status['uptime_start'].replace('Z', '+00:00'))
-            uptime_seconds = int((datetime.now(timezone.utc) - start).total_seconds())
-        except:
-            pass
-    
-    return jsonify({
+    # Uptime is computed by the client from started_at - a clock-derived field would
+    # change the panel's version (and the admin ETag) on every read
+    return {
         "online": is_online,
         "last_heartbeat": _discord_bot_status['last_heartbeat'],
         "tickets_created_total": _discord_bot_status['tickets_created'],
         "tickets_closed_total": _discord_bot_status['tickets_closed'],
         "active_tickets": _discord_bot_status['active_tickets'],
         "connected_servers": _discord_bot_status['connected_servers'],
-        "uptime_seconds": uptime_seconds
-    }), 200
+        "started_at": _discord_bot_status['uptime_start'] if is_online else None
+    }
+
+# In-memory only, so no TTL
+_admin_panels.register('discord', _discord_status_payload, 0)
+
+@app.route('/api/admin/discord-status', methods=['GET'])
+def admin_discord_status():
+    """Get Discord bot status for admin dashboard"""
+    admin_key = request.args.get('license_key') or request.args.get('admin_key')
+    if admin_key != ADMIN_API_KEY:
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    return jsonify(_discord_status_payload()), 200
+
+def _query_users(cursor):
+    # Primary query without any trade/experience tables.
+    cursor.execute("""
+        SELECT u.account_id, u.email, u.license_key, u.license_type, u.license_status,
+               u.license_expiration, u.created_at,
+               MAX(a.created_at) as last_active,
+               COUNT(a.id) as api_call_count
+        FROM users u
+        LEFT JOIN api_logs a ON u.license_key = a.license_key
+        GROUP BY u.account_id, u.email, u.license_key, u.license_type, u.license_status,
+                 u.license_expiration, u.created_at
+        ORDER BY u.created_at DESC
+    """)
+    users = cursor.fetchall()
+    
+    # Format for dashboard (use account_id instead of id for compatibility)
+    formatted_users = []
+    for user in users:
+        formatted_users.append({
+            "account_id": user['account_id'],
+            "email": user['email'],
+            "license_key": user['license_key'],
+            "license_type": user['license_type'].upper() if user['license_type'] else 'MONTHLY',
+            "license_status": user['license_status'].upper() if user['license_status'] else 'ACTIVE',
+            "license_expiration": format_datetime_utc(user['license_expiration']),
+            "created_at": format_datetime_utc(user['created_at']),
+            "last_active": format_datetime_utc(user['last_active']),
+            "is_online": presence.is_online(user['license_key']),
+            "api_call_count": int(user['api_call_count']) if user['api_call_count'] else 0,
+            "trade_count": 0
+        })
+    return formatted_users
+
+_admin_panels.register('users', lambda: _run_panel_query(_query_users), ADMIN_PANEL_TTL_SECONDS)
 
 @app.route('/api/admin/users', methods=['GET'])
 def admin_list_users():
@@ -2231,51 +2658,11 @@ def admin_list_users():
     if admin_key != ADMIN_API_KEY:
         return jsonify({"error": "Unauthorized"}), 401
     
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({"error": "Database connection failed"}), 500
-    
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            # Primary query without any trade/experience tables.
-            cursor.execute("""
-                SELECT u.account_id, u.email, u.license_key, u.license_type, u.license_status,
-                       u.license_expiration, u.created_at,
-                       MAX(a.created_at) as last_active,
-                       CASE WHEN MAX(a.created_at) > NOW() - INTERVAL '5 minutes'
-                            THEN true ELSE false END as is_online,
-                       COUNT(a.id) as api_call_count
-                FROM users u
-                LEFT JOIN api_logs a ON u.license_key = a.license_key
-                GROUP BY u.account_id, u.email, u.license_key, u.license_type, u.license_status,
-                         u.license_expiration, u.created_at
-                ORDER BY u.created_at DESC
-            """)
-            users = cursor.fetchall()
-            
-            # Format for dashboard (use account_id instead of id for compatibility)
-            formatted_users = []
-            for user in users:
-                formatted_users.append({
-                    "account_id": user['account_id'],
-                    "email": user['email'],
-                    "license_key": user['license_key'],
-                    "license_type": user['license_type'].upper() if user['license_type'] else 'MONTHLY',
-                    "license_status": user['license_status'].upper() if user['license_status'] else 'ACTIVE',
-                    "license_expiration": format_datetime_utc(user['license_expiration']),
-                    "created_at": format_datetime_utc(user['created_at']),
-                    "last_active": format_datetime_utc(user['last_active']),
-                    "is_online": user['is_online'],
-                    "api_call_count": int(user['api_call_count']) if user['api_call_count'] else 0,
-                    "trade_count": 0
-                })
-            
-            return jsonify({"users": formatted_users}), 200
+        return jsonify({"users": _admin_panels.get('users')}), 200
     except Exception as e:
         logging.error(f"List users error: {e}")
         return jsonify({"error": str(e)}), 500
-    finally:
-        return_connection(conn)
 
 @app.route('/api/admin/user/<account_id>', methods=['GET'])
 def admin_get_user(account_id):
@@ -2289,7 +2676,7 @@ def admin_get_user(account_id):
         return jsonify({"error": "Database connection failed"}), 500
     
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+        with conn.cursor(cursor_factory=ProfiledDictCursor) as cursor:
             # Get user details with last active from api_logs
             cursor.execute("""
                 SELECT u.account_id, u.email, u.license_key, u.license_type, u.license_status,
@@ -2348,6 +2735,41 @@ def admin_get_user(account_id):
     finally:
         return_connection(conn)
 
+ADMIN_ACTIVITY_PANEL_LIMIT = 50
+
+def _query_recent_activity(cursor, limit):
+    cursor.execute("""
+        SELECT 
+            a.created_at as timestamp,
+            COALESCE(u.id::text, 'Unknown') as account_id,
+            a.endpoint,
+            'POST' as method,
+            a.status_code,
+            0 as response_time_ms,
+            '0.0.0.0' as ip_address
+        FROM api_logs a
+        LEFT JOIN users u ON a.license_key = u.license_key
+        ORDER BY a.created_at DESC
+        LIMIT %s
+    """, (limit,))
+    activity = cursor.fetchall()
+    
+    formatted_activity = []
+    for act in activity:
+        formatted_activity.append({
+            "timestamp": act['timestamp'].isoformat() if act['timestamp'] else None,
+            "account_id": act['account_id'],
+            "endpoint": act['endpoint'],
+            "method": act['method'],
+            "status_code": act['status_code'],
+            "response_time_ms": act['response_time_ms'],
+            "ip_address": act['ip_address']
+        })
+    return formatted_activity
+
+_admin_panels.register('activity', lambda: _run_panel_query(_query_recent_activity, ADMIN_ACTIVITY_PANEL_LIMIT),
+                       ADMIN_PANEL_TTL_SECONDS)
+
 @app.route('/api/admin/recent-activity', methods=['GET'])
 def admin_recent_activity():
     """Get recent API activity"""
@@ -2355,48 +2777,66 @@ def admin_recent_activity():
     if admin_key != ADMIN_API_KEY:
         return jsonify({"error": "Unauthorized"}), 401
     
-    limit = int(request.args.get('limit', 50))
-    
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({"activity": []}), 200
+    limit = int(request.args.get('limit', ADMIN_ACTIVITY_PANEL_LIMIT))
     
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            cursor.execute("""
-                SELECT 
-                    a.created_at as timestamp,
-                    COALESCE(u.id::text, 'Unknown') as account_id,
-                    a.endpoint,
-                    'POST' as method,
-                    a.status_code,
-                    0 as response_time_ms,
-                    '0.0.0.0' as ip_address
-                FROM api_logs a
-                LEFT JOIN users u ON a.license_key = u.license_key
-                ORDER BY a.created_at DESC
-                LIMIT %s
-            """, (limit,))
-            activity = cursor.fetchall()
-            
-            formatted_activity = []
-            for act in activity:
-                formatted_activity.append({
-                    "timestamp": act['timestamp'].isoformat() if act['timestamp'] else None,
-                    "account_id": act['account_id'],
-                    "endpoint": act['endpoint'],
-                    "method": act['method'],
-                    "status_code": act['status_code'],
-                    "response_time_ms": act['response_time_ms'],
-                    "ip_address": act['ip_address']
-                })
-            
-            return jsonify({"activity": formatted_activity}), 200
+        if limit == ADMIN_ACTIVITY_PANEL_LIMIT:
+            return jsonify({"activity": _admin_panels.get('activity')}), 200
+        return jsonify({"activity": _run_panel_query(_query_recent_activity, limit)}), 200
     except Exception as e:
         logging.error(f"Recent activity error: {e}")
         return jsonify({"activity": []}), 200
-    finally:
-        return_connection(conn)
+
+def _query_online_users(cursor):
+    # Who is online comes from presence; the DB only supplies account details
+    online = {entry['key']: entry for entry in presence.online()}
+    if not online:
+        return []
+    cursor.execute("""
+        SELECT u.account_id, u.email, u.license_key, u.license_type, u.metadata
+        FROM users u
+        WHERE u.license_key = ANY(%s)
+        AND UPPER(u.license_status) = 'ACTIVE'
+    """, (list(online),))
+    users = {row['license_key']: row for row in cursor.fetchall()}
+    
+    formatted = []
+    for license_key, entry in online.items():  # Most recently seen first
+        user = users.get(license_key)
+        if not user:
+            continue
+        # Live heartbeat metadata wins over the last value persisted on the user row
+        metadata = entry['info'].get('metadata') or user.get('metadata') or {}
+        if isinstance(metadata, str):
+            metadata = json.loads(metadata)
+        
+        formatted.append({
+            "account_id": user['account_id'],
+            "email": user['email'],
+            "license_key": user['license_key'],
+            "license_type": user['license_type'],
+            "last_active": format_datetime_utc(entry['last_seen']),
+            # Real-time performance from heartbeat metadata
+            "symbol": metadata.get('symbol', 'N/A'),
+            "session_pnl": metadata.get('session_pnl', 0),
+            "total_trades": metadata.get('total_trades', 0),
+            "winning_trades": metadata.get('winning_trades', 0),
+            "losing_trades": metadata.get('losing_trades', 0),
+            "win_rate": metadata.get('win_rate', 0),
+            "current_position": metadata.get('current_position', 0),
+            "position_pnl": metadata.get('position_pnl', 0),
+            "status": metadata.get('status', 'unknown'),
+            "shadow_mode": metadata.get('shadow_mode', False),
+            # License status indicators
+            "license_expired": metadata.get('license_expired', False),
+            "license_grace_period": metadata.get('license_grace_period', False),
+            "near_expiry_mode": metadata.get('near_expiry_mode', False),
+            "days_until_expiration": metadata.get('days_until_expiration'),
+            "hours_until_expiration": metadata.get('hours_until_expiration')
+        })
+    return formatted
+
+_admin_panels.register('online_users', lambda: _run_panel_query(_query_online_users), ADMIN_PANEL_TTL_SECONDS)
 
 @app.route('/api/admin/online-users', methods=['GET'])
 def admin_online_users():
@@ -2405,61 +2845,11 @@ def admin_online_users():
     if admin_key != ADMIN_API_KEY:
         return jsonify({"error": "Unauthorized"}), 401
     
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({"users": []}), 200
-    
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            # Get online users with latest heartbeat data
-            cursor.execute("""
-                SELECT u.account_id, u.email, u.license_key, u.license_type, 
-                       u.last_heartbeat, u.metadata
-                FROM users u
-                WHERE u.last_heartbeat > NOW() - INTERVAL '2 minutes'
-                AND UPPER(u.license_status) = 'ACTIVE'
-                ORDER BY u.last_heartbeat DESC
-            """)
-            online = cursor.fetchall()
-            
-            formatted = []
-            for user in online:
-                metadata = user.get('metadata', {})
-                if isinstance(metadata, str):
-                    import json
-                    metadata = json.loads(metadata)
-                
-                formatted.append({
-                    "account_id": user['account_id'],
-                    "email": user['email'],
-                    "license_key": user['license_key'],
-                    "license_type": user['license_type'],
-                    "last_active": user['last_heartbeat'].isoformat() if user['last_heartbeat'] else None,
-                    # Real-time performance from heartbeat metadata
-                    "symbol": metadata.get('symbol', 'N/A'),
-                    "session_pnl": metadata.get('session_pnl', 0),
-                    "total_trades": metadata.get('total_trades', 0),
-                    "winning_trades": metadata.get('winning_trades', 0),
-                    "losing_trades": metadata.get('losing_trades', 0),
-                    "win_rate": metadata.get('win_rate', 0),
-                    "current_position": metadata.get('current_position', 0),
-                    "position_pnl": metadata.get('position_pnl', 0),
-                    "status": metadata.get('status', 'unknown'),
-                    "shadow_mode": metadata.get('shadow_mode', False),
-                    # License status indicators
-                    "license_expired": metadata.get('license_expired', False),
-                    "license_grace_period": metadata.get('license_grace_period', False),
-                    "near_expiry_mode": metadata.get('near_expiry_mode', False),
-                    "days_until_expiration": metadata.get('days_until_expiration'),
-                    "hours_until_expiration": metadata.get('hours_until_expiration')
-                })
-            
-            return jsonify({"users": formatted}), 200
+        return jsonify({"users": _admin_panels.get('online_users')}), 200
     except Exception as e:
         logging.error(f"Online users error: {e}")
         return jsonify({"users": []}), 200
-    finally:
-        return_connection(conn)
 
 @app.route('/api/admin/suspend-user/<account_id>', methods=['POST', 'PUT'])
 def admin_suspend_user(account_id):
@@ -2540,7 +2930,7 @@ def admin_extend_license(account_id):
         with conn.cursor() as cursor:
             cursor.execute("""
                 UPDATE users 
-                SET license_expiration = COALESCE(license_expiration, NOW()) + INTERVAL '%s days'
+                SET license_expiration = COALESCE(license_expiration, NOW()) + make_interval(days => %s)
                 WHERE account_id = %s OR license_key = %s
                 RETURNING license_key, license_expiration
             """, (days, account_id, account_id))
@@ -2665,86 +3055,305 @@ def admin_add_user():
                 RETURNING license_key
             """, (account_id, email, license_key, license_type, expiration))
             conn.commit()
-            
-            return jsonify({
-                "status": "success",
-                "license_key": license_key,
-                "account_id": account_id,
-                "email": email,
-                "expires_at": format_datetime_utc(expiration),
-                "expiration": format_datetime_utc(expiration)  # Keep for backward compatibility
-            }), 201
-    except Exception as e:
-        logging.error(f"Add user error: {e}")
-        return jsonify({"error": str(e)}), 500
+            
+            return jsonify({
+                "status": "success",
+                "license_key": license_key,
+                "account_id": account_id,
+                "email": email,
+                "expires_at": format_datetime_utc(expiration),
+                "expiration": format_datetime_utc(expiration)  # Keep for backward compatibility
+            }), 201
+    except Exception as e:
+        logging.error(f"Add user error: {e}")
+        return jsonify({"error": str(e)}), 500
+    finally:
+        return_connection(conn)
+
+@app.route('/api/admin/send-license-email', methods=['POST'])
+def admin_send_license_email():
+    """Send a license key via email"""
+    admin_key = request.args.get('license_key') or request.args.get('admin_key')
+    if admin_key != ADMIN_API_KEY:
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    data = request.get_json()
+    email = data.get('email')
+    license_key = data.get('license_key')
+    
+    logging.info(f"📧 Send email request - email: {mask_email(email)}, license_key: {mask_sensitive(license_key)}")
+    
+    if not email or not license_key:
+        return jsonify({"error": "Email and license_key are required"}), 400
+    
+    try:
+        success = send_license_email(email, license_key)
+        if success:
+            return jsonify({"status": "success", "message": "Email sent successfully"}), 200
+        else:
+            return jsonify({"error": "Failed to send email"}), 500
+    except Exception as e:
+        logging.error(f"Send email error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+# ============================================================================
+# END ADMIN DASHBOARD ENDPOINTS
+# ============================================================================
+
+@app.route('/api/admin/expire-licenses', methods=['POST'])
+def expire_licenses():
+    """Manually trigger license expiration check (can be called by cron/scheduler)"""
+    try:
+        api_key = request.headers.get('X-Admin-Key')
+        if api_key != ADMIN_API_KEY:
+            return jsonify({"status": "error", "message": "Unauthorized"}), 401
+        
+        expired = run_license_expiry()
+        if expired is None:
+            return jsonify({"status": "error", "message": "Database error"}), 500
+        
+        return jsonify({
+            "status": "success",
+            "expired_count": len(expired),
+            "expired_licenses": expired
+        }), 200
+            
+    except Exception as e:
+        logging.error(f"Error expiring licenses: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+# ============================================================================
+# BACKGROUND SCHEDULER - license expiry, stale session purge, expiry emails
+# ============================================================================
+# Runs in-process on every worker; only the advisory-lock leader executes database jobs.
+
+SCHEDULER_ENABLED = os.environ.get("SCHEDULER_ENABLED", "true").lower() == "true"
+LICENSE_EXPIRY_INTERVAL_SECONDS = int(os.environ.get("LICENSE_EXPIRY_INTERVAL_SECONDS", "60"))
+SESSION_SWEEP_INTERVAL_SECONDS = int(os.environ.get("SESSION_SWEEP_INTERVAL_SECONDS", "60"))
+EXPIRY_NOTICE_INTERVAL_SECONDS = int(os.environ.get("EXPIRY_NOTICE_INTERVAL_SECONDS", "60"))
+# Sessions are ignored after SESSION_TIMEOUT_SECONDS; rows are deleted after this
+STALE_SESSION_PURGE_SECONDS = int(os.environ.get("STALE_SESSION_PURGE_SECONDS", "300"))
+SCHEDULER_BATCH_SIZE = int(os.environ.get("SCHEDULER_BATCH_SIZE", "500"))
+SCHEDULER_RUN_RETENTION_DAYS = int(os.environ.get("SCHEDULER_RUN_RETENTION_DAYS", "7"))
+
+def ensure_scheduler_tables(conn):
+    """Create the job history table and columns used by scheduled jobs."""
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS scheduler_runs (
+                    id SERIAL PRIMARY KEY,
+                    job_name VARCHAR(100) NOT NULL,
+                    started_at TIMESTAMP WITH TIME ZONE NOT NULL,
+                    duration_ms REAL,
+                    rows_affected INTEGER,
+                    error TEXT,
+                    worker_id VARCHAR(255)
+                )
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_scheduler_runs_started ON scheduler_runs(started_at DESC)")
+            # Set by the expiry job, cleared when the expiry email is claimed
+            cursor.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS expiry_notice_pending BOOLEAN DEFAULT FALSE")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_active_sessions_heartbeat ON active_sessions(last_heartbeat)")
+            conn.commit()
+    except Exception as e:
+        conn.rollback()
+        logging.error(f"Error creating scheduler tables: {e}")
+
+def run_license_expiry():
+    """Expire overdue active licenses in set-based batches.
+    
+    Returns:
+        List of expired license keys, or None if the database is unavailable
+    """
+    conn = get_db_connection()
+    if not conn:
+        return None
+    
+    expired_keys = []
+    try:
+        with conn.cursor() as cursor:
+            while True:
+                # SKIP LOCKED lets a manual /expire-licenses call run alongside the job
+                cursor.execute("""
+                    UPDATE users
+                    SET license_status = 'expired', expiry_notice_pending = TRUE
+                    WHERE license_key IN (
+                        SELECT license_key FROM users
+                        WHERE license_expiration < NOW()
+                        AND UPPER(license_status) = 'ACTIVE'
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING license_key
+                """, (SCHEDULER_BATCH_SIZE,))
+                batch = [row[0] for row in cursor.fetchall()]
+                conn.commit()
+                expired_keys.extend(batch)
+                if len(batch) < SCHEDULER_BATCH_SIZE:
+                    break
+        
+        if expired_keys:
+            invalidate_license_caches(expired_keys)
+            logging.info(f"⌛ Expired {len(expired_keys)} licenses")
+        return expired_keys
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        return_connection(conn)
+
+def purge_stale_sessions():
+    """Delete active_sessions rows that stopped heartbeating. Returns rows deleted."""
+    conn = get_db_connection()
+    if not conn:
+        return 0
+    
+    deleted = 0
+    try:
+        with conn.cursor() as cursor:
+            while True:
+                cursor.execute("""
+                    DELETE FROM active_sessions
+                    WHERE id IN (
+                        SELECT id FROM active_sessions
+                        WHERE last_heartbeat < NOW() - make_interval(secs => %s)
+                        LIMIT %s
+                    )
+                """, (STALE_SESSION_PURGE_SECONDS, SCHEDULER_BATCH_SIZE))
+                batch = cursor.rowcount
+                conn.commit()
+                deleted += batch
+                if batch < SCHEDULER_BATCH_SIZE:
+                    break
+        return deleted
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        return_connection(conn)
+
+def send_pending_expiry_notices():
+    """Claim licenses flagged by the expiry job and send expiration emails. Returns emails sent."""
+    conn = get_db_connection()
+    if not conn:
+        return 0
+    
+    try:
+        with conn.cursor() as cursor:
+            # Claim first so a crash mid-send never produces duplicate emails
+            cursor.execute("""
+                UPDATE users
+                SET expiry_notice_pending = FALSE
+                WHERE license_key IN (
+                    SELECT license_key FROM users
+                    WHERE expiry_notice_pending = TRUE
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING email, license_expiration
+            """, (SCHEDULER_BATCH_SIZE,))
+            claimed = cursor.fetchall()
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        return_connection(conn)
+    
+    sent = 0
+    for email, expiration in claimed:
+        if not email:
+            continue
+        expiration_date = expiration.strftime("%B %d, %Y") if expiration else datetime.now().strftime("%B %d, %Y")
+        if send_subscription_expired_email(email, expiration_date):
+            sent += 1
+    return sent
+
+def sweep_in_memory_caches():
+    """Prune idle per-license state held in process memory. Returns entries removed."""
+    return sweep_rate_limit_cache()
+
+def record_scheduler_run(job_name, started_at, duration_ms, rows, error, worker_id):
+    """Persist a job run so every worker's admin endpoint can show history."""
+    conn = get_db_connection()
+    if not conn:
+        return
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO scheduler_runs (job_name, started_at, duration_ms, rows_affected, error, worker_id)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, (job_name, started_at, duration_ms, rows, error, worker_id))
+            conn.commit()
     finally:
         return_connection(conn)
 
-@app.route('/api/admin/send-license-email', methods=['POST'])
-def admin_send_license_email():
-    """Send a license key via email"""
+def _run_scheduler_setup():
+    """Leader-only setup job: make sure tables exist before other jobs run, and prune run history.
+    Returns history rows deleted."""
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("Database connection failed")
+    try:
+        ensure_active_sessions_table(conn)
+        ensure_scheduler_tables(conn)
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                DELETE FROM scheduler_runs
+                WHERE started_at < NOW() - make_interval(days => %s)
+            """, (SCHEDULER_RUN_RETENTION_DAYS,))
+            pruned = cursor.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        return_connection(conn)
+    return pruned
+
+_scheduler = LeaderScheduler(connect=open_direct_connection, record_run=record_scheduler_run)
+# Registered first so it runs before the jobs that depend on its tables
+_scheduler.add_job('ensure_tables', _run_scheduler_setup, 3600)
+_scheduler.add_job('expire_licenses', lambda: len(run_license_expiry() or []), LICENSE_EXPIRY_INTERVAL_SECONDS)
+_scheduler.add_job('purge_stale_sessions', purge_stale_sessions, SESSION_SWEEP_INTERVAL_SECONDS)
+_scheduler.add_job('expiry_notices', send_pending_expiry_notices, EXPIRY_NOTICE_INTERVAL_SECONDS)
+# Process-local caches: every worker prunes its own
+_scheduler.add_job('sweep_caches', sweep_in_memory_caches, SESSION_SWEEP_INTERVAL_SECONDS, every_worker=True)
+
+@app.route('/api/admin/scheduler', methods=['GET'])
+def admin_scheduler_status():
+    """Scheduler leadership, per-job stats for this worker, and recent run history"""
     admin_key = request.args.get('license_key') or request.args.get('admin_key')
     if admin_key != ADMIN_API_KEY:
         return jsonify({"error": "Unauthorized"}), 401
     
-    data = request.get_json()
-    email = data.get('email')
-    license_key = data.get('license_key')
-    
-    logging.info(f"📧 Send email request - email: {mask_email(email)}, license_key: {mask_sensitive(license_key)}")
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    result = {"worker": _scheduler.status(), "recent_runs": []}
     
-    if not email or not license_key:
-        return jsonify({"error": "Email and license_key are required"}), 400
+    conn = get_db_connection()
+    if not conn:
+        return jsonify(result), 200
     
     try:
-        success = send_license_email(email, license_key)
-        if success:
-            return jsonify({"status": "success", "message": "Email sent successfully"}), 200
-        else:
-            return jsonify({"error": "Failed to send email"}), 500
-    except Exception as e:
-        logging.error(f"Send email error: {e}")
-        return jsonify({"error": str(e)}), 500
-
-# ============================================================================
-# END ADMIN DASHBOARD ENDPOINTS
-# ============================================================================
-
-@app.route('/api/admin/expire-licenses', methods=['POST'])
-def expire_licenses():
-    """Manually trigger license expiration check (can be called by cron/scheduler)"""
-    try:
-        api_key = request.headers.get('X-Admin-Key')
-        if api_key != ADMIN_API_KEY:
-            return jsonify({"status": "error", "message": "Unauthorized"}), 401
-        
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({"status": "error", "message": "Database error"}), 500
-        
-        try:
-            with conn.cursor() as cursor:
-                cursor.execute("""
-                    UPDATE users 
-                    SET license_status = 'expired'
-                    WHERE license_expiration < NOW() 
-                    AND license_status = 'active'
-                    RETURNING license_key, email
-                """)
-                expired = cursor.fetchall()
-                conn.commit()
-                
-                return jsonify({
-                    "status": "success",
-                    "expired_count": len(expired),
-                    "expired_licenses": [row[0] for row in expired]
-                }), 200
-        finally:
-            return_connection(conn)
-            
+        with conn.cursor(cursor_factory=ProfiledDictCursor) as cursor:
+            cursor.execute("""
+                SELECT job_name, started_at, duration_ms, rows_affected, error, worker_id
+                FROM scheduler_runs
+                ORDER BY started_at DESC
+                LIMIT %s
+            """, (limit,))
+            result["recent_runs"] = [
+                {**row, "started_at": format_datetime_utc(row['started_at'])}
+                for row in cursor.fetchall()
+            ]
+        return jsonify(result), 200
     except Exception as e:
-        logging.error(f"Error expiring licenses: {e}")
-        return jsonify({"status": "error", "message": str(e)}), 500
+        logging.error(f"Scheduler status error: {e}")
+        result["error"] = str(e)
+        return jsonify(result), 200
+    finally:
+        return_connection(conn)
 
 # ============================================================================
 # Deprecated analytics section
@@ -2823,7 +3432,7 @@ def get_user_profile():
             return jsonify({"error": "Database connection failed"}), 500
         
         try:
-            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            with conn.cursor(cursor_factory=ProfiledDictCursor) as cursor:
                 # 1. Get user profile details and check status
                 cursor.execute("""
                     SELECT account_id, email, license_type, license_status,
@@ -2894,15 +3503,7 @@ def get_user_profile():
                         created = user['created_at']
                     account_age_days = (now - created).days
                 
-                # Online status (heartbeat within last 2 minutes)
-                is_online = False
-                if user['last_heartbeat']:
-                    if user['last_heartbeat'].tzinfo is None:
-                        last_hb = user['last_heartbeat'].replace(tzinfo=timezone.utc)
-                    else:
-                        last_hb = user['last_heartbeat']
-                    time_since_heartbeat = (now - last_hb).total_seconds()
-                    is_online = time_since_heartbeat < 120  # 2 minutes
+                is_online = presence.is_online(license_key)
                 
                 # Win rate calculation
                 total_trades = int(trade_stats['total_trades']) if trade_stats['total_trades'] else 0
@@ -2980,6 +3581,62 @@ def root():
 
 # ========== PHASE 2: CHART DATA ENDPOINTS ==========
 
+def _query_chart_user_growth(cursor):
+    cursor.execute("""
+        SELECT 
+            DATE_TRUNC('week', created_at) as week,
+            COUNT(*) as count
+        FROM users
+        WHERE created_at >= NOW() - INTERVAL '12 weeks'
+        GROUP BY week
+        ORDER BY week
+    """)
+    results = cursor.fetchall()
+    
+    weeks = [f"Week {i+1}" for i in range(len(results))]
+    counts = [int(r['count']) for r in results]
+    return {"weeks": weeks, "counts": counts}
+
+def _query_chart_api_usage(cursor):
+    cursor.execute("""
+        SELECT 
+            EXTRACT(HOUR FROM timestamp) as hour,
+            COUNT(*) as count
+        FROM api_logs
+        WHERE timestamp >= NOW() - INTERVAL '24 hours'
+        GROUP BY hour
+        ORDER BY hour
+    """)
+    results = cursor.fetchall()
+    
+    # Create 24-hour array with 0 for missing hours
+    hour_counts = {int(r['hour']): int(r['count']) for r in results}
+    hours = [f"{h:02d}:00" for h in range(24)]
+    counts = [hour_counts.get(h, 0) for h in range(24)]
+    return {"hours": hours, "counts": counts}
+
+def _query_chart_mrr(cursor):
+    cursor.execute("""
+        SELECT 
+            TO_CHAR(DATE_TRUNC('month', created_at), 'Mon') as month,
+            COUNT(*) FILTER (WHERE license_type = 'MONTHLY') * 200.00 +
+            COUNT(*) FILTER (WHERE license_type = 'ANNUAL') * 2000.00 as revenue
+        FROM users
+        WHERE created_at >= NOW() - INTERVAL '6 months'
+        AND UPPER(license_status) = 'ACTIVE'
+        GROUP BY DATE_TRUNC('month', created_at)
+        ORDER BY DATE_TRUNC('month', created_at)
+    """)
+    results = cursor.fetchall()
+    
+    months = [r['month'] for r in results]
+    revenue = [float(r['revenue']) if r['revenue'] else 0 for r in results]
+    return {"months": months, "revenue": revenue}
+
+_admin_panels.register('chart_user_growth', lambda: _run_panel_query(_query_chart_user_growth), ADMIN_CHART_TTL_SECONDS)
+_admin_panels.register('chart_api_usage', lambda: _run_panel_query(_query_chart_api_usage), ADMIN_CHART_TTL_SECONDS)
+_admin_panels.register('chart_mrr', lambda: _run_panel_query(_query_chart_mrr), ADMIN_CHART_TTL_SECONDS)
+
 @app.route('/api/admin/charts/user-growth', methods=['GET'])
 def admin_chart_user_growth():
     """Get user growth by week for last 12 weeks"""
@@ -2987,32 +3644,11 @@ def admin_chart_user_growth():
     if admin_key != ADMIN_API_KEY:
         return jsonify({"error": "Unauthorized"}), 401
     
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({"weeks": [], "counts": []}), 200
-    
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            cursor.execute("""
-                SELECT 
-                    DATE_TRUNC('week', created_at) as week,
-                    COUNT(*) as count
-                FROM users
-                WHERE created_at >= NOW() - INTERVAL '12 weeks'
-                GROUP BY week
-                ORDER BY week
-            """)
-            results = cursor.fetchall()
-            
-            weeks = [f"Week {i+1}" for i in range(len(results))]
-            counts = [int(r['count']) for r in results]
-            
-            return jsonify({"weeks": weeks, "counts": counts}), 200
+        return jsonify(_admin_panels.get('chart_user_growth')), 200
     except Exception as e:
         logging.error(f"User growth chart error: {e}")
         return jsonify({"weeks": [], "counts": []}), 200
-    finally:
-        return_connection(conn)
 
 @app.route('/api/admin/charts/api-usage', methods=['GET'])
 def admin_chart_api_usage():
@@ -3021,34 +3657,11 @@ def admin_chart_api_usage():
     if admin_key != ADMIN_API_KEY:
         return jsonify({"error": "Unauthorized"}), 401
     
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({"hours": [], "counts": []}), 200
-    
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            cursor.execute("""
-                SELECT 
-                    EXTRACT(HOUR FROM timestamp) as hour,
-                    COUNT(*) as count
-                FROM api_logs
-                WHERE timestamp >= NOW() - INTERVAL '24 hours'
-                GROUP BY hour
-                ORDER BY hour
-            """)
-            results = cursor.fetchall()
-            
-            # Create 24-hour array with 0 for missing hours
-            hour_counts = {int(r['hour']): int(r['count']) for r in results}
-            hours = [f"{h:02d}:00" for h in range(24)]
-            counts = [hour_counts.get(h, 0) for h in range(24)]
-            
-            return jsonify({"hours": hours, "counts": counts}), 200
+        return jsonify(_admin_panels.get('chart_api_usage')), 200
     except Exception as e:
         logging.error(f"API usage chart error: {e}")
         return jsonify({"hours": [], "counts": []}), 200
-    finally:
-        return_connection(conn)
 
 @app.route('/api/admin/charts/mrr', methods=['GET'])
 def admin_chart_mrr():
@@ -3057,34 +3670,11 @@ def admin_chart_mrr():
     if admin_key != ADMIN_API_KEY:
         return jsonify({"error": "Unauthorized"}), 401
     
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({"months": [], "revenue": []}), 200
-    
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            cursor.execute("""
-                SELECT 
-                    TO_CHAR(DATE_TRUNC('month', created_at), 'Mon') as month,
-                    COUNT(*) FILTER (WHERE license_type = 'MONTHLY') * 200.00 +
-                    COUNT(*) FILTER (WHERE license_type = 'ANNUAL') * 2000.00 as revenue
-                FROM users
-                WHERE created_at >= NOW() - INTERVAL '6 months'
-                AND UPPER(license_status) = 'ACTIVE'
-                GROUP BY DATE_TRUNC('month', created_at)
-                ORDER BY DATE_TRUNC('month', created_at)
-            """)
-            results = cursor.fetchall()
-            
-            months = [r['month'] for r in results]
-            revenue = [float(r['revenue']) if r['revenue'] else 0 for r in results]
-            
-            return jsonify({"months": months, "revenue": revenue}), 200
+        return jsonify(_admin_panels.get('chart_mrr')), 200
     except Exception as e:
         logging.error(f"MRR chart error: {e}")
         return jsonify({"months": [], "revenue": []}), 200
-    finally:
-        return_connection(conn)
 
 @app.route('/api/admin/charts/collective-pnl', methods=['GET'])
 def admin_chart_collective_pnl():
@@ -3157,7 +3747,7 @@ def admin_report_user_activity():
             password=DB_PASSWORD,
             port=DB_PORT
         )
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        cursor = conn.cursor(cursor_factory=ProfiledDictCursor)
         
         query = """
             SELECT 
@@ -3236,7 +3826,7 @@ def admin_report_revenue():
             password=DB_PASSWORD,
             port=DB_PORT
         )
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        cursor = conn.cursor(cursor_factory=ProfiledDictCursor)
         
         # Define pricing
         pricing = {
@@ -3358,7 +3948,7 @@ def admin_report_retention():
             password=DB_PASSWORD,
             port=DB_PORT
         )
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        cursor = conn.cursor(cursor_factory=ProfiledDictCursor)
         
         # Current active users
         cursor.execute("SELECT COUNT(*) as count FROM users WHERE UPPER(license_status) = 'ACTIVE'")
@@ -3451,147 +4041,100 @@ def init_database_if_needed():
     except Exception as e:
         app.logger.warning(f"Database initialization check: {e}")
 
-@app.route('/api/health', methods=['GET'])
-def api_health_check():
-    """Public health check endpoint for server infrastructure monitoring"""
+# Health probes run on a background thread every HEALTH_PROBE_INTERVAL_SECONDS;
+# /api/health and /api/admin/system-health only read the latest snapshot
+HEALTH_PROBE_INTERVAL_SECONDS = float(os.environ.get("HEALTH_PROBE_INTERVAL_SECONDS", "15"))
+
+def _probe_database():
+    """PostgreSQL round trip + pool stats"""
+    conn = get_db_connection()
+    if not conn:
+        return {"status": "unhealthy", "pool_available": 0, "pool_used": 0, "error": "Database connection failed"}
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+    finally:
+        return_connection(conn)
+
+    # Get pool stats if available
+    pool_available = 0
+    pool_used = 0
+    if _db_pool:
+        try:
+            # SimpleConnectionPool doesn't expose stats directly, but we can infer
+            pool_available = _db_pool.maxconn - len(getattr(_db_pool, '_used', {}))
+            pool_used = len(getattr(_db_pool, '_used', {}))
+        except:
+            pass
+
+    return {"status": "healthy", "pool_available": pool_available, "pool_used": pool_used, "error": None}
+
+def _probe_email_service():
+    """Email provider configuration + outbox queue depth"""
+    if SENDGRID_API_KEY:
+        # SendGrid API check - verify API key format
+        if len(SENDGRID_API_KEY) > 20 and SENDGRID_API_KEY.startswith('SG.'):
+            result = {"status": "healthy", "provider": "sendgrid", "error": None}
+        else:
+            result = {"status": "degraded", "provider": "sendgrid", "error": "API key format invalid"}
+    elif SMTP_CONFIGURED:
+        result = {"status": "healthy", "provider": "smtp", "error": None}
+    else:
+        result = {"status": "unhealthy", "provider": "none", "error": "No email service configured"}
+    result["outbox"] = _email_outbox.stats()
+    return result
+
+def _probe_whop_api():
+    """Whop API reachability"""
+    if not WHOP_API_KEY:
+        return {"status": "degraded", "response_time_ms": 0, "error": "Whop API key not configured"}
+
+    whop_start = datetime.now()
+    try:
+        # Ping Whop API base URL to check connectivity
+        response = requests.get("https://api.whop.com", timeout=5)
+    except requests.Timeout:
+        return {"status": "unhealthy", "response_time_ms": 5000, "error": "Request timeout"}
+    whop_time = round((datetime.now() - whop_start).total_seconds() * 1000, 2)
+
+    if response.status_code in [200, 404]:  # 404 is expected for base URL
+        return {"status": "healthy", "response_time_ms": whop_time, "error": None}
+    return {"status": "degraded", "response_time_ms": whop_time, "error": f"HTTP {response.status_code}"}
+
+def _probe_licenses():
+    """Active license count (admin health only)"""
+    conn = get_db_connection()
+    if not conn:
+        return {"status": "unhealthy", "active_count": 0, "error": "Database unavailable"}
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM users WHERE license_status = 'ACTIVE'")
+            active_count = cursor.fetchone()[0]
+    finally:
+        return_connection(conn)
+    return {"status": "healthy", "active_count": active_count, "error": None}
+
+_health_prober = HealthProber(interval_seconds=HEALTH_PROBE_INTERVAL_SECONDS, threading_module=async_runtime.real_threading)
+_health_prober.add_probe('database', _probe_database)
+_health_prober.add_probe('email_service', _probe_email_service)
+_health_prober.add_probe('whop_api', _probe_whop_api)
+_health_prober.add_probe('licenses', _probe_licenses)
+
+def build_health_status(snapshot):
+    """Assemble the public health document from a prober snapshot"""
+    not_checked = {"status": "unknown", "response_time_ms": 0, "last_checked": None, "error": "Not checked yet"}
     health_status = {
         "timestamp": datetime.now().isoformat(),
         "overall_status": "unknown",
         "flask_server": {"status": "healthy", "version": "2.0", "environment": "production", "region": "West US 2"},
         "app_service_plan": {"status": "healthy", "name": "quotrading-asp", "tier": "Basic", "region": "West US 2"},
-        "database": {"status": "unknown", "response_time_ms": 0, "pool_available": 0, "pool_used": 0, "error": None},
-        "email_service": {"status": "unknown", "provider": "sendgrid" if SENDGRID_API_KEY else "smtp", "error": None},
-        "whop_api": {"status": "unknown", "response_time_ms": 0, "error": None}
+        "database": snapshot.get("database", not_checked),
+        "email_service": snapshot.get("email_service", not_checked),
+        "whop_api": snapshot.get("whop_api", not_checked)
     }
-    
-    # Check PostgreSQL connection + pool stats
-    db_start = datetime.now()
-    try:
-        conn = get_db_connection()
-        if conn:
-            # Test query
-            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-                cursor.execute("SELECT 1 as test")
-                cursor.fetchone()
-            
-            return_connection(conn)
-            db_time = (datetime.now() - db_start).total_seconds() * 1000
-            
-            # Get pool stats if available
-            pool_available = 0
-            pool_used = 0
-            if _db_pool:
-                try:
-                    # SimpleConnectionPool doesn't expose stats directly, but we can infer
-                    pool_available = _db_pool.maxconn - len(getattr(_db_pool, '_used', {}))
-                    pool_used = len(getattr(_db_pool, '_used', {}))
-                except:
-                    pass
-            
-            health_status["database"] = {
-                "status": "healthy",
-                "response_time_ms": round(db_time, 2),
-                "pool_available": pool_available,
-                "pool_used": pool_used,
-                "error": None
-            }
-        else:
-            health_status["database"] = {
-                "status": "unhealthy",
-                "response_time_ms": 0,
-                "pool_available": 0,
-                "pool_used": 0,
-                "error": "Database connection failed"
-            }
-    except Exception as e:
-        logging.error(f"Database health check error: {e}")
-        health_status["database"] = {
-            "status": "unhealthy",
-            "response_time_ms": 0,
-            "pool_available": 0,
-            "pool_used": 0,
-            "error": str(e)
-        }
-    
-    # Check email service
-    try:
-        if SENDGRID_API_KEY:
-            # SendGrid API check - verify API key format
-            if len(SENDGRID_API_KEY) > 20 and SENDGRID_API_KEY.startswith('SG.'):
-                health_status["email_service"] = {
-                    "status": "healthy",
-                    "provider": "sendgrid",
-                    "error": None
-                }
-            else:
-                health_status["email_service"] = {
-                    "status": "degraded",
-                    "provider": "sendgrid",
-                    "error": "API key format invalid"
-                }
-        elif SMTP_USERNAME and SMTP_PASSWORD:
-            # SMTP configured
-            health_status["email_service"] = {
-                "status": "healthy",
-                "provider": "smtp",
-                "error": None
-            }
-        else:
-            health_status["email_service"] = {
-                "status": "unhealthy",
-                "provider": "none",
-                "error": "No email service configured"
-            }
-    except Exception as e:
-        health_status["email_service"] = {
-            "status": "unhealthy",
-            "provider": "unknown",
-            "error": str(e)
-        }
-    
-    # Check Whop API connectivity
-    whop_start = datetime.now()
-    try:
-        if WHOP_API_KEY:
-            # Ping Whop API base URL to check connectivity
-            response = requests.get(
-                "https://api.whop.com",
-                timeout=5
-            )
-            whop_time = (datetime.now() - whop_start).total_seconds() * 1000
-            
-            # If we can reach Whop and have a key configured, mark as healthy
-            if response.status_code in [200, 404]:  # 404 is expected for base URL
-                health_status["whop_api"] = {
-                    "status": "healthy",
-                    "response_time_ms": round(whop_time, 2),
-                    "error": None
-                }
-            else:
-                health_status["whop_api"] = {
-                    "status": "degraded",
-                    "response_time_ms": round(whop_time, 2),
-                    "error": f"HTTP {response.status_code}"
-                }
-        else:
-            health_status["whop_api"] = {
-                "status": "degraded",
-                "response_time_ms": 0,
-                "error": "Whop API key not configured"
-            }
-    except requests.Timeout:
-        health_status["whop_api"] = {
-            "status": "unhealthy",
-            "response_time_ms": 5000,
-            "error": "Request timeout"
-        }
-    except Exception as e:
-        health_status["whop_api"] = {
-            "status": "unhealthy",
-            "response_time_ms": 0,
-            "error": str(e)
-        }
-    
+
     # Determine overall health
     statuses = [
         health_status["flask_server"]["status"],
@@ -3600,73 +4143,244 @@ def api_health_check():
         health_status["email_service"]["status"],
         health_status["whop_api"]["status"]
     ]
-    
+
     if all(s == "healthy" for s in statuses):
         health_status["overall_status"] = "healthy"
     elif any(s == "unhealthy" for s in statuses):
         health_status["overall_status"] = "unhealthy"
     else:
+        # "unknown" (first probe still running) counts as degraded, not down
         health_status["overall_status"] = "degraded"
-    
+
+    return health_status
+
+@app.route('/api/health', methods=['GET'])
+def api_health_check():
+    """Public health check endpoint for server infrastructure monitoring"""
+    health_status = build_health_status(_health_prober.snapshot())
+
     # Return 200 if healthy, 503 if unhealthy, 200 if degraded
     status_code = 200 if health_status["overall_status"] != "unhealthy" else 503
     return jsonify(health_status), status_code
 
-@app.route('/api/admin/system-health', methods=['GET'])
-def admin_system_health():
-    """Get detailed system health status with admin authentication"""
-    admin_key = request.args.get('license_key') or request.args.get('admin_key')
-    if admin_key != ADMIN_API_KEY:
-        return jsonify({"error": "Unauthorized"}), 401
+@app.route('/api/admin/system-health', methods=['GET'])
+def admin_system_health():
+    """Get detailed system health status with admin authentication"""
+    admin_key = request.args.get('license_key') or request.args.get('admin_key')
+    if admin_key != ADMIN_API_KEY:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    snapshot = _health_prober.snapshot()
+    health_data = build_health_status(snapshot)
+
+    # Add admin-only metrics
+    licenses = snapshot.get("licenses")
+    if licenses:
+        health_data["trade_analytics"] = {
+            "status": "disabled",
+            "total_trades": 0,
+            "response_time_ms": licenses.get("response_time_ms", 0),
+            "error": licenses.get("error")
+        }
+        health_data["licenses"] = {
+            "active_count": licenses.get("active_count", 0),
+            "last_checked": licenses.get("last_checked")
+        }
+    else:
+        health_data["trade_analytics"] = {
+            "status": "disabled",
+            "total_trades": 0,
+            "response_time_ms": 0,
+            "error": "Not checked yet"
+        }
+
+    return jsonify(health_data), 200
+
+# ============================================================================
+# METRICS - Prometheus /metrics
+# ============================================================================
+
+# Optional bearer token for scrapers; /metrics is open when unset
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+@app.before_request
+def _metrics_start_timer():
+    g.metrics_start = time.perf_counter()
+
+@app.after_request
+def _metrics_record_request(response):
+    start = g.get('metrics_start')
+    if start is not None:
+        # Route template (e.g. /api/admin/user/<account_id>) keeps label cardinality bounded
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        http_request_duration.observe(time.perf_counter() - start, method=request.method, route=route)
+        http_requests_total.inc(method=request.method, route=route, status=response.status_code)
+    return response
+
+def _db_pool_gauge():
+    samples = {}
+    for name, db_pool in (("main", _db_pool), ("offload", _offload_db_pool)):
+        if db_pool:
+            used = len(getattr(db_pool, '_used', {}))
+            samples[(name, "used")] = used
+            samples[(name, "idle")] = len(getattr(db_pool, '_pool', []))
+            samples[(name, "max")] = db_pool.maxconn
+    return samples
+
+def _socketio_room_gauge():
+    """Members per named room on this worker (per-sid rooms excluded)"""
+    samples = {}
+    for namespace, rooms in list(socketio.server.manager.rooms.items()):
+        sids = rooms.get(None, {})
+        for room, members in list(rooms.items()):
+            if room is not None and room not in sids:
+                samples[(namespace, room)] = len(members)
+    return samples
+
+def _email_outbox_gauge():
+    outbox = _health_prober.snapshot().get("email_service", {}).get("outbox", {})
+    return {(status,): count for status, count in outbox.get("queue", {}).items()}
+
+def _render_cache_gauge():
+    samples = {}
+    for render in (render_renewal_email, render_cancellation_email, render_payment_failed_email, render_subscription_expired_email):
+        info = render.cache_info()
+        lookups = info.hits + info.misses
+        samples[(render.__name__,)] = round(info.hits / lookups, 4) if lookups else None
+    return samples
+
+metrics.gauge("quotrading_db_pool_connections", "Database pool connections", ("pool", "state"), _db_pool_gauge)
+metrics.gauge("quotrading_socketio_connected_clients", "Zone WebSocket clients on this worker", (),
+              lambda: len(websocket_stats['connected_clients']))
+metrics.gauge("quotrading_socketio_room_members", "Socket.IO room members on this worker", ("namespace", "room"), _socketio_room_gauge)
+metrics.gauge("quotrading_copier_websocket_clients", "Copier WebSocket clients on this worker", (),
+              lambda: len(_copier_websocket_clients))
+metrics.gauge("quotrading_copier_master_clients", "Copier masters on /copier-master on this worker", (),
+              lambda: len(_copier_master_clients))
+metrics.gauge("quotrading_copier_followers", "Copier followers registered on this worker", (),
+              lambda: len(_connected_followers))
+metrics.gauge("quotrading_copier_pending_signals", "Signals queued for HTTP-polling followers", (),
+              lambda: sum(len(queue) for queue in _pending_signals.values()))
+metrics.gauge("quotrading_email_outbox_messages", "Email outbox rows by status (from the health prober)", ("status",), _email_outbox_gauge)
+metrics.gauge("quotrading_rate_limit_tracked_keys", "License keys with rate-limit state", (),
+              lambda: len(_rate_limit_cache))
+metrics.gauge("quotrading_cache_hit_ratio", "Hit ratio of in-process caches", ("cache",), _render_cache_gauge)
+metrics.gauge("quotrading_presence_online", "Licenses online by presence source", ("source",),
+              lambda: {(source,): count for source, count in presence.count_by_source().items()})
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus text-format metrics for this worker"""
+    if METRICS_TOKEN and not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {METRICS_TOKEN}"):
+        return jsonify({"error": "Unauthorized"}), 401
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route('/api/admin/sql-profile', methods=['GET', 'DELETE'])
+def admin_sql_profile():
+    """Per-fingerprint query timings for this worker; DELETE resets the counters"""
+    admin_key = request.args.get('license_key') or request.args.get('admin_key')
+    if admin_key != ADMIN_API_KEY:
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    if request.method == 'DELETE':
+        _sql_profiler.reset()
+        return jsonify({"status": "reset"}), 200
+    
+    sort = request.args.get('sort', 'total_ms')
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    include_plans = request.args.get('plans', 'true').lower() == 'true'
+    queries = _sql_profiler.report(sort=sort, limit=limit, include_plans=include_plans)
+    return jsonify({
+        "enabled": SQL_PROFILER_ENABLED,
+        "worker_pid": os.getpid(),
+        "since": _sql_profiler.started_at.isoformat(),
+        "slow_threshold_ms": _sql_profiler.slow_ms,
+        "sort": sort,
+        "queries": queries
+    }), 200
+
+# ============================================================================
+# RESPONSE COMPRESSION - gzip/brotli and strong ETags for admin endpoints
+# ============================================================================
+
+# The admin dashboard polls these on an interval; unchanged polls get an empty 304
+COMPRESSION_MIN_BYTES = int(os.environ.get("COMPRESSION_MIN_BYTES", "1024"))
+_response_optimizer = ResponseOptimizer(
+    min_size=COMPRESSION_MIN_BYTES,
+    gzip_level=int(os.environ.get("COMPRESSION_GZIP_LEVEL", "6")),
+    brotli_quality=int(os.environ.get("COMPRESSION_BROTLI_QUALITY", "5"))
+)
+
+@app.after_request
+def _optimize_admin_response(response):
+    # Registered after the metrics hook so it runs first and metrics record the 304s
+    if request.path.startswith('/api/admin/'):
+        # Endpoints backed by a versioned cache may set g.response_etag to skip hashing the body
+        return _response_optimizer.process(request, response, etag=g.get('response_etag'))
+    return response
+
+# ============================================================================
+# BULK OPERATIONS ENDPOINTS
+# ============================================================================
+
+# Keys per statement; a request may carry up to BULK_MAX_KEYS in total
+BULK_CHUNK_SIZE = int(os.environ.get("BULK_CHUNK_SIZE", "5000"))
+BULK_MAX_KEYS = int(os.environ.get("BULK_MAX_KEYS", "50000"))
+
+def _parse_bulk_license_keys(data):
+    """Validate and de-duplicate license_keys from a bulk request body.
+    
+    Returns:
+        (license_keys, error_message) - error_message is None when valid
+    """
+    license_keys = (data or {}).get('license_keys', [])
+    if not license_keys or not isinstance(license_keys, list):
+        return None, "No license keys provided"
+    if len(license_keys) > BULK_MAX_KEYS:
+        return None, f"Maximum {BULK_MAX_KEYS} users per bulk operation"
+    # dict.fromkeys keeps request order while dropping duplicates
+    return list(dict.fromkeys(str(key) for key in license_keys if key)), None
+
+def run_bulk_license_statement(sql, license_keys, params=()):
+    """Run a set-based statement over license keys in chunks, in one transaction.
     
-    # Get basic health status
-    basic_health = health_check()
-    health_data = basic_health[0].get_json()
+    `sql` must join against `unnest(%s::text[]) AS k(license_key)` and
+    RETURN the matched license_key; the key array is passed after `params`.
     
-    # Add admin-only metrics
-    db_start = datetime.now()
+    Returns:
+        (matched_keys, not_found_keys)
+    """
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("Database connection failed")
+    
+    matched = set()
     try:
-        conn = get_db_connection()
-        if conn:
-            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-                # Get active license count
-                cursor.execute("SELECT COUNT(*) as count FROM users WHERE license_status = 'ACTIVE'")
-                result = cursor.fetchone()
-                active_licenses = result['count'] if result else 0
-                
-            return_connection(conn)
-            db_time = (datetime.now() - db_start).total_seconds() * 1000
-            
-            health_data["trade_analytics"] = {
-                "status": "disabled",
-                "total_trades": 0,
-                "response_time_ms": round(db_time, 2),
-                "error": None
-            }
-            health_data["licenses"] = {
-                "active_count": active_licenses
-            }
-        else:
-            health_data["trade_analytics"] = {
-                "status": "disabled",
-                "total_trades": 0,
-                "response_time_ms": 0,
-                "error": "Database unavailable"
-            }
-    except Exception as e:
-        logging.error(f"Admin health check error: {e}")
-        health_data["trade_analytics"] = {
-            "status": "disabled",
-            "total_trades": 0,
-            "response_time_ms": 0,
-            "error": str(e)
-        }
+        with conn.cursor() as cursor:
+            for i in range(0, len(license_keys), BULK_CHUNK_SIZE):
+                chunk = license_keys[i:i + BULK_CHUNK_SIZE]
+                cursor.execute(sql, (*params, chunk))
+                matched.update(row[0] for row in cursor.fetchall())
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        return_connection(conn)
     
-    return jsonify(health_data), 200
+    invalidate_license_caches(matched)
+    return [k for k in license_keys if k in matched], [k for k in license_keys if k not in matched]
 
-# ============================================================================
-# BULK OPERATIONS ENDPOINTS
-# ============================================================================
+def _bulk_response(action, matched, not_found):
+    """Common response body for bulk endpoints, with per-key outcome"""
+    logging.info(f"Bulk {action}: {len(matched)} succeeded, {len(not_found)} not found")
+    return jsonify({
+        "success": len(matched),
+        "failed": len(not_found),
+        "errors": [f"{key[:8]}... not found" for key in not_found[:10]],  # Limit error list
+        "matched": matched,
+        "not_found": not_found
+    }), 200
 
 @app.route('/api/admin/bulk/extend', methods=['POST'])
 def admin_bulk_extend():
@@ -3676,54 +4390,28 @@ def admin_bulk_extend():
         return jsonify({"error": "Unauthorized"}), 401
     
     data = request.get_json()
-    license_keys = data.get('license_keys', [])
-    days = data.get('days', 30)
-    
-    if not license_keys:
-        return jsonify({"error": "No license keys provided"}), 400
+    license_keys, error = _parse_bulk_license_keys(data)
+    if error:
+        return jsonify({"error": error}), 400
     
-    if len(license_keys) > 100:
-        return jsonify({"error": "Maximum 100 users per bulk operation"}), 400
-    
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    success_count = 0
-    failed_count = 0
-    errors = []
+    try:
+        days = int(data.get('days', 30))
+    except (TypeError, ValueError):
+        return jsonify({"error": "days must be an integer"}), 400
     
     try:
-        for key in license_keys:
-            try:
-                cur.execute("""
-                    UPDATE users 
-                    SET license_expiration = license_expiration + INTERVAL '%s days'
-                    WHERE license_key = %s
-                """, (days, key))
-                if cur.rowcount > 0:
-                    success_count += 1
-                else:
-                    failed_count += 1
-                    errors.append(f"{key[:8]}... not found")
-            except Exception as e:
-                failed_count += 1
-                errors.append(f"{key[:8]}...: {str(e)}")
-        
-        conn.commit()
-        logging.info(f"Bulk extend: {success_count} succeeded, {failed_count} failed")
+        matched, not_found = run_bulk_license_statement("""
+            UPDATE users u
+            SET license_expiration = COALESCE(u.license_expiration, NOW()) + make_interval(days => %s)
+            FROM unnest(%s::text[]) AS k(license_key)
+            WHERE u.license_key = k.license_key
+            RETURNING u.license_key
+        """, license_keys, (days,))
     except Exception as e:
-        conn.rollback()
         logging.error(f"Bulk extend error: {e}")
         return jsonify({"error": str(e)}), 500
-    finally:
-        cur.close()
-        return_connection(conn)
     
-    return jsonify({
-        "success": success_count,
-        "failed": failed_count,
-        "errors": errors[:10]  # Limit error list
-    }), 200
+    return _bulk_response("extend", matched, not_found)
 
 @app.route('/api/admin/bulk/suspend', methods=['POST'])
 def admin_bulk_suspend():
@@ -3732,32 +4420,23 @@ def admin_bulk_suspend():
     if api_key != ADMIN_API_KEY:
         return jsonify({"error": "Unauthorized"}), 401
     
-    data = request.get_json()
-    license_keys = data.get('license_keys', [])
-    
-    if not license_keys or len(license_keys) > 100:
-        return jsonify({"error": "Invalid request"}), 400
-    
-    conn = get_db_connection()
-    cur = conn.cursor()
+    license_keys, error = _parse_bulk_license_keys(request.get_json())
+    if error:
+        return jsonify({"error": error}), 400
     
     try:
-        cur.execute("""
-            UPDATE users 
+        matched, not_found = run_bulk_license_statement("""
+            UPDATE users u
             SET license_status = 'SUSPENDED'
-            WHERE license_key = ANY(%s)
-        """, (license_keys,))
-        success_count = cur.rowcount
-        conn.commit()
-        logging.info(f"Bulk suspended {success_count} users")
-        return jsonify({"success": success_count, "failed": 0, "errors": []}), 200
+            FROM unnest(%s::text[]) AS k(license_key)
+            WHERE u.license_key = k.license_key
+            RETURNING u.license_key
+        """, license_keys)
     except Exception as e:
-        conn.rollback()
         logging.error(f"Bulk suspend error: {e}")
         return jsonify({"error": str(e)}), 500
-    finally:
-        cur.close()
-        return_connection(conn)
+    
+    return _bulk_response("suspend", matched, not_found)
 
 @app.route('/api/admin/bulk/activate', methods=['POST'])
 def admin_bulk_activate():
@@ -3766,32 +4445,23 @@ def admin_bulk_activate():
     if api_key != ADMIN_API_KEY:
         return jsonify({"error": "Unauthorized"}), 401
     
-    data = request.get_json()
-    license_keys = data.get('license_keys', [])
-    
-    if not license_keys or len(license_keys) > 100:
-        return jsonify({"error": "Invalid request"}), 400
-    
-    conn = get_db_connection()
-    cur = conn.cursor()
+    license_keys, error = _parse_bulk_license_keys(request.get_json())
+    if error:
+        return jsonify({"error": error}), 400
     
     try:
-        cur.execute("""
-            UPDATE users 
+        matched, not_found = run_bulk_license_statement("""
+            UPDATE users u
             SET license_status = 'ACTIVE'
-            WHERE license_key = ANY(%s)
-        """, (license_keys,))
-        success_count = cur.rowcount
-        conn.commit()
-        logging.info(f"Bulk activated {success_count} users")
-        return jsonify({"success": success_count, "failed": 0, "errors": []}), 200
+            FROM unnest(%s::text[]) AS k(license_key)
+            WHERE u.license_key = k.license_key
+            RETURNING u.license_key
+        """, license_keys)
     except Exception as e:
-        conn.rollback()
         logging.error(f"Bulk activate error: {e}")
         return jsonify({"error": str(e)}), 500
-    finally:
-        cur.close()
-        return_connection(conn)
+    
+    return _bulk_response("activate", matched, not_found)
 
 @app.route('/api/admin/bulk/delete', methods=['POST'])
 def admin_bulk_delete():
@@ -3800,31 +4470,22 @@ def admin_bulk_delete():
     if api_key != ADMIN_API_KEY:
         return jsonify({"error": "Unauthorized"}), 401
     
-    data = request.get_json()
-    license_keys = data.get('license_keys', [])
-    
-    if not license_keys or len(license_keys) > 100:
-        return jsonify({"error": "Invalid request"}), 400
-    
-    conn = get_db_connection()
-    cur = conn.cursor()
+    license_keys, error = _parse_bulk_license_keys(request.get_json())
+    if error:
+        return jsonify({"error": error}), 400
     
     try:
-        cur.execute("""
-            DELETE FROM users 
-            WHERE license_key = ANY(%s)
-        """, (license_keys,))
-        success_count = cur.rowcount
-        conn.commit()
-        logging.info(f"Bulk deleted {success_count} users")
-        return jsonify({"success": success_count, "failed": 0, "errors": []}), 200
+        matched, not_found = run_bulk_license_statement("""
+            DELETE FROM users u
+            USING unnest(%s::text[]) AS k(license_key)
+            WHERE u.license_key = k.license_key
+            RETURNING u.license_key
+        """, license_keys)
     except Exception as e:
-        conn.rollback()
         logging.error(f"Bulk delete error: {e}")
         return jsonify({"error": str(e)}), 500
-    finally:
-        cur.close()
-        return_connection(conn)
+    
+    return _bulk_response("delete", matched, not_found)
 
 # ============================================================================
 # DATABASE VIEWER ENDPOINT
@@ -3851,7 +4512,7 @@ def admin_view_database_table(table_name):
         return jsonify({"error": "Database unavailable"}), 503
     
     try:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur = conn.cursor(cursor_factory=ProfiledDictCursor)
         
         # SECURITY: Use psycopg2.sql.Identifier to safely include table name
         # Even though table_name is whitelisted, this is defense-in-depth
@@ -3873,12 +4534,7 @@ def admin_view_database_table(table_name):
         
         rows = cur.fetchall()
         
-        # Convert datetime objects to ISO strings
-        for row in rows:
-            for key, value in row.items():
-                if hasattr(value, 'isoformat'):
-                    row[key] = value.isoformat()
-        
+        # datetime/Decimal values are serialized by the app's JSON provider
         return jsonify({
             "table": table_name,
             "total_rows": total_rows,
@@ -3893,6 +4549,93 @@ def admin_view_database_table(table_name):
         cur.close()
         return_connection(conn)
 
+ADMIN_EVENTS_PANEL_LIMIT = 100
+
+def _query_webhook_events(cursor, limit):
+    # Check if webhook_events table exists
+    cursor.execute("""
+        SELECT EXISTS (
+            SELECT FROM information_schema.tables 
+            WHERE table_name = 'webhook_events'
+        )
+    """)
+    if not cursor.fetchone()['exists']:
+        # Create webhook_events table
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS webhook_events (
+                id SERIAL PRIMARY KEY,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                event_type VARCHAR(100),
+                whop_id VARCHAR(100),
+                user_id VARCHAR(100),
+                email VARCHAR(255),
+                status VARCHAR(50),
+                details TEXT,
+                error TEXT,
+                payload JSONB
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_webhook_events_timestamp ON webhook_events(timestamp DESC)")
+        return []
+    
+    # Fetch recent webhooks
+    cursor.execute("""
+        SELECT * FROM webhook_events
+        ORDER BY timestamp DESC
+        LIMIT %s
+    """, (limit,))
+    rows = cursor.fetchall()
+    
+    # Convert datetime to ISO
+    for row in rows:
+        if row.get('timestamp'):
+            row['timestamp'] = row['timestamp'].isoformat()
+    return rows
+
+def _query_security_events(cursor, limit):
+    # Check if security_events table exists
+    cursor.execute("""
+        SELECT EXISTS (
+            SELECT FROM information_schema.tables 
+            WHERE table_name = 'security_events'
+        )
+    """)
+    if not cursor.fetchone()['exists']:
+        # Create security_events table
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS security_events (
+                id SERIAL PRIMARY KEY,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                license_key VARCHAR(255),
+                email VARCHAR(255),
+                endpoint VARCHAR(255),
+                attempts INTEGER,
+                reason TEXT
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_security_events_timestamp ON security_events(timestamp DESC)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_security_events_license ON security_events(license_key)")
+        return []
+    
+    # Fetch recent security events
+    cursor.execute("""
+        SELECT * FROM security_events
+        ORDER BY timestamp DESC
+        LIMIT %s
+    """, (limit,))
+    rows = cursor.fetchall()
+    
+    # Convert datetime to ISO
+    for row in rows:
+        if row.get('timestamp'):
+            row['timestamp'] = row['timestamp'].isoformat()
+    return rows
+
+_admin_panels.register('webhooks', lambda: _run_panel_query(_query_webhook_events, ADMIN_EVENTS_PANEL_LIMIT),
+                       ADMIN_PANEL_TTL_SECONDS)
+_admin_panels.register('security_events', lambda: _run_panel_query(_query_security_events, ADMIN_EVENTS_PANEL_LIMIT),
+                       ADMIN_PANEL_TTL_SECONDS)
+
 @app.route('/api/admin/webhooks', methods=['GET'])
 def admin_get_webhooks():
     """Get webhook event history (admin only)"""
@@ -3900,67 +4643,15 @@ def admin_get_webhooks():
     if api_key != ADMIN_API_KEY:
         return jsonify({"error": "Unauthorized"}), 401
     
-    limit = request.args.get('limit', 100, type=int)
-    if limit > 500:
-        limit = 500
-    
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({"webhooks": []}), 200
+    limit = min(request.args.get('limit', ADMIN_EVENTS_PANEL_LIMIT, type=int), 500)
     
     try:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        # Check if webhook_events table exists
-        cur.execute("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables 
-                WHERE table_name = 'webhook_events'
-            )
-        """)
-        table_exists = cur.fetchone()['exists']
-        
-        if not table_exists:
-            # Create webhook_events table
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS webhook_events (
-                    id SERIAL PRIMARY KEY,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    event_type VARCHAR(100),
-                    whop_id VARCHAR(100),
-                    user_id VARCHAR(100),
-                    email VARCHAR(255),
-                    status VARCHAR(50),
-                    details TEXT,
-                    error TEXT,
-                    payload JSONB
-                )
-            """)
-            cur.execute("CREATE INDEX IF NOT EXISTS idx_webhook_events_timestamp ON webhook_events(timestamp DESC)")
-            conn.commit()
-            return jsonify({"webhooks": []}), 200
-        
-        # Fetch recent webhooks
-        cur.execute("""
-            SELECT * FROM webhook_events
-            ORDER BY timestamp DESC
-            LIMIT %s
-        """, (limit,))
-        rows = cur.fetchall()
-        
-        # Convert datetime to ISO
-        for row in rows:
-            if row.get('timestamp'):
-                row['timestamp'] = row['timestamp'].isoformat()
-        
-        return jsonify({"webhooks": rows}), 200
-        
+        if limit == ADMIN_EVENTS_PANEL_LIMIT:
+            return jsonify({"webhooks": _admin_panels.get('webhooks')}), 200
+        return jsonify({"webhooks": _run_panel_query(_query_webhook_events, limit)}), 200
     except Exception as e:
         logging.error(f"Webhooks fetch error: {e}")
         return jsonify({"webhooks": []}), 200
-    finally:
-        cur.close()
-        return_connection(conn)
 
 @app.route('/api/admin/security-events', methods=['GET'])
 def admin_get_security_events():
@@ -3969,65 +4660,112 @@ def admin_get_security_events():
     if api_key != ADMIN_API_KEY:
         return jsonify({"error": "Unauthorized"}), 401
     
-    limit = request.args.get('limit', 100, type=int)
-    if limit > 500:
-        limit = 500
-    
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({"events": []}), 200
+    limit = min(request.args.get('limit', ADMIN_EVENTS_PANEL_LIMIT, type=int), 500)
     
     try:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        # Check if security_events table exists
-        cur.execute("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables 
-                WHERE table_name = 'security_events'
-            )
-        """)
-        table_exists = cur.fetchone()['exists']
-        
-        if not table_exists:
-            # Create security_events table
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS security_events (
-                    id SERIAL PRIMARY KEY,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    license_key VARCHAR(255),
-                    email VARCHAR(255),
-                    endpoint VARCHAR(255),
-                    attempts INTEGER,
-                    reason TEXT
-                )
-            """)
-            cur.execute("CREATE INDEX IF NOT EXISTS idx_security_events_timestamp ON security_events(timestamp DESC)")
-            cur.execute("CREATE INDEX IF NOT EXISTS idx_security_events_license ON security_events(license_key)")
-            conn.commit()
-            return jsonify({"events": []}), 200
-        
-        # Fetch recent security events
-        cur.execute("""
-            SELECT * FROM security_events
-            ORDER BY timestamp DESC
-            LIMIT %s
-        """, (limit,))
-        rows = cur.fetchall()
-        
-        # Convert datetime to ISO
-        for row in rows:
-            if row.get('timestamp'):
-                row['timestamp'] = row['timestamp'].isoformat()
-        
-        return jsonify({"events": rows}), 200
-        
+        if limit == ADMIN_EVENTS_PANEL_LIMIT:
+            return jsonify({"events": _admin_panels.get('security_events')}), 200
+        return jsonify({"events": _run_panel_query(_query_security_events, limit)}), 200
     except Exception as e:
         logging.error(f"Security events fetch error: {e}")
         return jsonify({"events": []}), 200
+
+# ============================================================================
+# ADMIN SNAPSHOT & LIVE PUSH - one request for every panel, then deltas over /admin
+# ============================================================================
+
+ADMIN_PUSH_INTERVAL_SECONDS = float(os.environ.get("ADMIN_PUSH_INTERVAL_SECONDS", "5"))
+
+_admin_ws_clients = {}  # sid -> {connected_at}
+_admin_push_task = {'running': False}
+
+def _activity_row_key(row):
+    return (row.get('timestamp'), row.get('account_id'), row.get('endpoint'))
+
+def _event_row_key(row):
+    return row.get('id')
+
+# How each panel is diffed: newest-first logs push new rows, keyed tables push
+# added/changed/removed, everything else is replaced whole when it changes
+_ADMIN_ROW_PANELS = {'activity': _activity_row_key, 'webhooks': _event_row_key, 'security_events': _event_row_key}
+_ADMIN_KEYED_PANELS = {'users': 'account_id', 'online_users': 'license_key'}
+
+def build_admin_delta(previous, current):
+    """Delta between two {panel: data} snapshots, or None when nothing changed"""
+    delta = {"replace": {}, "rows": {}, "keyed": {}}
+    for name, data in current.items():
+        before = previous.get(name)
+        if before == data:
+            continue
+        if before is not None and name in _ADMIN_ROW_PANELS:
+            fresh = new_rows(before, data, _ADMIN_ROW_PANELS[name])
+            if fresh:
+                delta["rows"][name] = fresh
+        elif before is not None and name in _ADMIN_KEYED_PANELS:
+            changes = diff_keyed(before, data, _ADMIN_KEYED_PANELS[name])
+            if changes:
+                delta["keyed"][name] = changes
+        else:
+            delta["replace"][name] = data
+    delta = {kind: panels for kind, panels in delta.items() if panels}
+    return delta or None
+
+def _admin_push_loop():
+    """Push panel deltas to this worker's admin sockets while any are connected"""
+    previous, _ = _admin_panels.snapshot()
+    try:
+        while _admin_ws_clients:
+            socketio.sleep(ADMIN_PUSH_INTERVAL_SECONDS)
+            current, versions = _admin_panels.snapshot()
+            delta = build_admin_delta(previous, current)
+            previous.update(current)
+            if not delta:
+                continue
+            delta["versions"] = versions
+            # Per-sid emits: with a message queue, a room emit would also reach
+            # admins on other workers, who already get their own worker's deltas
+            for sid in list(_admin_ws_clients):
+                socketio.emit('delta', delta, namespace='/admin', to=sid)
+    except Exception as e:
+        logging.error(f"❌ Admin push loop stopped: {e}")
     finally:
-        cur.close()
-        return_connection(conn)
+        _admin_push_task['running'] = False
+
+@app.route('/api/admin/snapshot', methods=['GET'])
+def admin_snapshot():
+    """Every dashboard panel (or ?panels=a,b) in one response from the shared panel cache"""
+    admin_key = request.args.get('license_key') or request.args.get('admin_key')
+    if admin_key != ADMIN_API_KEY:
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    requested = request.args.get('panels')
+    names = [name.strip() for name in requested.split(',') if name.strip()] if requested else None
+    panels, versions = _admin_panels.snapshot(names)
+    # Versions only move when data changes, so with this process's epoch they identify the body without hashing it
+    g.response_etag = strong_etag(_admin_panels.epoch, *sorted(versions.items()))
+    return jsonify({"versions": versions, "panels": panels}), 200
+
+@socketio.on('connect', namespace='/admin')
+def admin_ws_connect(auth=None):
+    """Admin dashboard socket: authenticated by admin_key, gets a snapshot then deltas"""
+    admin_key = (auth or {}).get('admin_key') or request.args.get('admin_key')
+    if admin_key != ADMIN_API_KEY:
+        logging.warning(f"🔒 Rejected admin WS connection: {request.sid}")
+        return False
+    
+    _admin_ws_clients[request.sid] = {'connected_at': datetime.now(timezone.utc).isoformat()}
+    panels, versions = _admin_panels.snapshot()
+    emit('snapshot', {"versions": versions, "panels": panels, "push_interval_seconds": ADMIN_PUSH_INTERVAL_SECONDS})
+    
+    if not _admin_push_task['running']:
+        _admin_push_task['running'] = True
+        socketio.start_background_task(_admin_push_loop)
+    logging.info(f"📊 Admin WS connected: {request.sid} (Total: {len(_admin_ws_clients)})")
+
+@socketio.on('disconnect', namespace='/admin')
+def admin_ws_disconnect():
+    _admin_ws_clients.pop(request.sid, None)
+    logging.info(f"📊 Admin WS disconnected: {request.sid} (Remaining: {len(_admin_ws_clients)})")
 
 # ============================================================================
 # USER RETENTION METRICS ENDPOINT
@@ -4041,7 +4779,7 @@ def admin_retention_metrics():
         return jsonify({"error": "Unauthorized"}), 401
     
     conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur = conn.cursor(cursor_factory=ProfiledDictCursor)
     
     try:
         # Churn rate (last 30 days)
@@ -4217,8 +4955,9 @@ def admin_retention_metrics():
 
 @app.route('/admin-dashboard-full.html')
 def serve_admin_dashboard():
-    """Serve the admin dashboard HTML file"""
-    return send_from_directory('.', 'admin-dashboard-full.html')
+    """Serve the admin dashboard HTML file (cached in memory, compressed, ETag'd)"""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'admin-dashboard-full.html')
+    return _response_optimizer.static_file(request, app.response_class, path, 'text/html')
 
 
 
@@ -4268,6 +5007,43 @@ try:
 except Exception as e:
     logging.error(f"❌ Database initialization failed: {e}")
 
+def seed_presence_from_db():
+    """After a restart, treat bots that heartbeated within the TTL as still online"""
+    conn = get_db_connection()
+    if not conn:
+        return 0
+    try:
+        with conn.cursor(cursor_factory=ProfiledDictCursor) as cursor:
+            cursor.execute("""
+                SELECT license_key, last_heartbeat FROM users
+                WHERE last_heartbeat > NOW() - make_interval(secs => %s)
+            """, (PRESENCE_TTL_SECONDS,))
+            rows = cursor.fetchall()
+        for row in rows:
+            last_heartbeat = row['last_heartbeat']
+            if last_heartbeat.tzinfo is None:
+                last_heartbeat = last_heartbeat.replace(tzinfo=timezone.utc)
+            presence.touch(row['license_key'], 'heartbeat', seen_at=last_heartbeat.timestamp())
+        return len(rows)
+    except Exception as e:
+        logging.warning(f"⚠️ Could not seed presence: {e}")
+        return 0
+    finally:
+        return_connection(conn)
+
+logging.info(f"🟢 Presence seeded with {seed_presence_from_db()} recent heartbeats")
+
+# Start maintenance jobs (only the elected leader worker runs the database ones)
+if SCHEDULER_ENABLED:
+    _scheduler.start()
+
+# Every worker sends email; SKIP LOCKED claims keep them from double-sending
+_email_outbox.start()
+threading.Thread(target=_webhook_inbox_loop, name="webhook-inbox", daemon=True).start()
+
+# Dependency checks run off the request path; health endpoints read the snapshot
+_health_prober.start()
+
 if __name__ == '__main__':
     # This block only runs when executing `python app.py` directly
     # When using gunicorn, the module is imported but this block is skipped
@@ -4285,7 +5061,8 @@ def handle_connect():
     """Client connected to WebSocket"""
     websocket_stats['connected_clients'][request.sid] = {
         'connected_at': datetime.now(timezone.utc).isoformat(),
-        'symbols': []
+        'symbols': [],
+        'license_key': None
     }
     websocket_stats['total_connections'] += 1
     logging.info(f"🔌 WebSocket client connected: {request.sid}")
@@ -4295,8 +5072,9 @@ def handle_connect():
 @socketio.on('disconnect')
 def handle_disconnect():
     """Client disconnected from WebSocket"""
-    if request.sid in websocket_stats['connected_clients']:
-        del websocket_stats['connected_clients'][request.sid]
+    client = websocket_stats['connected_clients'].pop(request.sid, None)
+    if client and client.get('license_key'):
+        presence.drop(client['license_key'], 'websocket')
     logging.info(f"🔌 WebSocket client disconnected: {request.sid}")
 
 
@@ -4314,6 +5092,12 @@ def handle_subscribe(data):
     if isinstance(symbols, str):
         symbols = [symbols]
     
+    license_key = data.get('license_key')
+    client = websocket_stats['connected_clients'].get(request.sid)
+    if license_key and client is not None:
+        client['license_key'] = license_key
+        presence.touch(license_key, 'websocket')
+    
     rooms_joined = []
     for symbol in symbols:
         base_symbol = get_base_symbol(symbol)
@@ -4342,9 +5126,41 @@ def handle_unsubscribe(data):
     emit('unsubscribed', {'message': f'Unsubscribed from: {", ".join(symbols)}'})
 
 
+@socketio.on('heartbeat')
+def handle_heartbeat(data):
+    """
+    Multi-symbol heartbeat over the socket; same body and reply as POST /api/heartbeat/batch.
+    The reply is returned as the event ack and also emitted as 'heartbeat_ack'.
+    """
+    data = data or {}
+    try:
+        payload, status_code = apply_heartbeat_batch(
+            data.get('license_key'),
+            data.get('device_fingerprint'),
+            data.get('sessions'),
+            data.get('status', 'online'),
+            data.get('session_token')
+        )
+    except Exception as e:
+        logging.error(f"Socket heartbeat error: {e}")
+        payload, status_code = {"success": False, "message": str(e)}, 500
+    
+    client = websocket_stats['connected_clients'].get(request.sid)
+    if status_code == 200 and client is not None:
+        client['license_key'] = data.get('license_key')
+        presence.touch(client['license_key'], 'websocket')
+    
+    payload['status_code'] = status_code
+    emit('heartbeat_ack', payload)
+    return payload
+
+
 @socketio.on('ping')
 def handle_ping():
     """Keep-alive ping from client"""
+    client = websocket_stats['connected_clients'].get(request.sid)
+    if client and client.get('license_key'):
+        presence.touch(client['license_key'], 'websocket')
     emit('pong', {'timestamp': datetime.now(timezone.utc).isoformat()})
 
 
@@ -4356,6 +5172,32 @@ def handle_ping():
 _connected_followers = {}  # follower_key -> {name, account_ids, connected_at, last_heartbeat, copy_enabled, ...}
 _pending_signals = {}      # follower_key -> [list of pending signals]
 _copier_websocket_clients = {}  # sid -> {license_key, connected_at}
+_copier_master_clients = {}     # sid -> {master_key, connected_at} on /copier-master
+# signal_id -> (expires at, relay counts); the master retries a publish whose ack was lost,
+# so a repeat within this window is acknowledged again instead of relayed twice
+COPIER_SIGNAL_DEDUP_SECONDS = int(os.environ.get("COPIER_SIGNAL_DEDUP_SECONDS", "300"))
+_recent_copier_signals = {}
+
+
+def _copier_follower_row(follower_key, follower):
+    """Follower as listed to masters (/copier/followers and /copier-master pushes)"""
+    return {
+        'client_id': follower_key,
+        'name': follower['name'],
+        'account_ids': follower.get('account_ids', []),
+        'connected_at': follower['connected_at'],
+        'last_heartbeat': follower['last_heartbeat'],
+        'copy_enabled': follower.get('copy_enabled', True),
+        'signals_received': follower.get('signals_received', 0),
+        'signals_executed': follower.get('signals_executed', 0),
+        'current_position': follower.get('current_position')
+    }
+
+
+def _notify_copier_masters(event, payload):
+    """Push a follower event to masters connected on /copier-master"""
+    if _copier_master_clients or SOCKETIO_DISTRIBUTED:
+        socketio.emit(event, payload, namespace='/copier-master')
 
 
 @app.route('/copier/register', methods=['POST'])
@@ -4372,26 +5214,16 @@ def copier_register():
     
     # Check for duplicate session - same license already running on different device
     if follower_key in _connected_followers:
-        existing = _connected_followers[follower_key]
-        existing_device = existing.get('device_fingerprint', '')
-        last_heartbeat_str = existing.get('last_heartbeat', '')
+        existing_device = _connected_followers[follower_key].get('device_fingerprint', '')
+        time_since = presence.seconds_since(follower_key, 'copier')
         
-        # Check if session is still active (heartbeat within last 60 seconds)
-        if last_heartbeat_str:
-            try:
-                last_hb = datetime.fromisoformat(last_heartbeat_str.replace('Z', '+00:00'))
-                now = datetime.now(timezone.utc)
-                time_since = (now - last_hb).total_seconds()
-                
-                # If active and different device, block
-                if time_since < 60 and existing_device and existing_device != device_fingerprint:
-                    logging.warning(f"🚫 Duplicate copier session blocked: {follower_key[:8]}... already active on another device")
-                    return jsonify({
-                        "error": "License already in use on another device",
-                        "message": "This license is currently active on another device. Please close that session first."
-                    }), 409
-            except:
-                pass
+        # If active (heartbeat within last 60 seconds) and different device, block
+        if time_since is not None and time_since < 60 and existing_device and existing_device != device_fingerprint:
+            logging.warning(f"🚫 Duplicate copier session blocked: {follower_key[:8]}... already active on another device")
+            return jsonify({
+                "error": "License already in use on another device",
+                "message": "This license is currently active on another device. Please close that session first."
+            }), 409
     
     now = datetime.now(timezone.utc).isoformat()
     
@@ -4408,6 +5240,8 @@ def copier_register():
     
     if follower_key not in _pending_signals:
         _pending_signals[follower_key] = []
+    presence.touch(follower_key, 'copier')
+    _notify_copier_masters('follower_joined', _copier_follower_row(follower_key, _connected_followers[follower_key]))
     
     logging.info(f"✅ Copier follower registered: {follower_name} ({follower_key[:8]}...) - {len(account_ids)} accounts")
     
@@ -4422,6 +5256,7 @@ def copier_heartbeat():
     
     if follower_key in _connected_followers:
         _connected_followers[follower_key]['last_heartbeat'] = datetime.now(timezone.utc).isoformat()
+        presence.touch(follower_key, 'copier')
         
         # Store extra metadata if provided
         if 'metadata' in data:
@@ -4430,7 +5265,8 @@ def copier_heartbeat():
         # Store position data if provided
         if 'current_position' in data:
             _connected_followers[follower_key]['current_position'] = data['current_position']
-            
+        
+        _notify_copier_masters('follower_heartbeat', _copier_follower_row(follower_key, _connected_followers[follower_key]))
         return jsonify({"status": "ok"})
     
     return jsonify({"error": "Not registered"}), 401
@@ -4447,20 +5283,31 @@ def copier_unregister():
         del _connected_followers[follower_key]
         if follower_key in _pending_signals:
             del _pending_signals[follower_key]
+        presence.drop(follower_key, 'copier')
+        _notify_copier_masters('follower_left', {'client_id': follower_key})
         logging.info(f"🔌 Copier follower unregistered: {name}")
     
     return jsonify({"status": "unregistered"})
 
 
-@app.route('/copier/broadcast', methods=['POST'])
-def copier_broadcast():
-    """Master broadcasts a signal to all connected followers."""
-    data = request.get_json()
-    master_key = data.get('master_key')
-    signal = data.get('signal')
-    
-    if not master_key or not signal:
-        return jsonify({"error": "Missing master_key or signal"}), 400
+def relay_copier_signal(signal):
+    """
+    Hand a master signal to every follower (HTTP poll queues + /copier WebSocket push).
+    A signal_id already relayed in the last COPIER_SIGNAL_DEDUP_SECONDS is not relayed
+    again; the counts from the first relay are returned.
+    Returns: (received_count, websocket_count)
+    """
+    now = time.monotonic()
+    # Insertion order is expiry order, so expired ids are always at the front
+    while _recent_copier_signals:
+        oldest = next(iter(_recent_copier_signals))
+        if _recent_copier_signals[oldest][0] > now:
+            break
+        del _recent_copier_signals[oldest]
+    signal_id = signal.get('signal_id')
+    if signal_id and signal_id in _recent_copier_signals:
+        logging.info(f"🔁 Copier signal {signal_id} already relayed, acknowledging repeat")
+        return _recent_copier_signals[signal_id][1]
     
     # Add signal to all connected followers' queues (for HTTP polling fallback)
     received_count = 0
@@ -4471,14 +5318,33 @@ def copier_broadcast():
             _pending_signals[follower_key].append(signal)
             received_count += 1
     
+    copier_signals_broadcast_total.inc(action=signal.get('action', 'unknown'))
+    
     # ALSO broadcast via WebSocket for instant delivery
+    # (websocket_count is this worker's clients; with a message queue others get it too)
     websocket_count = len(_copier_websocket_clients)
-    if websocket_count > 0:
+    if websocket_count > 0 or SOCKETIO_DISTRIBUTED:
         socketio.emit('trade_signal', signal, namespace='/copier')
-        logging.info(f"📡 WebSocket push to {websocket_count} clients")
+        copier_signals_delivered_total.inc(websocket_count, channel='websocket')
+        logging.info(f"📡 WebSocket push to {websocket_count} local clients")
     
     logging.info(f"📤 Copier signal broadcast: {signal.get('action')} {signal.get('side')} {signal.get('quantity')} {signal.get('symbol')} → {received_count} HTTP + {websocket_count} WS")
+    if signal_id:
+        _recent_copier_signals[signal_id] = (now + COPIER_SIGNAL_DEDUP_SECONDS, (received_count, websocket_count))
+    return received_count, websocket_count
+
+
+@app.route('/copier/broadcast', methods=['POST'])
+def copier_broadcast():
+    """Master broadcasts a signal to all connected followers."""
+    data = request.get_json()
+    master_key = data.get('master_key')
+    signal = data.get('signal')
     
+    if not master_key or not signal:
+        return jsonify({"error": "Missing master_key or signal"}), 400
+    
+    received_count, websocket_count = relay_copier_signal(signal)
     return jsonify({"received_count": received_count, "websocket_count": websocket_count})
 
 
@@ -4492,10 +5358,12 @@ def copier_poll():
     
     # Update heartbeat
     _connected_followers[follower_key]['last_heartbeat'] = datetime.now(timezone.utc).isoformat()
+    presence.touch(follower_key, 'copier')
     
     # Check for pending signals
     if follower_key in _pending_signals and _pending_signals[follower_key]:
         signal = _pending_signals[follower_key].pop(0)
+        copier_signals_delivered_total.inc(channel='http_poll')
         _connected_followers[follower_key]['signals_received'] = \
             _connected_followers[follower_key].get('signals_received', 0) + 1
         return jsonify({"signal": signal})
@@ -4525,6 +5393,13 @@ def copier_report():
         if current_position:
             _connected_followers[follower_key]['current_position'] = current_position
         
+        _notify_copier_masters('execution_report', {
+            'client_id': follower_key,
+            'status': status,
+            'signal_id': data.get('signal_id'),
+            'signals_executed': _connected_followers[follower_key].get('signals_executed', 0),
+            'current_position': _connected_followers[follower_key].get('current_position')
+        })
         return jsonify({"status": "ok"})
     
     return jsonify({"status": "reported"})
@@ -4533,20 +5408,7 @@ def copier_report():
 @app.route('/copier/followers', methods=['GET'])
 def copier_followers():
     """Get list of connected followers (for master dashboard)."""
-    followers = []
-    for follower_key, follower in _connected_followers.items():
-        followers.append({
-            'client_id': follower_key,
-            'name': follower['name'],
-            'account_ids': follower.get('account_ids', []),
-            'connected_at': follower['connected_at'],
-            'last_heartbeat': follower['last_heartbeat'],
-            'copy_enabled': follower.get('copy_enabled', True),
-            'signals_received': follower.get('signals_received', 0),
-            'signals_executed': follower.get('signals_executed', 0),
-            'current_position': follower.get('current_position')
-        })
-    
+    followers = [_copier_follower_row(key, follower) for key, follower in _connected_followers.items()]
     return jsonify({"followers": followers})
 
 
@@ -4559,6 +5421,10 @@ def copier_toggle_follower():
     if follower_key in _connected_followers:
         _connected_followers[follower_key]['copy_enabled'] = \
             not _connected_followers[follower_key].get('copy_enabled', True)
+        _notify_copier_masters('follower_toggled', {
+            'client_id': follower_key,
+            'copy_enabled': _connected_followers[follower_key]['copy_enabled']
+        })
         return jsonify({
             "follower_key": follower_key,
             "copy_enabled": _connected_followers[follower_key]['copy_enabled']
@@ -4635,7 +5501,7 @@ def admin_copier_users():
         return jsonify({"users": followers})
     
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+        with conn.cursor(cursor_factory=ProfiledDictCursor) as cursor:
             # Get all users with active licenses
             cursor.execute("""
                 SELECT 
@@ -4649,7 +5515,6 @@ def admin_copier_users():
             
             # Enhance with follower copier data
             users_list = []
-            now_utc = datetime.now(timezone.utc)
             
             for user in users:
                 license_key = user['license_key']
@@ -4658,16 +5523,7 @@ def admin_copier_users():
                 follower = _connected_followers.get(license_key)
                 
                 if follower:
-                    # User is online - check heartbeat freshness
-                    last_hb_str = follower.get('last_heartbeat', '')
-                    is_online = False
-                    if last_hb_str:
-                        try:
-                            last_hb = datetime.fromisoformat(last_hb_str.replace('Z', '+00:00'))
-                            time_since = (now_utc - last_hb).total_seconds()
-                            is_online = time_since < 60  # Online if heartbeat within last 60 seconds
-                        except:
-                            pass
+                    is_online = presence.is_online(license_key)
                     
                     # Get position and PNL data
                     current_position = follower.get('current_position')
@@ -4757,8 +5613,9 @@ def copier_ws_connect():
 def copier_ws_disconnect():
     """Handle copier WebSocket disconnection."""
     sid = request.sid
-    if sid in _copier_websocket_clients:
-        del _copier_websocket_clients[sid]
+    client = _copier_websocket_clients.pop(sid, None)
+    if client and client.get('license_key'):
+        presence.drop(client['license_key'], 'copier_ws')
     logging.info(f"📡 Copier WS client disconnected: {sid} (Remaining: {len(_copier_websocket_clients)})")
 
 
@@ -4770,6 +5627,7 @@ def copier_ws_subscribe(data):
     
     if sid in _copier_websocket_clients:
         _copier_websocket_clients[sid]['license_key'] = license_key
+        presence.touch(license_key, 'copier_ws')
     
     logging.info(f"📡 Copier WS client subscribed: {sid}")
     emit('subscribed', {'status': 'ok', 'message': 'Ready to receive trade signals'})
@@ -4778,8 +5636,58 @@ def copier_ws_subscribe(data):
 @socketio.on('ping', namespace='/copier')
 def copier_ws_ping():
     """Keep-alive ping from copier client."""
+    client = _copier_websocket_clients.get(request.sid)
+    if client and client.get('license_key'):
+        presence.touch(client['license_key'], 'copier_ws')
     emit('pong', {'timestamp': datetime.now(timezone.utc).isoformat()})
 
+
+# ============================================
+# COPIER MASTER CHANNEL
+# One authenticated socket per master: signals go up with acks,
+# follower join/leave/toggle/execution events come down as pushes
+# ============================================
+
+@socketio.on('connect', namespace='/copier-master')
+def copier_master_connect(auth=None):
+    """Master publisher connection, authenticated by master_key; receives the follower list"""
+    master_key = (auth or {}).get('master_key') or request.args.get('master_key')
+    is_valid, message, _ = validate_license(master_key)
+    if not is_valid:
+        logging.warning(f"🔒 Rejected copier master connection: {request.sid} ({message})")
+        return False
+    
+    _copier_master_clients[request.sid] = {
+        'master_key': master_key,
+        'connected_at': datetime.now(timezone.utc).isoformat()
+    }
+    emit('followers', {
+        'followers': [_copier_follower_row(key, follower) for key, follower in _connected_followers.items()]
+    })
+    logging.info(f"🎯 Copier master connected: {request.sid} (Total: {len(_copier_master_clients)})")
+
+
+@socketio.on('disconnect', namespace='/copier-master')
+def copier_master_disconnect():
+    _copier_master_clients.pop(request.sid, None)
+    logging.info(f"🎯 Copier master disconnected: {request.sid} (Remaining: {len(_copier_master_clients)})")
+
+
+@socketio.on('signal', namespace='/copier-master')
+def copier_master_signal(signal):
+    """Master publishes a trade signal; the return value is the ack"""
+    if request.sid not in _copier_master_clients:
+        return {"error": "Not authenticated"}
+    if not signal:
+        return {"error": "Missing signal"}
+    
+    received_count, websocket_count = relay_copier_signal(signal)
+    return {
+        "signal_id": signal.get('signal_id'),
+        "received_count": received_count,
+        "websocket_count": websocket_count
+    }
+
 if __name__ == '__main__':
     print("DEBUG: Starting __main__ block", flush=True)
     port = int(os.environ.get('PORT', 8000))
@@ -0,0 +1,116 @@
+"""
+Async Runtime - Serving mode detection for green-thread workers
+gunicorn's eventlet/gevent workers monkey-patch the stdlib before app.py is
+imported. This module picks the matching Flask-SocketIO async_mode, makes
+psycopg2 yield to the hub instead of blocking it, and exposes the REAL
+(unpatched) threading module for work that should run on OS threads.
+"""
+
+import logging
+import os
+import threading
+
+import psycopg2
+from psycopg2 import extensions, pool
+
+logger = logging.getLogger(__name__)
+
+
+def _is_patched(library):
+    try:
+        if library == 'eventlet':
+            import eventlet.patcher
+            return eventlet.patcher.is_monkey_patched('socket')
+        if library == 'gevent':
+            import gevent.monkey
+            return gevent.monkey.is_module_patched('socket')
+    except ImportError:
+        pass
+    return False
+
+
+def detect_async_mode():
+    """SOCKETIO_ASYNC_MODE if set, otherwise whatever the worker patched in"""
+    override = os.environ.get("SOCKETIO_ASYNC_MODE", "").strip().lower()
+    if override:
+        return override
+    if _is_patched('eventlet'):
+        return 'eventlet'
+    if _is_patched('gevent'):
+        return 'gevent'
+    return 'threading'
+
+
+ASYNC_MODE = detect_async_mode()
+GREEN = ASYNC_MODE in ('eventlet', 'gevent')
+
+# Unpatched threading for OS-thread work (email, health probes). Only eventlet
+# exposes a complete original module; under gevent these stay greenlets.
+if ASYNC_MODE == 'eventlet':
+    import eventlet.patcher
+    real_threading = eventlet.patcher.original('threading')
+else:
+    real_threading = threading
+
+# OS thread that runs the hub (the thread importing this module)
+_hub_thread_ident = real_threading.get_ident()
+
+
+def on_offload_thread():
+    """True when running on a real OS thread other than the hub thread"""
+    return ASYNC_MODE == 'eventlet' and real_threading.get_ident() != _hub_thread_ident
+
+
+def _eventlet_wait_callback(conn):
+    from eventlet.hubs import trampoline
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            break
+        elif state == extensions.POLL_READ:
+            trampoline(conn.fileno(), read=True)
+        elif state == extensions.POLL_WRITE:
+            trampoline(conn.fileno(), write=True)
+        else:
+            raise psycopg2.OperationalError(f"Bad result from poll: {state}")
+
+
+def _gevent_wait_callback(conn):
+    from gevent.socket import wait_read, wait_write
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            break
+        elif state == extensions.POLL_READ:
+            wait_read(conn.fileno())
+        elif state == extensions.POLL_WRITE:
+            wait_write(conn.fileno())
+        else:
+            raise psycopg2.OperationalError(f"Bad result from poll: {state}")
+
+
+def install_green_psycopg2():
+    """
+    Make psycopg2 cooperative (psycogreen-style wait callback) so a slow query
+    only parks its own green thread. Returns True if a callback was installed.
+    """
+    if ASYNC_MODE == 'eventlet':
+        extensions.set_wait_callback(_eventlet_wait_callback)
+    elif ASYNC_MODE == 'gevent':
+        extensions.set_wait_callback(_gevent_wait_callback)
+    else:
+        return False
+    logger.info(f"🟢 psycopg2 running cooperatively under {ASYNC_MODE}")
+    return True
+
+
+class OffloadConnectionPool(pool.ThreadedConnectionPool):
+    """
+    ThreadedConnectionPool guarded by a REAL lock, for offload OS threads.
+    psycopg2.pool imports threading after the monkey-patch, so the stock
+    lock would be a green lock that cannot be shared across OS threads.
+    """
+
+    def __init__(self, minconn, maxconn, *args, **kwargs):
+        super().__init__(minconn, maxconn, *args, **kwargs)
+        self._lock = real_threading.Lock()
@@ -0,0 +1,163 @@
+"""
+Compression - Negotiated gzip/brotli encoding and strong ETags for responses
+A strong ETag is derived from the uncompressed body (or supplied by the
+caller from a cached version), a matching If-None-Match turns the response
+into an empty 304 before any compression work, and bodies above the size
+threshold are encoded with the best coding the client accepts.
+brotli is optional; without it only gzip is offered.
+"""
+
+import gzip
+import hashlib
+import os
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+HAVE_BROTLI = brotli is not None
+
+
+def negotiate_encoding(accept_encoding):
+    """Pick 'br', 'gzip' or None from an Accept-Encoding header (q=0 excludes)"""
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding] = quality
+    wildcard = accepted.get("*", 0.0)
+    candidates = (("br", HAVE_BROTLI), ("gzip", True))
+    best = None
+    for coding, available in candidates:
+        quality = accepted.get(coding, wildcard)
+        if available and quality > 0 and (best is None or quality > best[1]):
+            best = (coding, quality)
+    return best[0] if best else None
+
+
+def encode(body, coding, gzip_level=6, brotli_quality=5):
+    if coding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    # mtime=0 keeps output identical for identical bodies
+    return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+
+
+def strong_etag(*parts):
+    """Quoted strong ETag from bytes/str parts"""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+        digest.update(b"\x00")
+    return f'"{digest.hexdigest()}"'
+
+
+def _if_none_match(request, etag):
+    header = request.headers.get("If-None-Match", "")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Encoded variants carry a -gzip/-br suffix; the base tag identifies the content
+    base = etag.strip('"')
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        candidate = candidate.strip('"')
+        if candidate == base or candidate.rsplit("-", 1)[0] == base:
+            return True
+    return False
+
+
+class ResponseOptimizer:
+    """after_request helper: conditional GET first, then compression"""
+
+    def __init__(self, min_size=1024, gzip_level=6, brotli_quality=5):
+        """
+        Args:
+            min_size: Bodies smaller than this (bytes) are sent uncompressed
+            gzip_level: zlib level 1-9
+            brotli_quality: brotli quality 0-11 (5 is a good speed/ratio point for dynamic JSON)
+        """
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self._static_cache = {}
+
+    def process(self, request, response, etag=None, cache_control="private, no-cache"):
+        """
+        Add ETag/Vary/Cache-Control, answer 304 on a matching If-None-Match,
+        otherwise compress when negotiated. `etag` overrides the body hash
+        (e.g. built from a cached result version).
+        """
+        if request.method not in ("GET", "HEAD") or response.status_code != 200:
+            return response
+        if response.direct_passthrough or response.is_streamed or "Content-Encoding" in response.headers:
+            return response
+
+        body = response.get_data()
+        etag = etag or strong_etag(body)
+        response.headers["Cache-Control"] = cache_control
+        response.vary.add("Accept-Encoding")
+
+        if _if_none_match(request, etag):
+            response.status_code = 304
+            response.set_data(b"")
+            response.headers.pop("Content-Length", None)
+            response.headers.pop("Content-Type", None)
+            response.headers["ETag"] = etag
+            return response
+
+        coding = negotiate_encoding(request.headers.get("Accept-Encoding")) if len(body) >= self.min_size else None
+        if coding:
+            response.set_data(encode(body, coding, self.gzip_level, self.brotli_quality))
+            response.headers["Content-Encoding"] = coding
+            etag = f'{etag[:-1]}-{coding}"'
+        response.headers["ETag"] = etag
+        return response
+
+    def static_file(self, request, response_class, path, mimetype, cache_control="no-cache"):
+        """
+        Serve a file from memory, re-read only when its mtime/size change;
+        encoded variants and the ETag are computed once per file version.
+        """
+        stat = os.stat(path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        entry = self._static_cache.get(path)
+        if entry is None or entry["version"] != version:
+            with open(path, "rb") as f:
+                body = f.read()
+            entry = {"version": version, "body": body, "etag": strong_etag(body), "encoded": {}}
+            self._static_cache[path] = entry
+
+        response = response_class(status=200, mimetype=mimetype)
+        response.headers["Cache-Control"] = cache_control
+        response.vary.add("Accept-Encoding")
+        if _if_none_match(request, entry["etag"]):
+            response.status_code = 304
+            response.headers["ETag"] = entry["etag"]
+            return response
+
+        coding = negotiate_encoding(request.headers.get("Accept-Encoding")) if len(entry["body"]) >= self.min_size else None
+        if coding:
+            encoded = entry["encoded"].get(coding)
+            if encoded is None:
+                # Static content: spend the extra CPU once for the best ratio
+                encoded = entry["encoded"][coding] = encode(entry["body"], coding, 9, 11)
+            response.set_data(encoded)
+            response.headers["Content-Encoding"] = coding
+            response.headers["ETag"] = f'{entry["etag"][:-1]}-{coding}"'
+        else:
+            response.set_data(entry["body"])
+            response.headers["ETag"] = entry["etag"]
+        return response
@@ -8,7 +8,7 @@ $scriptPath = Split-Path -Parent $MyInvocation.MyCommand.Path
 Set-Location $scriptPath
 
 # Create deployment package (zip current directory excluding unnecessary files)
-$exclude = @('__pycache__', '.azure', 'migrations', '.git', '*.pyc', 'deploy.ps1')
+$exclude = @('__pycache__', '.azure', 'migrations', '.git', '*.pyc', 'deploy.ps1', '*_harness.py')
 $files = Get-ChildItem -Recurse -File | Where-Object {
     $path = $_.FullName
     -not ($exclude | Where-Object { $path -like "*$_*" })
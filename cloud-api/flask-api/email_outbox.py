@@ -0,0 +1,460 @@
+"""
+Email Outbox - Durable queue for outbound email
+Request handlers only INSERT a row; a small pool of worker threads claims
+pending rows, sends them over a reused SendGrid session or SMTP connection,
+and retries failures with exponential backoff.
+
+Both transports take their endpoint as a parameter, so the outbox can be
+pointed at a local stand-in (e.g. `python -m aiosmtpd -n` or any HTTP server
+that answers 202) instead of the real provider.
+"""
+
+import logging
+import smtplib
+import threading
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# SendGrid accepts up to 1000 personalizations per request
+SENDGRID_MAX_PERSONALIZATIONS = 1000
+
+
+def _mask(email):
+    """Mask an address for logging (user@example.com -> us***@example.com)"""
+    if not email or '@' not in email:
+        return "***"
+    local, domain = email.split('@', 1)
+    return f"{local[:2]}***@{domain}"
+
+
+class SendGridTransport:
+    """SendGrid v3 mail/send over one keep-alive HTTP session"""
+
+    name = "sendgrid"
+
+    def __init__(self, api_key, from_email, from_name="QuoTrading",
+                 reply_to="support@quotrading.com", base_url="https://api.sendgrid.com", timeout=10):
+        self.api_key = api_key
+        self.from_email = from_email
+        self.from_name = from_name
+        self.reply_to = reply_to
+        self.url = f"{base_url.rstrip('/')}/v3/mail/send"
+        self.timeout = timeout
+        self._session = None
+
+    def _get_session(self):
+        if self._session is None:
+            self._session = requests.Session()
+            self._session.headers.update({
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json"
+            })
+        return self._session
+
+    def send_batch(self, messages):
+        """
+        Send messages, grouping identical subject/body into one request with
+        one personalization per recipient (recipients never see each other).
+
+        Returns: {message_id: error or None}
+        """
+        groups = {}
+        for msg in messages:
+            groups.setdefault((msg['subject'], msg['html_body']), []).append(msg)
+
+        results = {}
+        for (subject, html_body), group in groups.items():
+            for i in range(0, len(group), SENDGRID_MAX_PERSONALIZATIONS):
+                chunk = group[i:i + SENDGRID_MAX_PERSONALIZATIONS]
+                payload = {
+                    "personalizations": [{"to": [{"email": msg['to_email']}]} for msg in chunk],
+                    "from": {"email": self.from_email, "name": self.from_name},
+                    "reply_to": {"email": self.reply_to, "name": f"{self.from_name} Support"},
+                    "subject": subject,
+                    "content": [{"type": "text/html", "value": html_body}]
+                }
+                try:
+                    response = self._get_session().post(self.url, json=payload, timeout=self.timeout)
+                    error = None if response.status_code == 202 else f"SendGrid status {response.status_code}"
+                except Exception as e:
+                    self.close()  # Drop a possibly broken keep-alive connection
+                    error = f"{type(e).__name__}: {e}"
+                for msg in chunk:
+                    results[msg['id']] = error
+        return results
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+        self._session = None
+
+
+class SMTPTransport:
+    """SMTP over one persistent connection, re-opened when the server drops it"""
+
+    name = "smtp"
+
+    def __init__(self, host, port, username, password, from_email, starttls=True, timeout=10):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.from_email = from_email
+        self.starttls = starttls
+        self.timeout = timeout
+        self._server = None
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            server.starttls()
+        if self.username and self.password:
+            server.login(self.username, self.password)
+        return server
+
+    def _get_server(self):
+        if self._server is not None:
+            try:
+                if self._server.noop()[0] == 250:
+                    return self._server
+            except Exception:
+                pass
+            self.close()
+        self._server = self._connect()
+        return self._server
+
+    def send_batch(self, messages):
+        """Send each message on the shared connection. Returns {message_id: error or None}"""
+        results = {}
+        for msg in messages:
+            mime = MIMEMultipart('alternative')
+            mime['Subject'] = msg['subject']
+            mime['From'] = self.from_email
+            mime['To'] = msg['to_email']
+            mime.attach(MIMEText(msg['html_body'], 'html'))
+            try:
+                self._get_server().send_message(mime)
+                results[msg['id']] = None
+            except Exception as e:
+                self.close()
+                results[msg['id']] = f"{type(e).__name__}: {e}"
+        return results
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+        self._server = None
+
+
+class FallbackTransport:
+    """Try the primary transport, resend only the failures through the fallback"""
+
+    def __init__(self, primary, fallback):
+        self.primary = primary
+        self.fallback = fallback
+        self.name = f"{primary.name}+{fallback.name}"
+
+    def send_batch(self, messages):
+        results = self.primary.send_batch(messages)
+        failed = [msg for msg in messages if results.get(msg['id'])]
+        if failed:
+            logger.warning(f"📧 {len(failed)} emails failed via {self.primary.name}, trying {self.fallback.name}")
+            results.update(self.fallback.send_batch(failed))
+        return results
+
+    def close(self):
+        self.primary.close()
+        self.fallback.close()
+
+
+class EmailOutbox:
+    """
+    Durable email queue backed by the `email_outbox` table.
+
+    Any number of processes may run workers; rows are claimed with
+    FOR UPDATE SKIP LOCKED so each email is sent by exactly one worker.
+    """
+
+    def __init__(self, get_connection, return_connection, transport_factory,
+                 workers=2, batch_size=50, max_attempts=6, backoff_seconds=30,
+                 poll_seconds=5.0, stuck_after_seconds=600, threading_module=threading):
+        """
+        Args:
+            get_connection / return_connection: Pool accessors for the database
+            transport_factory: Callable returning a NEW transport (one per worker thread),
+                               or None when no provider is configured
+            workers: Number of sender threads
+            batch_size: Rows claimed per round trip
+            max_attempts: Attempts before a message is marked failed
+            backoff_seconds: First retry delay; doubles on every attempt
+            poll_seconds: Idle wait between claims when nobody calls wake()
+            stuck_after_seconds: 'sending' rows older than this are re-queued (crashed worker)
+            threading_module: Source of Thread/Event (pass the unpatched module to send
+                              from real OS threads under eventlet)
+        """
+        self._get_connection = get_connection
+        self._return_connection = return_connection
+        self._transport_factory = transport_factory
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.poll_seconds = poll_seconds
+        self.stuck_after_seconds = stuck_after_seconds
+
+        self._threading = threading_module
+        self._wake_event = threading_module.Event()
+        self._stop_event = threading_module.Event()
+        self._threads = []
+        self._table_ready = False
+        self.sent_count = 0
+        self.failed_count = 0
+
+    # ------------------------------------------------------------------
+    # Schema / enqueue
+    # ------------------------------------------------------------------
+
+    def _create_table(self, cursor):
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS email_outbox (
+                id BIGSERIAL PRIMARY KEY,
+                to_email VARCHAR(255) NOT NULL,
+                subject TEXT NOT NULL,
+                html_body TEXT NOT NULL,
+                template VARCHAR(50),
+                status VARCHAR(20) NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+                claimed_at TIMESTAMP WITH TIME ZONE,
+                last_error TEXT,
+                created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+                sent_at TIMESTAMP WITH TIME ZONE
+            )
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_email_outbox_pending
+            ON email_outbox(next_attempt_at) WHERE status = 'pending'
+        """)
+
+    def ensure_table(self, conn):
+        """Create the outbox table (idempotent)"""
+        with conn.cursor() as cursor:
+            self._create_table(cursor)
+        conn.commit()
+        self._table_ready = True
+
+    def enqueue(self, to_email, subject, html_body, template=None, cursor=None):
+        """
+        Queue one email. Returns the outbox id, or None if the database is unavailable.
+
+        With `cursor`, the row is inserted in the caller's transaction so it
+        only becomes visible (and is only sent) if the caller commits. Call
+        wake() after committing.
+        """
+        insert_sql = """
+            INSERT INTO email_outbox (to_email, subject, html_body, template)
+            VALUES (%s, %s, %s, %s)
+            RETURNING id
+        """
+        if cursor is not None:
+            if not self._table_ready:
+                self._create_table(cursor)
+            cursor.execute(insert_sql, (to_email, subject, html_body, template))
+            return cursor.fetchone()[0]
+
+        conn = self._get_connection()
+        if not conn:
+            return None
+        try:
+            if not self._table_ready:
+                self.ensure_table(conn)
+            with conn.cursor() as cursor:
+                cursor.execute(insert_sql, (to_email, subject, html_body, template))
+                outbox_id = cursor.fetchone()[0]
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"📧 Failed to queue {template or 'email'} for {_mask(to_email)}: {e}")
+            return None
+        finally:
+            self._return_connection(conn)
+
+        self._wake_event.set()
+        return outbox_id
+
+    def send_now(self, to_email, subject, html_body):
+        """Send one email synchronously on a fresh transport (used when the queue is unavailable)"""
+        transport = self._transport_factory()
+        if transport is None:
+            return False
+        try:
+            results = transport.send_batch([{"id": 0, "to_email": to_email, "subject": subject, "html_body": html_body}])
+            return results.get(0) is None
+        finally:
+            transport.close()
+
+    def wake(self):
+        """Ask idle workers to claim immediately"""
+        self._wake_event.set()
+
+    # ------------------------------------------------------------------
+    # Workers
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Start the worker threads (idempotent)"""
+        if any(t.is_alive() for t in self._threads):
+            return
+        self._stop_event.clear()
+        self._threads = [
+            self._threading.Thread(target=self._worker_loop, name=f"email-outbox-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"📧 Email outbox started ({self.workers} workers)")
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake_event.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+
+    def _worker_loop(self):
+        transport = None
+        while not self._stop_event.is_set():
+            claimed = 0
+            try:
+                if transport is None:
+                    transport = self._transport_factory()
+                if transport is not None:
+                    claimed = self.process_batch(transport)
+            except Exception as e:
+                logger.error(f"📧 Outbox worker error: {e}")
+            if claimed < self.batch_size:
+                # Queue drained (or no transport) - sleep until woken or the next poll
+                self._wake_event.wait(self.poll_seconds)
+                self._wake_event.clear()
+        if transport is not None:
+            transport.close()
+
+    def _claim(self):
+        conn = self._get_connection()
+        if not conn:
+            return []
+        try:
+            if not self._table_ready:
+                self.ensure_table(conn)
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    UPDATE email_outbox
+                    SET status = 'sending', attempts = attempts + 1, claimed_at = NOW()
+                    WHERE id IN (
+                        SELECT id FROM email_outbox
+                        WHERE (status = 'pending' AND next_attempt_at <= NOW())
+                           OR (status = 'sending' AND claimed_at < NOW() - make_interval(secs => %s))
+                        ORDER BY id
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING id, to_email, subject, html_body, attempts
+                """, (self.stuck_after_seconds, self.batch_size))
+                rows = cursor.fetchall()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._return_connection(conn)
+        return [
+            {"id": r[0], "to_email": r[1], "subject": r[2], "html_body": r[3], "attempts": r[4]}
+            for r in rows
+        ]
+
+    def process_batch(self, transport):
+        """Claim and send one batch. Returns the number of rows claimed."""
+        messages = self._claim()
+        if not messages:
+            return 0
+
+        results = transport.send_batch(messages)
+
+        sent_ids = [msg['id'] for msg in messages if not results.get(msg['id'])]
+        retry_rows = []
+        failed_rows = []
+        for msg in messages:
+            error = results.get(msg['id'])
+            if not error:
+                continue
+            if msg['attempts'] >= self.max_attempts:
+                failed_rows.append((msg['id'], error))
+                logger.error(f"📧 Giving up on email to {_mask(msg['to_email'])} after {msg['attempts']} attempts: {error}")
+            else:
+                delay = self.backoff_seconds * (2 ** (msg['attempts'] - 1))
+                retry_rows.append((msg['id'], error, delay))
+
+        conn = self._get_connection()
+        if not conn:
+            # Rows stay 'sending' and are re-queued by the stuck-row check
+            return len(messages)
+        try:
+            with conn.cursor() as cursor:
+                if sent_ids:
+                    cursor.execute("""
+                        UPDATE email_outbox SET status = 'sent', sent_at = NOW(), last_error = NULL
+                        WHERE id = ANY(%s)
+                    """, (sent_ids,))
+                for outbox_id, error, delay in retry_rows:
+                    cursor.execute("""
+                        UPDATE email_outbox
+                        SET status = 'pending', last_error = %s,
+                            next_attempt_at = NOW() + make_interval(secs => %s)
+                        WHERE id = %s
+                    """, (error[:1000], delay, outbox_id))
+                for outbox_id, error in failed_rows:
+                    cursor.execute("""
+                        UPDATE email_outbox SET status = 'failed', last_error = %s
+                        WHERE id = %s
+                    """, (error[:1000], outbox_id))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._return_connection(conn)
+
+        self.sent_count += len(sent_ids)
+        self.failed_count += len(failed_rows)
+        if sent_ids:
+            logger.info(f"📧 Sent {len(sent_ids)} emails via {transport.name}" +
+                        (f" ({len(retry_rows)} scheduled for retry)" if retry_rows else ""))
+        return len(messages)
+
+    def stats(self):
+        """Queue depth by status plus this process's counters"""
+        result = {
+            "workers": sum(1 for t in self._threads if t.is_alive()),
+            "sent_by_this_worker": self.sent_count,
+            "failed_by_this_worker": self.failed_count,
+            "queue": {}
+        }
+        conn = self._get_connection()
+        if not conn:
+            return result
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT status, COUNT(*) FROM email_outbox GROUP BY status")
+                result["queue"] = {status: count for status, count in cursor.fetchall()}
+        except Exception as e:
+            conn.rollback()
+            result["error"] = str(e)
+        finally:
+            self._return_connection(conn)
+        return result
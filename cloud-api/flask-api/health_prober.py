@@ -0,0 +1,122 @@
+"""
+Health Prober - Runs dependency checks in the background
+Health endpoints read the latest snapshot instead of probing on the request
+thread, so a slow dependency can never hold a worker for the probe timeout.
+A result older than a few intervals (prober thread hung in a probe, or dead)
+is reported unhealthy rather than served as current.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+
+class HealthProber:
+    """
+    Runs registered probes every `interval_seconds` and keeps, per probe,
+    the last result plus rolling latency stats over the last `window` runs.
+    """
+
+    def __init__(self, interval_seconds=15.0, window=40, stale_after_seconds=None, threading_module=threading):
+        """
+        Args:
+            interval_seconds: Delay between probe rounds
+            window: Number of latency samples kept per probe
+            stale_after_seconds: Age after which a result is reported unhealthy
+                                 (default: 3 intervals)
+            threading_module: Source of Thread/Lock/Event (pass the unpatched module
+                              to probe from a real OS thread under eventlet)
+        """
+        self.interval_seconds = interval_seconds
+        self.window = window
+        self.stale_after_seconds = stale_after_seconds or interval_seconds * 3
+        self._probes = {}
+        self._latencies = {}
+        self._snapshot = {}
+        self._checked_at = {}  # name -> time.monotonic() of the last published result
+        self._started_at = None
+        self._threading = threading_module
+        self._lock = threading_module.Lock()
+        self._stop_event = threading_module.Event()
+        self._thread = None
+
+    def add_probe(self, name, func):
+        """
+        Register a probe. `func()` returns a dict with at least "status"
+        ("healthy" / "degraded" / "unhealthy"); exceptions mark it unhealthy.
+        """
+        self._probes[name] = func
+        self._latencies[name] = deque(maxlen=self.window)
+
+    def start(self):
+        """Start the prober thread (idempotent)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._started_at = time.monotonic()
+        self._thread = self._threading.Thread(target=self._run_loop, name="health-prober", daemon=True)
+        self._thread.start()
+        logger.info(f"🩺 Health prober started ({len(self._probes)} probes every {self.interval_seconds}s)")
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _run_loop(self):
+        while not self._stop_event.is_set():
+            self.run_once()
+            self._stop_event.wait(self.interval_seconds)
+
+    def run_once(self):
+        """Run every probe once and publish the results"""
+        for name, func in list(self._probes.items()):
+            start = time.perf_counter()
+            try:
+                result = dict(func() or {})
+            except Exception as e:
+                logger.error(f"🩺 Health probe {name} failed: {e}")
+                result = {"status": "unhealthy", "error": str(e)}
+            elapsed_ms = round((time.perf_counter() - start) * 1000, 2)
+            result.setdefault("response_time_ms", elapsed_ms)
+
+            latencies = self._latencies[name]
+            latencies.append(elapsed_ms)
+            ordered = sorted(latencies)
+            result["last_checked"] = datetime.now(timezone.utc).isoformat()
+            result["latency"] = {
+                "samples": len(ordered),
+                "avg_ms": round(sum(ordered) / len(ordered), 2),
+                "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+                "max_ms": ordered[-1]
+            }
+
+            with self._lock:
+                self._snapshot[name] = result
+                self._checked_at[name] = time.monotonic()
+
+    def snapshot(self):
+        """
+        Latest result per probe. Probes that have not run yet are absent, unless the
+        prober started more than stale_after_seconds ago; those and stale results are
+        reported unhealthy with "stale": True.
+        """
+        now = time.monotonic()
+        with self._lock:
+            snapshot = {name: dict(result) for name, result in self._snapshot.items()}
+            checked_at = dict(self._checked_at)
+        if self._started_at is None:
+            return snapshot
+        for name in self._probes:
+            age = now - checked_at.get(name, self._started_at)
+            if age <= self.stale_after_seconds:
+                continue
+            result = snapshot.setdefault(name, {"response_time_ms": 0, "last_checked": None})
+            result["stale"] = True
+            result["status"] = "unhealthy"
+            result["error"] = f"No probe result for {int(age)}s (prober stalled)"
+        return snapshot
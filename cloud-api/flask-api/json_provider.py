@@ -0,0 +1,104 @@
+"""
+JSON Provider - orjson-backed serialization for Flask and Socket.IO
+When orjson is installed, responses and Socket.IO packets are encoded by it.
+Datetimes are written in UTC with a 'Z' suffix, like format_datetime_utc
+(naive values are taken as UTC, aware ones converted); orjson hands them to
+the same default() the stdlib path uses, so both paths write them
+identically. Without orjson, or for values orjson rejects, the stdlib
+encoder is used.
+"""
+
+import json
+import uuid
+from datetime import date, datetime, time, timezone
+from decimal import Decimal
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+HAVE_ORJSON = orjson is not None
+
+if HAVE_ORJSON:
+    # orjson writes aware datetimes with their own offset; pass them to default() to convert to UTC
+    _ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _format_datetime(dt):
+    """UTC ISO string with 'Z' suffix (naive values are UTC), as format_datetime_utc"""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    elif dt.utcoffset():
+        dt = dt.astimezone(timezone.utc)
+    return dt.isoformat().replace("+00:00", "Z")
+
+
+def default(obj):
+    """Fallback for types neither encoder handles natively"""
+    if isinstance(obj, datetime):
+        return _format_datetime(obj)
+    if isinstance(obj, (date, time)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if hasattr(obj, "tolist"):  # numpy scalars/arrays on the stdlib path
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class _StdlibEncoder(json.JSONEncoder):
+    """stdlib path; datetimes are routed through default() before JSONEncoder sees them"""
+
+    def default(self, obj):
+        return default(obj)
+
+
+def dumps_bytes(obj, sort_keys=False):
+    """Serialize to compact UTF-8 JSON bytes"""
+    if HAVE_ORJSON:
+        try:
+            return orjson.dumps(obj, default=default,
+                                option=_ORJSON_OPTIONS | (orjson.OPT_SORT_KEYS if sort_keys else 0))
+        except TypeError:
+            pass  # e.g. ints beyond 64 bits; the stdlib encoder accepts them
+    return json.dumps(obj, cls=_StdlibEncoder, sort_keys=sort_keys, ensure_ascii=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def dumps(obj, **kwargs):
+    """str-returning dumps(); stdlib keyword arguments other than sort_keys are ignored"""
+    return dumps_bytes(obj, sort_keys=kwargs.get("sort_keys", False)).decode("utf-8")
+
+
+def loads(s, **kwargs):
+    if HAVE_ORJSON:
+        return orjson.loads(s)
+    return json.loads(s)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider; jsonify() and request.get_json() go through this"""
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj, sort_keys=kwargs.get("sort_keys", self.sort_keys))
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj, sort_keys=self.sort_keys), mimetype=self.mimetype)
+
+
+class SocketIOJSON:
+    """Stands in for the `json` module passed to SocketIO(json=...)"""
+
+    dumps = staticmethod(dumps)
+    loads = staticmethod(loads)
@@ -0,0 +1,109 @@
+"""
+JSON Provider Harness - Micro-benchmark of response serialization
+Encodes a synthetic admin_list_users-sized payload three ways and reports
+the per-call time:
+  legacy  - format_datetime_utc per field, then stdlib json (previous path)
+  stdlib  - json_provider fallback (no orjson)
+  orjson  - json_provider with orjson (skipped if not installed)
+
+Usage:
+    python json_provider_harness.py --rows 5000 --repeat 20
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import json_provider
+
+
+def _format_datetime_utc(dt):
+    """Same logic as app.format_datetime_utc (kept local so app.py is not imported)"""
+    if dt is None:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    iso_str = dt.isoformat()
+    if iso_str.endswith('+00:00'):
+        return iso_str.replace('+00:00', 'Z')
+    return dt.astimezone(timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+def build_rows(count):
+    now = datetime.now(timezone.utc)
+    rows = []
+    for i in range(count):
+        rows.append({
+            "account_id": f"ACC{i:06d}",
+            "email": f"user{i}@example.com",
+            "license_key": f"QT-{i:04X}-{random.randint(0, 0xFFFF):04X}",
+            "license_type": random.choice(["MONTHLY", "ANNUAL", "TRIAL"]),
+            "license_status": random.choice(["active", "expired", "suspended"]),
+            "license_expiration": now + timedelta(days=random.randint(-30, 365)),
+            "created_at": now - timedelta(days=random.randint(0, 700)),
+            "last_heartbeat": now - timedelta(seconds=random.randint(0, 3600)),
+            "total_trades": random.randint(0, 5000),
+            "total_pnl": Decimal(f"{random.uniform(-5000, 5000):.2f}"),
+            "is_online": random.random() < 0.3,
+            "notes": None
+        })
+    return rows
+
+
+def legacy_encode(rows):
+    formatted = [
+        {key: _format_datetime_utc(value) if isinstance(value, datetime) else
+         float(value) if isinstance(value, Decimal) else value
+         for key, value in row.items()}
+        for row in rows
+    ]
+    return json.dumps({"users": formatted, "total": len(formatted)}, sort_keys=True).encode("utf-8")
+
+
+def _time(func, repeat):
+    func()  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    rows = build_rows(args.rows)
+    payload = {"users": rows, "total": len(rows)}
+
+    results = {"legacy": _time(lambda: legacy_encode(rows), args.repeat)}
+
+    have_orjson = json_provider.HAVE_ORJSON
+    json_provider.HAVE_ORJSON = False
+    stdlib_bytes = json_provider.dumps_bytes(payload, sort_keys=True)
+    results["stdlib"] = _time(lambda: json_provider.dumps_bytes(payload, sort_keys=True), args.repeat)
+    json_provider.HAVE_ORJSON = have_orjson
+
+    if have_orjson:
+        orjson_bytes = json_provider.dumps_bytes(payload, sort_keys=True)
+        if json.loads(orjson_bytes) != json.loads(stdlib_bytes):
+            print("❌ orjson and stdlib output differ")
+            return 1
+        results["orjson"] = _time(lambda: json_provider.dumps_bytes(payload, sort_keys=True), args.repeat)
+    else:
+        print("⚠️ orjson not installed - orjson variant skipped")
+
+    print(f"Payload: {args.rows} rows, {len(stdlib_bytes) / 1024:.0f} KiB, {args.repeat} runs each")
+    baseline = results["legacy"]
+    for name, elapsed_ms in results.items():
+        print(f"  {name:<7} {elapsed_ms:8.2f} ms/call   {baseline / elapsed_ms:5.1f}x vs legacy")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
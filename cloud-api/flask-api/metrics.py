@@ -0,0 +1,209 @@
+"""
+Metrics - Prometheus text-format counters, histograms and gauges
+Recording is lock-free on the hot path: every OS thread writes to its own
+shard (green threads sharing an OS thread never preempt mid-update), and a
+scrape sums the shards. Shards of finished threads are folded into one
+retired shard, so a thread-per-request server keeps one shard per live
+thread. Gauges are callbacks evaluated only at scrape time.
+No dependency on prometheus_client.
+"""
+
+import math
+import threading
+
+# Seconds; tuned for API latencies (1ms .. 10s)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _fold(target, shard):
+    """Add every cell of `shard` into `target` (both {key: cell})"""
+    for key, cell in list(shard.items()):
+        existing = target.get(key)
+        if existing is None:
+            target[key] = list(cell)
+        else:
+            for i, value in enumerate(cell):
+                existing[i] += value
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    def __init__(self, registry, name, help_text, labelnames):
+        self._registry = registry
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels):
+        return (self.name, tuple(str(labels.get(name, "")) for name in self.labelnames))
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        shard = self._registry._shard()
+        key = self._key(labels)
+        cell = shard.get(key)
+        if cell is None:
+            shard[key] = [amount]
+        else:
+            cell[0] += amount
+
+    def render(self, merged):
+        lines = []
+        for (name, values), cell in sorted(merged.get(self.name, {}).items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(cell[0])}")
+        return lines
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, registry, name, help_text, labelnames, buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        shard = self._registry._shard()
+        key = self._key(labels)
+        cell = shard.get(key)
+        if cell is None:
+            # [per-bucket counts..., +Inf count, sum]
+            cell = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                cell[i] += 1
+                break
+        else:
+            cell[len(self.buckets)] += 1
+        cell[-1] += value
+
+    def render(self, merged):
+        lines = []
+        for (name, values), cell in sorted(merged.get(self.name, {}).items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), cell[:-1]):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, values)} {_format_value(round(cell[-1], 6))}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, values)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Gauge whose samples come from `func()` at scrape time: {label_values_tuple: value} or a number"""
+
+    type = "gauge"
+
+    def __init__(self, name, help_text, labelnames, func):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.func = func
+
+    def render(self, merged):
+        try:
+            samples = self.func()
+        except Exception:
+            return []
+        if not isinstance(samples, dict):
+            samples = {(): samples}
+        return [
+            f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}"
+            for values, value in sorted(samples.items(), key=lambda item: item[0])
+            if value is not None
+        ]
+
+
+class MetricsRegistry:
+    """Holds metric definitions and the per-thread shards they record into"""
+
+    def __init__(self, threading_module=threading):
+        """
+        Args:
+            threading_module: Source of local()/Lock(); pass the unpatched module under
+                              eventlet so shards are per OS thread, not per greenlet
+        """
+        self._metrics = []
+        self._shards = []  # [(owning thread, shard)]
+        self._retired = {}  # Totals of threads that have exited
+        self._shards_lock = threading_module.Lock()
+        self._local = threading_module.local()
+        self._current_thread = threading_module.current_thread
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._shards_lock:  # Once per thread
+                self._sweep()
+                self._shards.append((self._current_thread(), shard))
+        return shard
+
+    def _sweep(self):
+        """Fold shards of exited threads into the retired shard (caller holds the lock)"""
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                _fold(self._retired, shard)  # The thread is gone, nothing writes this shard any more
+        self._shards = live
+
+    def counter(self, name, help_text, labelnames=()):
+        metric = Counter(self, name, help_text, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(self, name, help_text, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name, help_text, labelnames, func):
+        metric = Gauge(name, help_text, labelnames, func)
+        self._metrics.append(metric)
+        return metric
+
+    def _merge(self):
+        totals = {}
+        with self._shards_lock:
+            self._sweep()
+            _fold(totals, self._retired)
+            shards = [shard for _, shard in self._shards]
+        for shard in shards:
+            _fold(totals, shard)
+        merged = {}
+        for (name, values), cell in totals.items():
+            merged.setdefault(name, {})[(name, values)] = cell
+        return merged
+
+    def render(self):
+        """All metrics in Prometheus text exposition format (version 0.0.4)"""
+        merged = self._merge()
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render(merged))
+        return "\n".join(lines) + "\n"
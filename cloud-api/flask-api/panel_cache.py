@@ -0,0 +1,121 @@
+"""
+Panel Cache - Shared, versioned aggregates for the admin dashboard
+Each panel is a loader plus a TTL. Readers within the TTL share one result;
+when it expires, one caller refreshes while concurrent callers wait for that
+refresh instead of querying again. A panel's version only increments when its
+data actually changes, so versions double as ETags and delta triggers.
+Versions count from 1 in every process, so each cache also has a random
+epoch; an ETag built from versions must include it.
+"""
+
+import logging
+import secrets
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class _Panel:
+    def __init__(self, name, loader, ttl_seconds, threading_module):
+        self.name = name
+        self.loader = loader
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading_module.Lock()
+        self.data = None
+        self.version = 0
+        self.loaded_at = 0.0
+        self.loaded = False
+
+
+class PanelCache:
+    """Named loaders with TTL, single-flight refresh and change versions"""
+
+    def __init__(self, threading_module=threading):
+        """
+        Args:
+            threading_module: Source of Lock(); under eventlet pass the (patched) default
+                              so waiting callers yield instead of blocking the hub
+        """
+        self._threading = threading_module
+        self._panels = {}
+        self.epoch = secrets.token_hex(8)  # Tells this process's versions apart from other workers'/restarts'
+
+    def register(self, name, loader, ttl_seconds):
+        """`loader()` returns JSON-serializable data; exceptions keep the last good value"""
+        self._panels[name] = _Panel(name, loader, ttl_seconds, self._threading)
+
+    def names(self):
+        return list(self._panels)
+
+    def get(self, name, max_age=None):
+        """Data for one panel, refreshed if older than its TTL (or `max_age` seconds)"""
+        panel = self._panels[name]
+        ttl = panel.ttl_seconds if max_age is None else max_age
+        if panel.loaded and time.monotonic() - panel.loaded_at < ttl:
+            return panel.data
+        with panel.lock:
+            # Another caller may have refreshed while we waited
+            if panel.loaded and time.monotonic() - panel.loaded_at < ttl:
+                return panel.data
+            try:
+                data = panel.loader()
+            except Exception as e:
+                if not panel.loaded:
+                    raise
+                logger.warning(f"⚠️ Panel {name} refresh failed, serving previous data: {e}")
+                panel.loaded_at = time.monotonic()  # Back off for one TTL
+                return panel.data
+            if not panel.loaded or data != panel.data:
+                panel.version += 1
+            panel.data = data
+            panel.loaded = True
+            panel.loaded_at = time.monotonic()
+            return data
+
+    def version(self, name):
+        return self._panels[name].version
+
+    def snapshot(self, names=None, max_age=None):
+        """({name: data}, {name: version}) for the requested panels; failed panels are omitted"""
+        panels, versions = {}, {}
+        for name in names or self._panels:
+            if name not in self._panels:
+                continue
+            try:
+                panels[name] = self.get(name, max_age)
+                versions[name] = self._panels[name].version
+            except Exception as e:
+                logger.error(f"❌ Panel {name} unavailable: {e}")
+        return panels, versions
+
+    def invalidate(self, name=None):
+        """Force the next get() to reload (all panels when name is None)"""
+        for panel in ([self._panels[name]] if name else self._panels.values()):
+            panel.loaded_at = 0.0
+
+
+def diff_keyed(old_rows, new_rows, key):
+    """
+    Compare two lists of dicts by `key`.
+    Returns {"added": [...], "removed": [keys], "changed": [...]} or None if identical.
+    """
+    old_index = {row.get(key): row for row in old_rows or []}
+    new_index = {row.get(key): row for row in new_rows or []}
+    added = [row for k, row in new_index.items() if k not in old_index]
+    changed = [row for k, row in new_index.items() if k in old_index and old_index[k] != row]
+    removed = [k for k in old_index if k not in new_index]
+    if not (added or changed or removed):
+        return None
+    return {"added": added, "removed": removed, "changed": changed}
+
+
+def new_rows(old_rows, new_rows_, key):
+    """Rows at the head of a newest-first list that the previous list did not contain"""
+    seen = {key(row) for row in old_rows or []}
+    fresh = []
+    for row in new_rows_ or []:
+        if key(row) in seen:
+            break
+        fresh.append(row)
+    return fresh
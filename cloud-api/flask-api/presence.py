@@ -0,0 +1,200 @@
+"""
+Presence - Single in-memory answer to "is this license online?"
+Every heartbeat source (bot heartbeats, API calls, copier followers, sockets)
+touches the registry in O(1). A key stays online while any of its sources
+was seen within that source's TTL. Expiry runs on a time wheel: entries sit in
+the bucket of the second they expire, and reads advance the wheel over the
+elapsed buckets, so no scan of all keys ever happens.
+"""
+
+import threading
+import time
+from datetime import datetime, timezone
+
+
+class _Entry:
+    __slots__ = ("key", "expires", "seen", "info", "slot")
+
+    def __init__(self, key):
+        self.key = key
+        self.expires = {}  # source -> monotonic expiry
+        self.seen = {}     # source -> wall-clock epoch of last touch
+        self.info = {}
+        self.slot = None
+
+
+class PresenceRegistry:
+    """Online state per key with per-source TTLs and time-wheel expiry"""
+
+    def __init__(self, ttl_seconds=120.0, resolution_seconds=1.0, max_ttl_seconds=None,
+                 threading_module=threading):
+        """
+        Args:
+            ttl_seconds: Default time a touch keeps a source online
+            resolution_seconds: Width of one wheel bucket
+            max_ttl_seconds: Wheel span (defaults to ttl_seconds); longer TTLs are
+                             re-bucketed when their bucket comes round
+            threading_module: Source of Lock()
+        """
+        self.ttl_seconds = ttl_seconds
+        self.resolution = resolution_seconds
+        self._size = int((max_ttl_seconds or ttl_seconds) / resolution_seconds) + 2
+        self._wheel = [set() for _ in range(self._size)]
+        self._cursor = int(time.monotonic() / resolution_seconds)
+        self._entries = {}
+        self._lock = threading_module.Lock()
+
+    # ---- writes -------------------------------------------------------
+
+    def touch(self, key, source, ttl=None, seen_at=None, **info):
+        """
+        Mark `key` online via `source` for `ttl` seconds and merge `info`.
+        `seen_at` (epoch seconds) back-dates the touch, e.g. when seeding from the DB.
+        """
+        if not key:
+            return
+        now = time.monotonic()
+        wall = time.time()
+        age = max(0.0, wall - seen_at) if seen_at else 0.0
+        expires = now + (self.ttl_seconds if ttl is None else ttl) - age
+        if expires <= now:
+            return
+        with self._lock:
+            self._advance(now)
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry(key)
+            entry.expires[source] = expires
+            entry.seen[source] = seen_at or wall
+            if info:
+                entry.info.update(info)
+            self._schedule(entry)
+
+    def drop(self, key, source=None):
+        """Remove one source (or the whole key) immediately, e.g. on clean disconnect"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            if source is None:
+                del self._entries[key]
+                return
+            entry.expires.pop(source, None)
+            if not entry.expires:
+                del self._entries[key]
+
+    # ---- reads --------------------------------------------------------
+
+    def is_online(self, key, source=None):
+        now = time.monotonic()
+        with self._lock:
+            self._advance(now)
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+            return self._online_via(entry, source, now)
+
+    def seconds_since(self, key, source=None):
+        """Seconds since the key (or one of its sources) was last seen; None if not tracked"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            seen = entry.seen.get(source) if source else max(entry.seen.values(), default=None)
+        return None if seen is None else max(0.0, time.time() - seen)
+
+    def last_seen(self, key):
+        """Last touch from any source as an aware UTC datetime, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            seen = max(entry.seen.values(), default=None) if entry else None
+        return datetime.fromtimestamp(seen, timezone.utc) if seen else None
+
+    def get(self, key):
+        """{key, last_seen, sources, info} for an online key, else None"""
+        now = time.monotonic()
+        with self._lock:
+            self._advance(now)
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            return self._describe(entry, now)
+
+    def online(self, source=None):
+        """Descriptions of every online key (optionally only those online via `source`), newest first"""
+        now = time.monotonic()
+        with self._lock:
+            self._advance(now)
+            entries = [
+                self._describe(entry, now) for entry in self._entries.values()
+                if self._online_via(entry, source, now)
+            ]
+        entries.sort(key=lambda item: item["last_seen"], reverse=True)
+        return entries
+
+    def count(self, source=None):
+        now = time.monotonic()
+        with self._lock:
+            self._advance(now)
+            return sum(1 for entry in self._entries.values() if self._online_via(entry, source, now))
+
+    def count_by_source(self):
+        now = time.monotonic()
+        counts = {}
+        with self._lock:
+            self._advance(now)
+            for entry in self._entries.values():
+                for source, expiry in entry.expires.items():
+                    if expiry > now:
+                        counts[source] = counts.get(source, 0) + 1
+        return counts
+
+    # ---- wheel --------------------------------------------------------
+
+    @staticmethod
+    def _online_via(entry, source, now):
+        # Exact check: the wheel may not have reached an entry that expired this second
+        if source is None:
+            return any(expiry > now for expiry in entry.expires.values())
+        return entry.expires.get(source, 0) > now
+
+    def _describe(self, entry, now):
+        seen = max(entry.seen.values(), default=0)
+        return {
+            "key": entry.key,
+            "last_seen": datetime.fromtimestamp(seen, timezone.utc),
+            "sources": sorted(source for source, expiry in entry.expires.items() if expiry > now),
+            "info": dict(entry.info)
+        }
+
+    def _schedule(self, entry):
+        slot = int(max(entry.expires.values()) / self.resolution) + 1
+        # Beyond the wheel span: park in the last bucket and re-bucket when it comes round
+        slot = min(slot, self._cursor + self._size - 1)
+        if entry.slot != slot:
+            entry.slot = slot
+            self._wheel[slot % self._size].add(entry.key)
+            # The old bucket keeps a stale reference; it is skipped because entry.slot moved
+
+    def _advance(self, now):
+        target = int(now / self.resolution)
+        if target - self._cursor > self._size:
+            # Idle for longer than the wheel span: one lap visits every bucket
+            self._cursor = target - self._size
+        while self._cursor < target:
+            self._cursor += 1
+            bucket = self._wheel[self._cursor % self._size]
+            if not bucket:
+                continue
+            self._wheel[self._cursor % self._size] = set()
+            for key in bucket:
+                entry = self._entries.get(key)
+                if entry is None or entry.slot is None or entry.slot > self._cursor:
+                    continue  # Gone, or a stale reference left behind by a re-bucket
+                for source in [s for s, expiry in entry.expires.items() if expiry <= now]:
+                    del entry.expires[source]
+                if entry.expires:
+                    entry.slot = None
+                    self._schedule(entry)
+                else:
+                    del self._entries[key]
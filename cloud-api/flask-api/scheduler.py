@@ -0,0 +1,212 @@
+"""
+Background Scheduler - Periodic maintenance jobs for the Flask API
+Only ONE worker runs jobs at a time: leadership is a Postgres advisory lock
+held on a dedicated connection, so it is released automatically if the
+leader process dies and another worker takes over on its next retry.
+Jobs that only touch process memory are registered with every_worker=True
+and run in every worker, leader or not.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+# App-wide key for pg_try_advisory_lock (any constant shared by all workers)
+SCHEDULER_LOCK_KEY = 727026
+
+
+class ScheduledJob:
+    """A job that runs every `interval` seconds while this worker is leader (or always, if every_worker)"""
+
+    def __init__(self, name, func, interval, every_worker=False):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.every_worker = every_worker
+        self.next_run = 0.0
+        self.last_run = None  # {started_at, duration_ms, rows, error}
+        self.total_runs = 0
+        self.total_rows = 0
+
+
+class LeaderScheduler:
+    """
+    In-process job scheduler with leader election.
+
+    Every worker starts one, but only the worker holding the advisory lock
+    executes jobs. Followers keep their lock connection open and retry the
+    lock every `leader_retry_seconds`.
+    """
+
+    def __init__(self, connect, record_run=None, tick_seconds=1.0,
+                 leader_retry_seconds=30.0, lock_key=SCHEDULER_LOCK_KEY):
+        """
+        Args:
+            connect: Callable returning a NEW dedicated DB connection (not pooled)
+            record_run: Optional callable(job_name, started_at, duration_ms, rows, error, worker_id)
+                        used to persist run history
+            tick_seconds: How often the loop checks for due jobs
+            leader_retry_seconds: How often a follower retries the leader lock
+            lock_key: Advisory lock key shared by all workers
+        """
+        self._connect = connect
+        self._record_run = record_run
+        self.tick_seconds = tick_seconds
+        self.leader_retry_seconds = leader_retry_seconds
+        self.lock_key = lock_key
+
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.is_leader = False
+        self.leader_since = None
+        self._lock_conn = None
+        self._next_leader_check = 0.0
+
+        self._jobs = {}
+        self._run_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def add_job(self, name, func, interval_seconds, every_worker=False):
+        """
+        Register a job. `func` returns the number of rows it touched.
+        every_worker: run in this process even when it is not the leader (process-local
+                      state); such runs are not persisted through record_run
+        """
+        self._jobs[name] = ScheduledJob(name, func, interval_seconds, every_worker)
+
+    def start(self):
+        """Start the scheduler thread (idempotent)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run_loop, name="scheduler", daemon=True)
+        self._thread.start()
+        logger.info(f"⏱️ Scheduler started on {self.worker_id} ({len(self._jobs)} jobs)")
+
+    def stop(self):
+        """Stop the scheduler thread and release leadership"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self._release_lock()
+
+    def _release_lock(self):
+        if self._lock_conn is not None:
+            try:
+                self._lock_conn.close()  # Closing the session releases the advisory lock
+            except Exception:
+                pass
+        self._lock_conn = None
+        if self.is_leader:
+            logger.warning(f"⏱️ Scheduler leadership released by {self.worker_id}")
+        self.is_leader = False
+        self.leader_since = None
+
+    def _ensure_leadership(self) -> bool:
+        """Confirm we still hold the lock, or try to acquire it when due"""
+        now = time.monotonic()
+
+        if self.is_leader:
+            try:
+                with self._lock_conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                return True
+            except Exception as e:
+                logger.error(f"⏱️ Scheduler lock connection lost: {e}")
+                self._release_lock()
+                self._next_leader_check = now  # Retry immediately with a fresh connection
+
+        if now < self._next_leader_check:
+            return False
+        self._next_leader_check = now + self.leader_retry_seconds
+
+        try:
+            if self._lock_conn is None or self._lock_conn.closed:
+                self._lock_conn = self._connect()
+                self._lock_conn.autocommit = True
+            with self._lock_conn.cursor() as cursor:
+                cursor.execute("SELECT pg_try_advisory_lock(%s)", (self.lock_key,))
+                acquired = cursor.fetchone()[0]
+            if acquired:
+                self.is_leader = True
+                self.leader_since = datetime.now(timezone.utc)
+                logger.info(f"👑 Scheduler leadership acquired by {self.worker_id}")
+            return acquired
+        except Exception as e:
+            logger.error(f"⏱️ Scheduler leader election error: {e}")
+            self._release_lock()
+            return False
+
+    def _run_loop(self):
+        while not self._stop_event.is_set():
+            try:
+                leader = self._ensure_leadership()
+                now = time.monotonic()
+                for job in list(self._jobs.values()):
+                    if self._stop_event.is_set():
+                        break
+                    if (leader or job.every_worker) and now >= job.next_run:
+                        self.run_job(job.name)
+            except Exception as e:
+                logger.error(f"⏱️ Scheduler loop error: {e}")
+            self._stop_event.wait(self.tick_seconds)
+        self._release_lock()
+
+    def run_job(self, name) -> dict:
+        """Run a job now and record its outcome. Returns the run summary."""
+        job = self._jobs[name]
+        with self._run_lock:
+            started_at = datetime.now(timezone.utc)
+            start = time.perf_counter()
+            rows = 0
+            error = None
+            try:
+                rows = job.func() or 0
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                logger.error(f"⏱️ Job {name} failed: {error}")
+            duration_ms = round((time.perf_counter() - start) * 1000, 2)
+
+            job.next_run = time.monotonic() + job.interval
+            job.total_runs += 1
+            job.total_rows += rows
+            job.last_run = {
+                "started_at": started_at.isoformat(),
+                "duration_ms": duration_ms,
+                "rows": rows,
+                "error": error
+            }
+
+        if rows or error:
+            logger.info(f"⏱️ Job {name}: {rows} rows in {duration_ms}ms" + (f" (error: {error})" if error else ""))
+
+        if self._record_run and not job.every_worker:
+            try:
+                self._record_run(name, started_at, duration_ms, rows, error, self.worker_id)
+            except Exception as e:
+                logger.error(f"⏱️ Failed to record run for {name}: {e}")
+
+        return job.last_run
+
+    def status(self) -> dict:
+        """Scheduler state of THIS worker, for the admin endpoint"""
+        return {
+            "worker_id": self.worker_id,
+            "is_leader": self.is_leader,
+            "leader_since": self.leader_since.isoformat() if self.leader_since else None,
+            "running": bool(self._thread and self._thread.is_alive()),
+            "jobs": {
+                job.name: {
+                    "interval_seconds": job.interval,
+                    "total_runs": job.total_runs,
+                    "total_rows": job.total_rows,
+                    "last_run": job.last_run
+                }
+                for job in self._jobs.values()
+            }
+        }
@@ -0,0 +1,128 @@
+"""
+Socket.IO Fan-out Harness - Local multi-process check of the message queue
+Starts N Socket.IO server processes configured exactly like app.py (via
+socketio_queue), connects one client to each process in the same room, emits
+from process 0 and reports which clients received it.
+
+Usage:
+    # Needs a local Redis-protocol server (redis-server, valkey, keydb ...)
+    python socketio_fanout_harness.py --queue redis://localhost:6379/0 --workers 3
+
+    # Baseline: in-memory backend, only the client on process 0 should receive
+    python socketio_fanout_harness.py --queue memory --workers 3
+"""
+
+import argparse
+import json
+import multiprocessing
+import sys
+import threading
+import time
+import urllib.request
+
+from socketio_queue import describe, message_queue_url, socketio_options
+
+
+def _run_server(port, queue_url):
+    """One server process: room subscribe + an HTTP hook to emit into a room"""
+    from flask import Flask, request, jsonify
+    from flask_socketio import SocketIO, join_room
+
+    app = Flask(__name__)
+    socketio = SocketIO(app, async_mode='threading', cors_allowed_origins="*", **socketio_options(queue_url))
+
+    @socketio.on('subscribe')
+    def handle_subscribe(data):
+        join_room(data['room'])
+        return {'port': port}
+
+    @app.route('/emit', methods=['POST'])
+    def emit_to_room():
+        data = request.get_json()
+        socketio.emit(data['event'], data['payload'], to=data['room'])
+        return jsonify({"status": "ok"})
+
+    @app.route('/ready')
+    def ready():
+        return "ok"
+
+    socketio.run(app, host='127.0.0.1', port=port, allow_unsafe_werkzeug=True, log_output=False)
+
+
+def _wait_ready(port, timeout=15.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/ready", timeout=1)
+            return True
+        except Exception:
+            time.sleep(0.2)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--queue', default='memory', help="Message queue URL, or 'memory'")
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--base-port', type=int, default=5601)
+    parser.add_argument('--room', default='ES')
+    parser.add_argument('--timeout', type=float, default=5.0, help="Seconds to wait for delivery")
+    args = parser.parse_args()
+
+    import socketio as socketio_client
+
+    ports = [args.base_port + i for i in range(args.workers)]
+    servers = [multiprocessing.Process(target=_run_server, args=(port, args.queue), daemon=True) for port in ports]
+    for server in servers:
+        server.start()
+
+    try:
+        for port in ports:
+            if not _wait_ready(port):
+                print(f"❌ Server on port {port} did not start")
+                return 2
+
+        received = {port: threading.Event() for port in ports}
+        clients = []
+        for port in ports:
+            client = socketio_client.Client()
+            client.on('fanout_check', lambda data, port=port: received[port].set())
+            client.connect(f"http://127.0.0.1:{port}", transports=['polling'])
+            client.call('subscribe', {'room': args.room})
+            clients.append(client)
+
+        start = time.perf_counter()
+        request = urllib.request.Request(
+            f"http://127.0.0.1:{ports[0]}/emit",
+            data=json.dumps({"event": "fanout_check", "room": args.room, "payload": {"sent_at": time.time()}}).encode(),
+            headers={"Content-Type": "application/json"}
+        )
+        urllib.request.urlopen(request, timeout=5)
+
+        deadline = time.time() + args.timeout
+        for port in ports:
+            received[port].wait(max(0.0, deadline - time.time()))
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        print(f"Backend: {describe(args.queue)}  workers: {args.workers}  room: {args.room}")
+        for port in ports:
+            print(f"  worker :{port}  {'✅ received' if received[port].is_set() else '❌ missed'}")
+        print(f"  elapsed: {elapsed_ms:.1f}ms")
+
+        for client in clients:
+            client.disconnect()
+
+        delivered = sum(1 for event in received.values() if event.is_set())
+        expected = args.workers if message_queue_url(args.queue) else 1
+        if delivered == expected:
+            print(f"✅ {delivered}/{args.workers} delivered (expected {expected})")
+            return 0
+        print(f"❌ {delivered}/{args.workers} delivered (expected {expected})")
+        return 1
+    finally:
+        for server in servers:
+            server.terminate()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
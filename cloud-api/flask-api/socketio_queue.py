@@ -0,0 +1,44 @@
+"""
+Socket.IO Message Queue - Cross-process fan-out configuration
+Without a queue, emits only reach sockets connected to the emitting process.
+With SOCKETIO_MESSAGE_QUEUE set (redis://, rediss://, amqp://, kafka:// ...)
+every worker publishes emits to the queue and delivers the ones for rooms
+it hosts, so any worker can reach any socket.
+"""
+
+import os
+
+DEFAULT_CHANNEL = "quotrading-socketio"
+
+
+def message_queue_url(url=None):
+    """Queue URL from the argument or SOCKETIO_MESSAGE_QUEUE; None means in-memory"""
+    if url is None:
+        url = os.environ.get("SOCKETIO_MESSAGE_QUEUE", "")
+    url = url.strip()
+    if not url or url.lower() in ("memory", "none"):
+        return None
+    return url
+
+
+def socketio_options(url=None, channel=None):
+    """
+    Keyword arguments for flask_socketio.SocketIO selecting the backend.
+    All processes that should share rooms must use the same URL and channel.
+    """
+    url = message_queue_url(url)
+    if url is None:
+        return {}
+    return {
+        "message_queue": url,
+        "channel": channel or os.environ.get("SOCKETIO_CHANNEL", DEFAULT_CHANNEL)
+    }
+
+
+def describe(url=None):
+    """Backend description for logs and admin endpoints (credentials stripped)"""
+    url = message_queue_url(url)
+    if url is None:
+        return "memory"
+    scheme, _, rest = url.partition("://")
+    return f"{scheme}://{rest.rsplit('@', 1)[-1]}"
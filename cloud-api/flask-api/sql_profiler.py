@@ -0,0 +1,222 @@
+"""
+SQL Profiler - Per-statement timing aggregated by query fingerprint
+Cursor classes produced here time every execute(), normalize the SQL to a
+fingerprint (literals and parameters become ?), and aggregate count, total,
+p95, max and rows per fingerprint. Statements slower than the threshold get
+their EXPLAIN plan captured (inside a savepoint, so a failed EXPLAIN can
+never abort the caller's transaction).
+"""
+
+import logging
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from functools import lru_cache
+
+from psycopg2 import extensions
+
+logger = logging.getLogger(__name__)
+
+_COMMENT_RE = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_PARAM_RE = re.compile(r"%\(\w+\)s|%s")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE_RE = re.compile(r"\s+")
+
+# Only these are worth (and safe) to EXPLAIN
+_EXPLAINABLE = ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT")
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(sql):
+    """Normalize a statement so calls differing only in values share one entry"""
+    text = _COMMENT_RE.sub(" ", sql)
+    text = _STRING_RE.sub("?", text)
+    text = _PARAM_RE.sub("?", text)
+    text = _NUMBER_RE.sub("?", text)
+    text = _IN_LIST_RE.sub("(?...)", text)
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+class QueryStats:
+    """Aggregate for one fingerprint"""
+
+    def __init__(self, fingerprint, sample_size):
+        self.fingerprint = fingerprint
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.samples = deque(maxlen=sample_size)
+        self.plan = None
+        self.plan_ms = None
+        self.plan_captured_at = None
+        self._plan_monotonic = None
+
+    def to_dict(self, include_plan=True):
+        ordered = sorted(self.samples)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] if ordered else 0.0
+        result = {
+            "fingerprint": self.fingerprint,
+            "count": self.count,
+            "errors": self.errors,
+            "total_ms": round(self.total_ms, 2),
+            "avg_ms": round(self.total_ms / self.count, 2) if self.count else 0.0,
+            "p95_ms": round(p95, 2),
+            "max_ms": round(self.max_ms, 2),
+            "rows": self.rows,
+            "avg_rows": round(self.rows / self.count, 1) if self.count else 0.0
+        }
+        if include_plan:
+            result["slow_plan"] = self.plan
+            result["slow_plan_ms"] = self.plan_ms
+            result["slow_plan_captured_at"] = self.plan_captured_at
+        return result
+
+
+class SQLProfiler:
+    """Collects QueryStats; hand `profiled(cursor_class)` to psycopg2 as cursor_factory"""
+
+    def __init__(self, slow_ms=250.0, explain=True, explain_interval_seconds=600,
+                 sample_size=256, max_fingerprints=1000, enabled=True, threading_module=threading):
+        """
+        Args:
+            slow_ms: Statements slower than this get an EXPLAIN captured
+            explain: Set False to time only
+            explain_interval_seconds: Minimum gap between plan captures per fingerprint
+            sample_size: Recent durations kept per fingerprint for p95
+            max_fingerprints: New fingerprints beyond this are folded into "<other>"
+            enabled: Master switch (cursors still work, nothing is recorded)
+            threading_module: Source of Lock(); pass the unpatched module under eventlet
+        """
+        self.slow_ms = slow_ms
+        self.explain = explain
+        self.explain_interval_seconds = explain_interval_seconds
+        self.sample_size = sample_size
+        self.max_fingerprints = max_fingerprints
+        self.enabled = enabled
+        self._stats = {}
+        self._lock = threading_module.Lock()
+        self._cursor_classes = {}
+        self.started_at = datetime.now(timezone.utc)
+
+    def profiled(self, base=extensions.cursor):
+        """Cursor subclass of `base` that reports to this profiler (cached per base)"""
+        cls = self._cursor_classes.get(base)
+        if cls is None:
+            profiler = self
+
+            class ProfilingCursor(base):
+                def execute(self, query, vars=None):
+                    if not profiler.enabled:
+                        return super().execute(query, vars)
+                    if hasattr(query, "as_string"):
+                        query = query.as_string(self)  # psycopg2.sql.Composed
+                    start = time.perf_counter()
+                    try:
+                        result = super().execute(query, vars)
+                    except Exception:
+                        profiler.record(query, (time.perf_counter() - start) * 1000, 0, error=True)
+                        raise
+                    elapsed_ms = (time.perf_counter() - start) * 1000
+                    profiler.record(query, elapsed_ms, max(self.rowcount, 0))
+                    if elapsed_ms >= profiler.slow_ms:
+                        profiler.capture_plan(self.connection, query, vars, elapsed_ms)
+                    return result
+
+                def executemany(self, query, vars_list):
+                    if not profiler.enabled:
+                        return super().executemany(query, vars_list)
+                    start = time.perf_counter()
+                    try:
+                        result = super().executemany(query, vars_list)
+                    except Exception:
+                        profiler.record(query, (time.perf_counter() - start) * 1000, 0, error=True)
+                        raise
+                    profiler.record(query, (time.perf_counter() - start) * 1000, max(self.rowcount, 0))
+                    return result
+
+            ProfilingCursor.__name__ = f"Profiling{base.__name__}"
+            cls = self._cursor_classes[base] = ProfilingCursor
+        return cls
+
+    def _stats_for(self, key):
+        stats = self._stats.get(key)
+        if stats is None:
+            if len(self._stats) >= self.max_fingerprints:
+                key = "<other>"
+                stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = QueryStats(key, self.sample_size)
+        return stats
+
+    def record(self, query, elapsed_ms, rows, error=False):
+        if isinstance(query, bytes):
+            query = query.decode("utf-8", "replace")
+        elif not isinstance(query, str):
+            query = str(query)
+        key = fingerprint(query)
+        with self._lock:
+            stats = self._stats_for(key)
+            stats.count += 1
+            stats.total_ms += elapsed_ms
+            stats.rows += rows
+            stats.samples.append(elapsed_ms)
+            if elapsed_ms > stats.max_ms:
+                stats.max_ms = elapsed_ms
+            if error:
+                stats.errors += 1
+
+    def capture_plan(self, conn, query, vars, elapsed_ms):
+        """EXPLAIN a slow statement on the same connection, at most once per interval"""
+        if not self.explain or not isinstance(query, str):
+            return
+        if not query.lstrip().upper().startswith(_EXPLAINABLE):
+            return
+        key = fingerprint(query)
+        now = time.monotonic()
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None or (stats._plan_monotonic and now - stats._plan_monotonic < self.explain_interval_seconds):
+                return
+            stats._plan_monotonic = now  # Claim before the round trip so concurrent slow calls skip
+
+        in_transaction = not conn.autocommit
+        try:
+            # Plain cursor class: EXPLAIN itself must not be profiled
+            with conn.cursor(cursor_factory=extensions.cursor) as cursor:
+                if in_transaction:
+                    cursor.execute("SAVEPOINT sql_profiler_explain")
+                try:
+                    cursor.execute("EXPLAIN " + query, vars)
+                    plan = "\n".join(row[0] for row in cursor.fetchall())
+                finally:
+                    if in_transaction:
+                        cursor.execute("ROLLBACK TO SAVEPOINT sql_profiler_explain")
+                        cursor.execute("RELEASE SAVEPOINT sql_profiler_explain")
+        except Exception as e:
+            plan = f"EXPLAIN failed: {type(e).__name__}: {e}"
+
+        with self._lock:
+            stats.plan = plan
+            stats.plan_ms = round(elapsed_ms, 2)
+            stats.plan_captured_at = datetime.now(timezone.utc).isoformat()
+        logger.warning(f"🐢 Slow query ({elapsed_ms:.0f}ms): {key[:200]}")
+
+    def report(self, sort="total_ms", limit=50, include_plans=True):
+        """Aggregates sorted descending by `sort` (total_ms, p95_ms, max_ms, count, rows, avg_ms)"""
+        with self._lock:
+            rows = [stats.to_dict(include_plans) for stats in self._stats.values()]
+        if sort not in ("total_ms", "p95_ms", "max_ms", "count", "rows", "avg_ms", "errors"):
+            sort = "total_ms"
+        rows.sort(key=lambda row: row[sort], reverse=True)
+        return rows[:limit]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+        self.started_at = datetime.now(timezone.utc)
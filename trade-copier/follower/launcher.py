@@ -19,31 +19,13 @@ import requests
 # Add parent to path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-import hashlib
-import getpass
-import uuid
-import platform
+from shared.device import get_device_fingerprint
 
 # ========================================
 # CONFIGURATION
 # ========================================
 CLOUD_API_BASE_URL = os.getenv("QUOTRADING_API_URL", "https://quotrading-flask-api.azurewebsites.net")
 
-
-def get_device_fingerprint() -> str:
-    """Generate unique device fingerprint for session locking."""
-    try:
-        machine_id = str(uuid.getnode())
-    except:
-        machine_id = "unknown"
-    try:
-        username = getpass.getuser()
-    except:
-        username = "unknown"
-    platform_name = platform.system()
-    fingerprint_raw = f"{machine_id}:{username}:{platform_name}"
-    return hashlib.sha256(fingerprint_raw.encode()).hexdigest()[:16]
-
 # Try to import TopStep SDK
 try:
     from project_x_py import ProjectX, ProjectXConfig
@@ -326,6 +308,8 @@ class TradeCopierLauncher:
                 
                 if resp.status_code == 200:
                     data = resp.json()
+                    # Lets the signal receiver adopt this session claim (saved with the config)
+                    self.config["session_token"] = data.get("session_token")
                     if not data.get("license_valid"):
                         err = data.get("message", "Invalid license key")
                         self.root.after(0, self.hide_loading)
@@ -381,6 +365,7 @@ class TradeCopierLauncher:
                         "device_fingerprint": get_device_fingerprint(),
                         "symbol": "COPIER",
                         "status": "online",
+                        "session_token": self.config.get("session_token"),
                         "metadata": {"client": "copier_launcher"}
                     },
                     timeout=10
@@ -30,6 +30,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from shared.signal_protocol import TradeSignal
 from shared.copier_broker import CopierBroker
+from shared.device import get_device_fingerprint
 
 logger = logging.getLogger(__name__)
 
@@ -420,12 +421,9 @@ async def main():
     _session_info["follower_key"] = follower_key
     _session_info["start_time"] = datetime.now()
     
-    # Generate device fingerprint for duplicate session detection
-    import hashlib
-    import uuid
-    import platform
-    device_info = f"{uuid.getnode()}-{platform.node()}-{platform.system()}"
-    device_fingerprint = hashlib.sha256(device_info.encode()).hexdigest()[:32]
+    # Same device fingerprint the launcher validated the license with
+    device_fingerprint = get_device_fingerprint()
+    session_token = config.get('session_token')
     _session_info["device_fingerprint"] = device_fingerprint
     
     # Connect to broker for trade execution (silently)
@@ -661,6 +659,7 @@ async def main():
                                     "device_fingerprint": device_fingerprint,
                                     "symbol": "COPIER",
                                     "status": "online",
+                                    "session_token": session_token,
                                     "metadata": {"client": "copier_signal_receiver"}
                                 },
                                 timeout=5
@@ -1,109 +1,226 @@
 """
-Master Dashboard - Flask web UI for the Master system
+Master Dashboard - Web UI for the Master system, served from the master's own event loop
 Shows connected followers, positions, and signal controls
-Runs at localhost:3000
+Runs at localhost:3000; status, follower and signal changes are pushed to the
+browser over Server-Sent Events (/api/events), and controls such as the
+emergency flatten run directly on the loop that owns the broadcaster.
 """
 
-from flask import Flask, render_template, jsonify, request
+import asyncio
+import json
 import logging
 import os
+import sys
 
-logger = logging.getLogger(__name__)
-
-app = Flask(__name__)
-
-# Global state (set by main.py when starting)
-master_state = {
-    "broadcaster": None,
-    "broker": None,
-    "copy_enabled": True,
-    "connected_followers": [],
-    "signal_history": [],
-    "positions": {}
-}
-
-
-def set_master_state(broadcaster, broker):
-    """Called by main.py to set the broadcaster and broker instances"""
-    master_state["broadcaster"] = broadcaster
-    master_state["broker"] = broker
-
-
-@app.route('/')
-def index():
-    """Main dashboard page"""
-    return render_template('index.html')
-
-
-@app.route('/api/status')
-def get_status():
-    """Get current master status"""
-    broadcaster = master_state["broadcaster"]
-    broker = master_state["broker"]
-    
-    status = {
-        "copy_enabled": master_state["copy_enabled"],
-        "connected": broker.connected if broker else False,
-        "account_balance": broker.account_balance if broker else 0,
-        "positions": broker.positions if broker else {},
-        "followers": [],
-        "total_signals": 0
-    }
-    
-    if broadcaster:
-        bcast_status = broadcaster.get_status()
-        status["followers"] = bcast_status["followers"]
-        status["total_signals"] = bcast_status["total_signals_sent"]
-    
-    return jsonify(status)
-
-
-@app.route('/api/followers')
-def get_followers():
-    """Get list of connected followers"""
-    broadcaster = master_state["broadcaster"]
-    if broadcaster:
-        return jsonify({"followers": broadcaster.get_status()["followers"]})
-    return jsonify({"followers": []})
-
-
-@app.route('/api/toggle_copy', methods=['POST'])
-def toggle_copy():
-    """Toggle copy on/off globally"""
-    master_state["copy_enabled"] = not master_state["copy_enabled"]
-    status = "ENABLED" if master_state["copy_enabled"] else "DISABLED"
-    logger.info(f"📋 Copy {status}")
-    return jsonify({"copy_enabled": master_state["copy_enabled"]})
-
-
-@app.route('/api/flatten_all', methods=['POST'])
-def flatten_all():
-    """Emergency flatten all positions"""
-    broadcaster = master_state["broadcaster"]
-    broker = master_state["broker"]
-    
-    if broker and broadcaster:
-        # Flatten master first
-        # Then broadcast flatten to all followers
-        import asyncio
-        asyncio.run(broadcaster.broadcast_flatten("ALL"))
-        logger.warning("🚨 FLATTEN ALL sent to all followers")
-        return jsonify({"status": "flatten_sent"})
-    
-    return jsonify({"error": "Not connected"}), 400
+from aiohttp import web
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-@app.route('/api/signal_history')
-def get_signal_history():
-    """Get recent signal history"""
-    broadcaster = master_state["broadcaster"]
-    if broadcaster:
-        history = [s.to_dict() for s in broadcaster.signal_history[-50:]]
-        return jsonify({"signals": history})
-    return jsonify({"signals": []})
+from shared.signal_protocol import create_flatten_signal
 
+logger = logging.getLogger(__name__)
 
-def run_dashboard(port: int = 3000):
-    """Start the dashboard server"""
-    logger.info(f"🖥️  Master Dashboard starting at http://localhost:{port}")
-    app.run(host='127.0.0.1', port=port, debug=False, use_reloader=False)
+TEMPLATE_PATH = os.path.join(os.path.dirname(__file__), 'templates', 'index.html')
+
+
+def _chain(first, second):
+    """Run an existing callback and ours (broadcaster callbacks are single slots)"""
+    if first is None:
+        return second
+
+    def both(*args):
+        first(*args)
+        second(*args)
+    return both
+
+
+class MasterDashboard:
+    """aiohttp.web dashboard living on the master's asyncio loop"""
+
+    def __init__(self, broadcaster, broker, get_copy_enabled, set_copy_enabled,
+                 port: int = 3000, status_interval: float = 1.0):
+        """
+        Args:
+            broadcaster: Started SignalBroadcaster (same loop)
+            broker: Connected CopierBroker
+            get_copy_enabled / set_copy_enabled: Global copy toggle accessors
+            port: Local port (bound to 127.0.0.1)
+            status_interval: How often status is recomputed; it is only pushed when it changed
+        """
+        self.broadcaster = broadcaster
+        self.broker = broker
+        self.get_copy_enabled = get_copy_enabled
+        self.set_copy_enabled = set_copy_enabled
+        self.port = port
+        self.status_interval = status_interval
+        self._clients = set()  # One asyncio.Queue per open event stream
+        self._last_status = None
+        self._runner = None
+        self._status_task = None
+
+        self.app = web.Application()
+        self.app.add_routes([
+            web.get('/', self.index),
+            web.get('/api/status', self.get_status),
+            web.get('/api/followers', self.get_followers),
+            web.post('/api/toggle_copy', self.toggle_copy),
+            web.post('/api/flatten_all', self.flatten_all),
+            web.get('/api/signal_history', self.get_signal_history),
+            web.get('/api/signal_journal', self.search_signal_journal),
+            web.get('/api/events', self.events),
+        ])
+
+        broadcaster.on_followers = _chain(broadcaster.on_followers, lambda followers: self._push_status())
+        broadcaster.on_sent = _chain(broadcaster.on_sent, self._on_sent)
+
+    async def start(self):
+        """Start serving (call from the master's running loop)"""
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, '127.0.0.1', self.port).start()
+        self._status_task = asyncio.create_task(self._status_loop())
+        logger.info(f"🖥️  Master Dashboard running at http://localhost:{self.port}")
+
+    async def stop(self):
+        if self._status_task:
+            self._status_task.cancel()
+        for queue in list(self._clients):
+            queue.put_nowait(None)
+        if self._runner:
+            await self._runner.cleanup()
+
+    # ---- state --------------------------------------------------------
+
+    def status(self) -> dict:
+        """Current master status (all in memory, no network)"""
+        broker = self.broker
+        status = {
+            "copy_enabled": self.get_copy_enabled(),
+            "connected": broker.connected if broker else False,
+            "realtime": getattr(broker, 'realtime_connected', False),
+            "account_balance": broker.account_balance if broker else 0,
+            "positions": broker.position_snapshot() if broker else [],
+            "followers": [],
+            "total_signals": 0
+        }
+        if self.broadcaster:
+            bcast_status = self.broadcaster.get_status()
+            status["followers"] = bcast_status["followers"]
+            status["total_signals"] = bcast_status["total_signals_sent"]
+            status["channel_connected"] = bcast_status["channel_connected"]
+        return status
+
+    def publish(self, event: str, data):
+        """Push an event to every open browser stream; slow streams drop events rather than grow"""
+        for queue in self._clients:
+            try:
+                queue.put_nowait((event, data))
+            except asyncio.QueueFull:
+                pass
+
+    def _push_status(self):
+        status = self.status()
+        if status != self._last_status:
+            self._last_status = status
+            self.publish('status', status)
+
+    def _on_sent(self, signal: dict, count):
+        self.publish('signal', dict(signal, followers=count, delivered=count is not None))
+        self._push_status()
+
+    async def _status_loop(self):
+        # Balance/positions/connection change outside broadcaster callbacks; diff them cheaply here
+        while True:
+            await asyncio.sleep(self.status_interval)
+            if self._clients:
+                try:
+                    self._push_status()
+                except Exception as e:
+                    logger.error(f"Dashboard status error: {e}")
+
+    # ---- routes -------------------------------------------------------
+
+    async def index(self, request):
+        """Main dashboard page"""
+        return web.FileResponse(TEMPLATE_PATH)
+
+    async def get_status(self, request):
+        """Get current master status"""
+        return web.json_response(self.status())
+
+    async def get_followers(self, request):
+        """Get list of connected followers"""
+        return web.json_response({"followers": self.broadcaster.get_status()["followers"]})
+
+    async def toggle_copy(self, request):
+        """Toggle copy on/off globally"""
+        self.set_copy_enabled(not self.get_copy_enabled())
+        status = "ENABLED" if self.get_copy_enabled() else "DISABLED"
+        logger.info(f"📋 Copy {status}")
+        self._push_status()
+        return web.json_response({"copy_enabled": self.get_copy_enabled()})
+
+    async def flatten_all(self, request):
+        """Emergency flatten all positions - supersedes every pending signal and goes out at once"""
+        if not self.broker or not self.broker.connected or not self.broadcaster.broadcasting:
+            return web.json_response({"error": "Not connected"}, status=400)
+        signal = create_flatten_signal("ALL")
+        self.broadcaster.enqueue(signal, urgent=True)
+        logger.warning("🚨 FLATTEN ALL sent to all followers")
+        return web.json_response({"status": "flatten_sent", "signal_id": signal.signal_id})
+
+    async def get_signal_history(self, request):
+        """Get recent signal history"""
+        return web.json_response({"signals": list(self.broadcaster.signal_history)[-50:]})
+
+    async def search_signal_journal(self, request):
+        """Search the on-disk signal journal by signal_id and/or time range (ISO since/until)"""
+        journal = self.broadcaster.journal
+        if not journal:
+            return web.json_response({"entries": []})
+        try:
+            limit = min(int(request.query.get('limit', 200)), 5000)
+        except ValueError as e:
+            return web.json_response({"error": str(e)}, status=400)
+        # File scan runs in a worker thread so the loop keeps dispatching positions
+        try:
+            entries = await asyncio.get_running_loop().run_in_executor(None, lambda: journal.search(
+                signal_id=request.query.get('signal_id'),
+                since=request.query.get('since'),
+                until=request.query.get('until'),
+                limit=limit
+            ))
+        except ValueError as e:
+            return web.json_response({"error": str(e)}, status=400)
+        return web.json_response({"entries": entries})
+
+    async def events(self, request):
+        """Server-Sent Events stream: 'status' and 'signal' events"""
+        response = web.StreamResponse(headers={
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+        await response.prepare(request)
+        queue = asyncio.Queue(maxsize=256)
+        self._clients.add(queue)
+        try:
+            await self._write_event(response, 'status', self.status())
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    await response.write(b': keep-alive\n\n')
+                    continue
+                if item is None:
+                    break
+                await self._write_event(response, *item)
+        except (ConnectionResetError, asyncio.CancelledError):
+            pass
+        finally:
+            self._clients.discard(queue)
+        return response
+
+    @staticmethod
+    async def _write_event(response, event: str, data):
+        await response.write(f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n".encode('utf-8'))
@@ -54,14 +54,22 @@ class MasterLauncher:
         
         # State
         self.running = False
-        self.followers = []
+        self.followers = {}  # client_id -> latest follower dict (keyed model behind the table)
+        self.follower_rows = {}  # client_id -> (values, tag) currently shown in the table
+        self._pending_followers = {}  # Deltas waiting for the Tk thread: client_id -> dict, or None = removed
+        self._pending_reset = False
+        self._follower_flush_scheduled = False
+        self._follower_lock = threading.Lock()
+        self._age_job = None
         self.trade_log = []
         self.copy_enabled = True  # Global toggle for signal broadcasting
         
         # Broker/Position tracking for auto-broadcast
         self.broker = None
+        self.broadcaster = None  # SignalBroadcaster living on the broker thread's event loop
         self.broker_connected = False
-        self.last_position = None  # Track position to detect changes
+        self.position_diff = None  # PositionDiffEngine: signed qty per symbol, set once the broker connects
+        self.fill_coalescer = None
         self.position_monitor_running = False
         
         # Load config
@@ -488,6 +496,13 @@ class MasterLauncher:
         self.users_tree.tag_configure('short_position', background='#fce8e6')
         self.users_tree.tag_configure('copy_off', background='#fff3e0')  # Orange tint for copy disabled
         
+        # Rows are keyed by client_id and patched in place (see apply_follower_changes)
+        self.follower_rows = {}
+        self._render_follower_rows(set(self.followers))
+        if self._age_job:
+            self.root.after_cancel(self._age_job)
+        self._age_job = self.root.after(5000, self._age_followers)
+        
         # ═══════════════════════════════════════════════════════════════════
         # FOOTER - Status bar
         # ═══════════════════════════════════════════════════════════════════
@@ -502,7 +517,7 @@ class MasterLauncher:
         self.status_label.pack(side=tk.LEFT, padx=20, pady=8)
         
         self.connection_label = tk.Label(footer, 
-            text="📡 Signals ON | Ultra-fast monitoring (100ms)",
+            text="📡 Signals ON | Realtime position events",
             font=("Segoe UI", 9),
             bg=self.colors['grid_header'], fg=self.colors['text_light'])
         self.connection_label.pack(side=tk.RIGHT, padx=20, pady=8)
@@ -548,20 +563,23 @@ class MasterLauncher:
         try:
             if hasattr(self, 'connection_label'):
                 if self.copy_enabled:
-                    self.connection_label.config(text="📡 Signals ON | Ultra-fast monitoring (100ms)")
+                    self.connection_label.config(text="📡 Signals ON | Realtime position events")
                 else:
                     self.connection_label.config(text="⛔ Signals OFF | Solo trading mode")
         except:
             pass
     
     def start_polling(self):
-        """Start background thread to poll for followers - FAST for real-time monitoring"""
+        """Start background thread to poll for followers - only while the publisher channel is down"""
         def poll():
             while True:
-                try:
-                    self.refresh_followers()
-                except:
-                    pass
+                # Follower changes are pushed over /copier-master once the broadcaster is connected
+                # (queue_follower_changes); silent followers age out of ONLINE in _age_followers
+                if not (self.broadcaster and self.broadcaster.channel_connected):
+                    try:
+                        self.refresh_followers()
+                    except:
+                        pass
                 time.sleep(2)  # Poll every 2 seconds for near real-time updates
         
         thread = threading.Thread(target=poll, daemon=True)
@@ -601,99 +619,156 @@ class MasterLauncher:
             return False
     
     def update_followers_ui(self, followers):
-        """Update the followers display - ONLINE ONLY in spreadsheet format"""
+        """Show a full follower list (HTTP poll) - diffed against the model, only changed rows are touched"""
+        self.apply_follower_changes(followers, [], reset=True)
+    
+    def queue_follower_changes(self, upserted, removed, reset):
+        """
+        Broadcaster callback (broker thread): merge pushed deltas and hand them to the
+        Tk thread in one batch, so a burst of heartbeats costs a single UI pass
+        """
+        with self._follower_lock:
+            if reset:
+                self._pending_reset = True
+                self._pending_followers = {}
+            for f in upserted:
+                self._pending_followers[f['client_id']] = f
+            for client_id in removed:
+                self._pending_followers[client_id] = None
+            if self._follower_flush_scheduled:
+                return
+            self._follower_flush_scheduled = True
+        self.root.after(50, self._flush_follower_changes)
+    
+    def _flush_follower_changes(self):
+        with self._follower_lock:
+            pending, self._pending_followers = self._pending_followers, {}
+            reset, self._pending_reset = self._pending_reset, False
+            self._follower_flush_scheduled = False
+        upserted = [f for f in pending.values() if f is not None]
+        removed = [client_id for client_id, f in pending.items() if f is None]
+        self.apply_follower_changes(upserted, removed, reset)
+    
+    def apply_follower_changes(self, upserted, removed, reset=False):
+        """Apply follower inserts/updates/removes to the keyed model and patch only the affected rows"""
+        if reset:
+            keep = {f['client_id'] for f in upserted}
+            removed = list(removed) + [client_id for client_id in self.followers if client_id not in keep]
+        changed = set()
+        for client_id in removed:
+            if self.followers.pop(client_id, None) is not None:
+                changed.add(client_id)
+        for f in upserted:
+            client_id = f.get('client_id')
+            if client_id:
+                self.followers[client_id] = f
+                changed.add(client_id)
+        self._render_follower_rows(changed)
+    
+    def _age_followers(self):
+        """Every 5s: drop followers whose heartbeat went stale (rows and model) and refresh 'Last Active' text"""
+        self._age_job = self.root.after(5000, self._age_followers)
+        self._render_follower_rows(set(self.followers) | set(self.follower_rows))
+    
+    def _render_follower_rows(self, client_ids):
+        """Insert, update or delete the table rows for these client_ids (no-op for unchanged rows)"""
         try:
             if not self.root.winfo_exists():
                 return
             
-            # Calculate online status from last_heartbeat and filter
-            online_followers = []
-            for f in followers:
-                if self.is_online(f.get('last_heartbeat', '')):
-                    online_followers.append(f)
+            tree = self.users_tree
+            for client_id in client_ids:
+                f = self.followers.get(client_id)
+                row = None
+                # Only followers with a heartbeat within 60 seconds are shown; stale ones leave the model too
+                if f is not None:
+                    if self.is_online(f.get('last_heartbeat', '')):
+                        row = self.follower_row(f)
+                    else:
+                        del self.followers[client_id]
+                shown = self.follower_rows.get(client_id)
+                if row == shown:
+                    continue
+                if row is None:
+                    tree.delete(client_id)
+                    del self.follower_rows[client_id]
+                elif shown is None:
+                    tree.insert('', 'end', iid=client_id, values=row[0], tags=(row[1],))
+                    self.follower_rows[client_id] = row
+                else:
+                    tree.item(client_id, values=row[0], tags=(row[1],))
+                    self.follower_rows[client_id] = row
             
-            total_count = len(followers)
-            online_count = len(online_followers)
+            # Empty state message in the first row
+            if not self.follower_rows and not tree.exists('__empty__'):
+                tree.insert('', 0, iid='__empty__', values=(
+                    'No users currently online', '', '', '', '', ''
+                ))
+            elif self.follower_rows and tree.exists('__empty__'):
+                tree.delete('__empty__')
             
             # Update stats labels
             try:
-                self.online_count_label.config(text=str(online_count))
-                self.total_count_label.config(text=str(total_count))
+                self.online_count_label.config(text=str(len(self.follower_rows)))
+                self.total_count_label.config(text=str(len(self.followers)))
                 self.last_update_label.config(text=f"Last update: {datetime.now().strftime('%H:%M:%S')}")
             except:
                 pass
             
-            # Clear existing tree items
-            for item in self.users_tree.get_children():
-                self.users_tree.delete(item)
-            
-            if not online_followers:
-                # Show empty state message in the first row
-                self.users_tree.insert('', 'end', values=(
-                    'No users currently online', '', '', '', '', ''
-                ))
-                return
-            
-            # Add each online follower with comprehensive monitoring data
-            for f in online_followers:
-                # Account name
-                name = f.get('name', 'Unknown User')
-                
-                # License key (client_id) - show partial for identification
-                license_key = f.get('client_id', '')
-                if license_key:
-                    license_display = license_key[:16] if len(license_key) > 16 else license_key
-                else:
-                    license_display = '—'
-                
-                # Copy status
-                copy_enabled = f.get('copy_enabled', True)
-                copy_status = '✅ ON' if copy_enabled else '❌ OFF'
-                
-                # Signals executed / received - KEY MONITORING DATA
-                signals_received = f.get('signals_received', 0)
-                signals_executed = f.get('signals_executed', 0)
-                signals_text = f"{signals_executed} / {signals_received}"
-                
-                # Position info - detailed with symbol
-                pos = f.get('current_position')
-                if pos and pos.get('quantity', 0) != 0:
-                    qty = pos.get('quantity', 0)
-                    sym = pos.get('symbol', 'N/A')
-                    if qty > 0:
-                        position_text = f"🟢 LONG {qty} {sym}"
-                        tag = 'long_position'
-                    else:
-                        position_text = f"🔴 SHORT {abs(qty)} {sym}"
-                        tag = 'short_position'
-                else:
-                    position_text = "— Flat"
-                    tag = 'online' if copy_enabled else 'copy_off'
-                
-                # If copy is disabled, override tag
-                if not copy_enabled:
-                    tag = 'copy_off'
-                
-                # Last active from heartbeat
-                last_heartbeat = f.get('last_heartbeat', '')
-                last_active_text = self.time_ago(last_heartbeat) if last_heartbeat else 'Just now'
-                
-                # Insert row with all monitoring data
-                self.users_tree.insert('', 'end', values=(
-                    name,
-                    license_display,
-                    copy_status,
-                    signals_text,
-                    position_text,
-                    last_active_text
-                ), tags=(tag,))
-            
         except tk.TclError:
             return
         except Exception as e:
             print(f"Error updating followers UI: {e}")
             return
     
+    def follower_row(self, f):
+        """Table (values, tag) for one online follower - comprehensive monitoring data"""
+        # Account name
+        name = f.get('name', 'Unknown User')
+        
+        # License key (client_id) - show partial for identification
+        license_key = f.get('client_id', '')
+        if license_key:
+            license_display = license_key[:16] if len(license_key) > 16 else license_key
+        else:
+            license_display = '—'
+        
+        # Copy status
+        copy_enabled = f.get('copy_enabled', True)
+        copy_status = '✅ ON' if copy_enabled else '❌ OFF'
+        
+        # Signals executed / received - KEY MONITORING DATA
+        signals_received = f.get('signals_received', 0)
+        signals_executed = f.get('signals_executed', 0)
+        signals_text = f"{signals_executed} / {signals_received}"
+        
+        # Position info - detailed with symbol
+        pos = f.get('current_position')
+        if pos and pos.get('quantity', 0) != 0:
+            qty = pos.get('quantity', 0)
+            sym = pos.get('symbol', 'N/A')
+            if qty > 0:
+                position_text = f"🟢 LONG {qty} {sym}"
+                tag = 'long_position'
+            else:
+                position_text = f"🔴 SHORT {abs(qty)} {sym}"
+                tag = 'short_position'
+        else:
+            position_text = "— Flat"
+            tag = 'online' if copy_enabled else 'copy_off'
+        
+        # If copy is disabled, override tag
+        if not copy_enabled:
+            tag = 'copy_off'
+        
+        # Last active from heartbeat
+        last_heartbeat = f.get('last_heartbeat', '')
+        last_active_text = self.time_ago(last_heartbeat) if last_heartbeat else 'Just now'
+        
+        # Row with all monitoring data
+        values = (name, license_display, copy_status, signals_text, position_text, last_active_text)
+        return values, tag
+    
     def time_ago(self, date_str):
         """Convert datetime string to 'X ago' format"""
         if not date_str:
@@ -738,6 +813,9 @@ class MasterLauncher:
                 # Add parent path for imports
                 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
                 from shared.copier_broker import CopierBroker
+                from signal_broadcaster import SignalBroadcaster
+                from signal_journal import SignalJournal
+                from shared.position_diff import FillCoalescer, PositionDiffEngine
                 
                 # Create broker with your credentials
                 username = self.config.get('broker', {}).get('username', '')
@@ -760,31 +838,52 @@ class MasterLauncher:
                 
                 if connected:
                     self.broker_connected = True
-                    self.root.after(0, lambda: self.update_broker_status("✅ Connected - Ultra-fast"))
-                    print("📡 Position monitoring started - checking every 100ms (ULTRA-FAST)")
                     
-                    # Start position monitoring loop
+                    # Outbound signal queue + keep-alive sender on this loop; detection never waits on the relay
+                    self.broadcaster = SignalBroadcaster(
+                        api_url=CLOUD_API_BASE_URL,
+                        master_key=self.config.get('master_key', ''),
+                        on_sent=self.on_broadcast_sent,
+                        on_follower_changes=self.queue_follower_changes,
+                        journal=SignalJournal(os.path.join(os.path.dirname(__file__), 'journal', 'signals.ndjson'))
+                    )
+                    loop.run_until_complete(self.broadcaster.start())
+                    self.root.after(0, lambda: self.update_broker_status("✅ Connected - Realtime"))
+                    print("📡 Position monitoring started - realtime position events, REST reconcile every "
+                          f"{self.config.get('reconcile_interval', 5.0)}s")
+                    
+                    self.position_diff = PositionDiffEngine()
+                    # Optional window merging partial fills into one signal per symbol (flattens skip it)
+                    self.fill_coalescer = FillCoalescer(
+                        self.position_diff, self.broadcast_position_signals,
+                        self.config.get('coalesce_window_ms', 0) / 1000
+                    )
+                    baseline_taken = False
+                    
+                    def on_positions(positions):
+                        nonlocal baseline_taken
+                        for p in positions:
+                            print(f"   🎯 {p['symbol']}: {p['quantity']} contracts")
+                        if not baseline_taken:
+                            # Positions already open at startup are not re-broadcast
+                            self.fill_coalescer.reset(positions)
+                            baseline_taken = True
+                            return
+                        self.check_position_change(positions)
+                    
+                    # Position changes are pushed by the broker's user hub; REST polling
+                    # (poll_interval) is only used if the realtime stream cannot connect
                     self.position_monitor_running = True
-                    poll_count = 0
                     while self.position_monitor_running:
                         try:
-                            positions = loop.run_until_complete(self.broker.get_positions())
-                            poll_count += 1
-                            # Only log every 100 polls (10 seconds at 100ms) unless position exists
-                            if positions or poll_count % 100 == 0:
-                                if poll_count % 100 == 0:
-                                    print(f"📊 Still monitoring... (Poll #{poll_count}, {len(positions)} position(s))")
-                                elif positions:
-                                    for p in positions:
-                                        print(f"   🎯 {p['symbol']}: {p['quantity']} contracts")
-                            self.check_position_change(positions, loop)
+                            loop.run_until_complete(self.broker.watch_positions(
+                                on_positions,
+                                reconcile_interval=self.config.get('reconcile_interval', 5.0),
+                                poll_interval=self.config.get('poll_interval', 0.1)
+                            ))
                         except Exception as e:
-                            if poll_count % 100 == 0:
-                                print(f"❌ Position poll error: {e}")
-                        # Ultra-fast 100ms polling for lowest latency
-                        # This provides near-instant signal delivery but increases CPU/API usage
-                        # For less aggressive polling, change to 0.5 (500ms) or 1.0 (1 second)
-                        time.sleep(0.1)  # Check every 100ms for ULTRA-FAST detection
+                            print(f"❌ Position monitor error: {e}")
+                            time.sleep(1)
                 else:
                     self.root.after(0, lambda: self.update_broker_status("❌ Connection failed"))
                 
@@ -804,110 +903,41 @@ class MasterLauncher:
         except:
             pass
     
-    def check_position_change(self, positions, loop):
-        """Check if position changed and broadcast if it did"""
-        import asyncio
-        
-        # Get current position summary
-        current_pos = None
-        for pos in positions:
-            qty = pos.get('quantity', 0)
-            if qty != 0:
-                current_pos = {
-                    'symbol': pos.get('symbol', ''),
-                    'quantity': qty,
-                    'side': 'LONG' if qty > 0 else 'SHORT'
-                }
-                break
-        
-        # Compare with last known position
-        if current_pos != self.last_position:
-            old_pos = self.last_position
-            self.last_position = current_pos
-            
-            # Determine what changed and broadcast
-            if old_pos is None and current_pos is not None:
-                # NEW POSITION OPENED
-                signal = {
-                    'action': 'OPEN',
-                    'symbol': current_pos['symbol'],
-                    'side': 'BUY' if current_pos['quantity'] > 0 else 'SELL',
-                    'quantity': abs(current_pos['quantity']),
-                    'entry_price': 0,  # We don't have this from positions
-                    'timestamp': datetime.now().isoformat()
-                }
-                self.broadcast_signal(signal)
-                self.root.after(0, lambda: self.add_trade_log(f"📤 BROADCAST: OPEN {current_pos['side']} {abs(current_pos['quantity'])} {current_pos['symbol']}"))
-                
-            elif old_pos is not None and current_pos is None:
-                # POSITION CLOSED (FLATTEN)
-                signal = {
-                    'action': 'FLATTEN',
-                    'symbol': old_pos['symbol'],
-                    'side': 'SELL' if old_pos['quantity'] > 0 else 'BUY',
-                    'quantity': abs(old_pos['quantity']),
-                    'exit_price': 0,
-                    'timestamp': datetime.now().isoformat()
-                }
-                self.broadcast_signal(signal)
-                self.root.after(0, lambda: self.add_trade_log(f"📤 BROADCAST: FLATTEN {old_pos['symbol']}"))
-                
-            elif old_pos is not None and current_pos is not None:
-                # POSITION CHANGED (size or direction)
-                if old_pos['symbol'] == current_pos['symbol']:
-                    # Same symbol, quantity changed
-                    old_qty = old_pos['quantity']
-                    new_qty = current_pos['quantity']
-                    
-                    if (old_qty > 0 and new_qty > 0) or (old_qty < 0 and new_qty < 0):
-                        # Same direction, size changed
-                        diff = new_qty - old_qty
-                        if diff > 0:
-                            action = 'OPEN'  # Added to position
-                            side = 'BUY' if new_qty > 0 else 'SELL'
-                        else:
-                            action = 'CLOSE'  # Reduced position
-                            side = 'SELL' if new_qty > 0 else 'BUY'
-                            diff = abs(diff)
-                        
-                        signal = {
-                            'action': action,
-                            'symbol': current_pos['symbol'],
-                            'side': side,
-                            'quantity': abs(diff),
-                            'timestamp': datetime.now().isoformat()
-                        }
-                        self.broadcast_signal(signal)
-                        self.root.after(0, lambda a=action, s=side, d=abs(diff), sym=current_pos['symbol']: 
-                            self.add_trade_log(f"📤 BROADCAST: {a} {s} {d} {sym}"))
+    def check_position_change(self, positions):
+        """Feed a position snapshot; net changes are broadcast now or when the coalescing window closes"""
+        self.fill_coalescer.submit(positions)
+    
+    def broadcast_position_signals(self, signals):
+        """Broadcast the diff engine's signals for every changed symbol"""
+        for signal in signals:
+            if signal.action == 'FLATTEN':
+                msg = f"📤 BROADCAST: FLATTEN {signal.symbol}"
+            else:
+                msg = f"📤 BROADCAST: {signal.action} {signal.side} {signal.quantity} {signal.symbol}"
+            self.broadcast_signal(signal.to_dict())
+            self.root.after(0, lambda m=msg: self.add_trade_log(m))
     
     def broadcast_signal(self, signal):
-        """Send signal to all connected followers via API - only if copy enabled"""
+        """Queue signal for all connected followers - only if copy enabled (never blocks)"""
         # Check if copy is enabled - don't broadcast if disabled
         if not self.copy_enabled:
             msg = f"⛔ Signal NOT broadcast (copy disabled): {signal.get('action')} {signal.get('side', '')} {signal.get('quantity', '')} {signal.get('symbol', '')}"
             self.root.after(0, lambda: self.add_trade_log(msg))
             return
         
-        try:
-            master_key = self.config.get('master_key', '')
-            resp = requests.post(
-                f"{CLOUD_API_BASE_URL}/copier/broadcast",
-                json={
-                    "master_key": master_key,
-                    "signal": signal
-                },
-                timeout=5
-            )
-            if resp.status_code == 200:
-                data = resp.json()
-                count = data.get('received_count', 0) + data.get('websocket_count', 0)
-                msg = f"📡 Signal sent to {count} followers"
-                self.root.after(0, lambda: self.add_trade_log(msg))
-        except Exception as e:
-            msg = f"❌ Broadcast error: {e}"
+        # Called on the broker thread's loop (position callback), where the broadcaster lives
+        if not self.broadcaster or not self.broadcaster.enqueue(signal):
+            msg = f"❌ Broadcast error: broadcaster not running ({signal.get('action')} {signal.get('symbol', '')})"
             self.root.after(0, lambda: self.add_trade_log(msg))
     
+    def on_broadcast_sent(self, signal, count):
+        """SignalBroadcaster delivery result (runs on the broker thread)"""
+        if count is None:
+            msg = f"❌ Broadcast error: {signal.get('action')} {signal.get('symbol', '')} not delivered"
+        else:
+            msg = f"📡 Signal sent to {count} followers"
+        self.root.after(0, lambda: self.add_trade_log(msg))
+    
     def add_trade_log(self, message):
         """Add message to trade log (for future UI element)"""
         timestamp = datetime.now().strftime("%H:%M:%S")
@@ -17,6 +17,8 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from shared.copier_broker import CopierBroker
 from signal_broadcaster import SignalBroadcaster
 from position_monitor import PositionMonitor
+from signal_journal import SignalJournal
+from dashboard import MasterDashboard
 
 # Configure logging
 logging.basicConfig(
@@ -54,7 +56,10 @@ def load_config() -> dict:
                 "api_token": "YOUR_API_TOKEN"
             },
             "copy_enabled": True,
-            "poll_interval": 0.1
+            "poll_interval": 0.1,
+            "reconcile_interval": 5.0,
+            "coalesce_window_ms": 100,
+            "dashboard_port": 3000
         }
         with open(config_path, 'w') as f:
             json.dump(default_config, f, indent=2)
@@ -87,9 +92,11 @@ async def main():
     )
     
     # Create signal broadcaster
+    journal = SignalJournal(os.path.join(os.path.dirname(__file__), 'journal', 'signals.ndjson'))
     broadcaster = SignalBroadcaster(
         api_url=config['api_url'],
-        master_key=config['master_key']
+        master_key=config['master_key'],
+        journal=journal
     )
     
     print("📶 Connecting to broker...")
@@ -103,15 +110,34 @@ async def main():
     await broadcaster.start()
     
     # Create and start position monitor
-    copy_enabled = config.get('copy_enabled', True)
+    # Shared with the dashboard's copy toggle
+    state = {"copy_enabled": config.get('copy_enabled', True)}
     monitor = PositionMonitor(
         broker=broker,
         broadcaster=broadcaster,
         poll_interval=config.get('poll_interval', 0.5),
-        get_copy_enabled=lambda: copy_enabled
+        get_copy_enabled=lambda: state["copy_enabled"],
+        reconcile_interval=config.get('reconcile_interval', 5.0),
+        coalesce_window=config.get('coalesce_window_ms', 0) / 1000
     )
     await monitor.start()
     
+    # Dashboard runs on this same loop, so its controls reach the broadcaster directly
+    dashboard = None
+    if config.get('dashboard_port'):
+        dashboard = MasterDashboard(
+            broadcaster=broadcaster,
+            broker=broker,
+            get_copy_enabled=lambda: state["copy_enabled"],
+            set_copy_enabled=lambda enabled: state.update(copy_enabled=enabled),
+            port=config['dashboard_port']
+        )
+        try:
+            await dashboard.start()
+        except OSError as e:
+            logger.error(f"❌ Dashboard failed to start on port {config['dashboard_port']}: {e}")
+            dashboard = None
+    
     # Get initial follower count
     followers = await broadcaster.refresh_followers()
     
@@ -136,8 +162,11 @@ async def main():
     except KeyboardInterrupt:
         print("\n⏹️  Stopping...")
     finally:
+        if dashboard:
+            await dashboard.stop()
         await monitor.stop()
         await broadcaster.stop()
+        journal.close()
         await broker.disconnect()
         print("👋 Goodbye!")
 
@@ -5,10 +5,12 @@ When you open/close trades, it broadcasts to all followers
 
 import asyncio
 import logging
-from typing import Dict, Optional, Set
+from typing import Dict
 from datetime import datetime
 from dataclasses import dataclass
 
+from shared.position_diff import FillCoalescer, PositionDiffEngine
+
 logger = logging.getLogger(__name__)
 
 
@@ -30,22 +32,31 @@ class PositionMonitor:
     """
     Monitors your broker account for position changes.
     When you manually trade, it detects the change and broadcasts to followers.
+    Changes are pushed by the broker's realtime position stream; REST is only
+    polled as a reconciliation safety net (or as the fallback when streaming is unavailable).
     """
     
-    def __init__(self, broker, broadcaster, poll_interval: float = 0.5, get_copy_enabled=None):
+    def __init__(self, broker, broadcaster, poll_interval: float = 0.5, get_copy_enabled=None,
+                 reconcile_interval: float = 5.0, coalesce_window: float = 0.0):
         """
         Args:
             broker: Connected broker instance (your master account)
             broadcaster: SignalBroadcaster to send signals to followers
-            poll_interval: How often to check for position changes (seconds)
+            poll_interval: How often to poll positions when realtime streaming is unavailable (seconds)
             get_copy_enabled: Callable that returns True if copy is enabled
+            reconcile_interval: How often to re-check positions over REST while streaming (seconds)
+            coalesce_window: Merge position changes arriving within this many seconds into
+                             one signal per symbol (0 = off, 0.05-0.25 typical); flattens are never delayed
         """
         self.broker = broker
         self.broadcaster = broadcaster
         self.poll_interval = poll_interval
+        self.reconcile_interval = reconcile_interval
         self.get_copy_enabled = get_copy_enabled or (lambda: True)
         
-        # Track known positions
+        # Track known positions (signed quantity per symbol lives in the diff engine)
+        self.diff_engine = PositionDiffEngine()
+        self.coalescer = FillCoalescer(self.diff_engine, self._broadcast_changes, coalesce_window)
         self.known_positions: Dict[str, Position] = {}
         self.monitoring = False
         self._monitor_task = None
@@ -64,6 +75,7 @@ class PositionMonitor:
     async def stop(self):
         """Stop monitoring"""
         self.monitoring = False
+        self.broker.stop_watching()
         if self._monitor_task:
             self._monitor_task.cancel()
             try:
@@ -76,124 +88,60 @@ class PositionMonitor:
         """Get current positions from broker and sync state"""
         try:
             positions = await self.broker.get_positions()
-            
-            self.known_positions.clear()
-            for pos in positions:
-                symbol = pos.get('symbol', '')
-                if not symbol:
-                    continue
-                    
-                self.known_positions[symbol] = Position(
-                    symbol=symbol,
-                    side='long' if pos.get('quantity', 0) > 0 else 'short',
-                    quantity=abs(pos.get('quantity', 0)),
-                    entry_price=pos.get('entry_price', 0)
-                )
-                
+            self.coalescer.reset(positions)
+            self._refresh_known_positions()
             logger.info(f"📊 Synced {len(self.known_positions)} positions")
             
         except Exception as e:
             logger.error(f"Error syncing positions: {e}")
             
     async def _monitor_loop(self):
-        """Main monitoring loop - detect position changes"""
+        """Main monitoring loop - the broker pushes every position change to _on_positions"""
         while self.monitoring:
             try:
-                # Get current positions from broker
-                current = await self._get_current_positions()
-                
-                # Detect changes
-                await self._check_for_changes(current)
-                
+                await self.broker.watch_positions(
+                    self._on_positions,
+                    reconcile_interval=self.reconcile_interval,
+                    poll_interval=self.poll_interval
+                )
             except Exception as e:
                 logger.error(f"Monitor error: {e}")
+                await asyncio.sleep(self.poll_interval)
                 
-            await asyncio.sleep(self.poll_interval)
-            
-    async def _get_current_positions(self) -> Dict[str, Position]:
-        """Get current positions from broker"""
-        positions = {}
-        
+    async def _on_positions(self, broker_positions: list):
+        """Position stream/reconcile callback"""
         try:
-            broker_positions = await self.broker.get_positions()
-            
-            for pos in broker_positions:
-                symbol = pos.get('symbol', '')
-                quantity = pos.get('quantity', 0)
-                
-                if not symbol or quantity == 0:
-                    continue
-                    
-                positions[symbol] = Position(
-                    symbol=symbol,
-                    side='long' if quantity > 0 else 'short',
-                    quantity=abs(quantity),
-                    entry_price=pos.get('entry_price', 0)
-                )
-                
+            self.coalescer.submit(broker_positions)
         except Exception as e:
-            logger.error(f"Error getting positions: {e}")
+            logger.error(f"Monitor error: {e}")
             
-        return positions
+    def _refresh_known_positions(self):
+        """Mirror the diff engine's book as Position objects (for status/display)"""
+        self.known_positions = {
+            symbol: Position(
+                symbol=symbol,
+                side='long' if qty > 0 else 'short',
+                quantity=abs(qty),
+                entry_price=self.diff_engine.entry_prices.get(symbol, 0)
+            )
+            for symbol, qty in self.diff_engine.positions.items()
+        }
         
-    async def _check_for_changes(self, current: Dict[str, Position]):
-        """Check for position changes and broadcast"""
+    def _broadcast_changes(self, signals: list):
+        """Coalescer output: net changes across all symbols since the last broadcast"""
+        self._refresh_known_positions()
         
         # Check if copy is enabled - don't broadcast if disabled
         if not self.get_copy_enabled():
             # Still update known positions but don't broadcast
-            self.known_positions = current
             return
         
-        # Check for new positions (OPEN signals)
-        for symbol, pos in current.items():
-            if symbol not in self.known_positions:
-                # NEW POSITION - broadcast OPEN
-                logger.info(f"🆕 NEW POSITION: {pos.side.upper()} {pos.quantity} {symbol} @ {pos.entry_price}")
-                
-                await self.broadcaster.broadcast_open(
-                    symbol=symbol,
-                    side="BUY" if pos.side == "long" else "SELL",
-                    quantity=pos.quantity,
-                    entry_price=pos.entry_price
-                )
-                
-            elif self.known_positions[symbol].quantity != pos.quantity:
-                # QUANTITY CHANGED - partial add or partial close
-                old_qty = self.known_positions[symbol].quantity
-                new_qty = pos.quantity
-                
-                if new_qty > old_qty:
-                    # Added to position
-                    diff = new_qty - old_qty
-                    logger.info(f"➕ ADDED: {diff} {symbol}")
-                    
-                    await self.broadcaster.broadcast_open(
-                        symbol=symbol,
-                        side="BUY" if pos.side == "long" else "SELL",
-                        quantity=diff,
-                        entry_price=pos.entry_price
-                    )
-                else:
-                    # Partial close
-                    diff = old_qty - new_qty
-                    logger.info(f"➖ PARTIAL CLOSE: {diff} {symbol}")
-                    
-                    await self.broadcaster.broadcast_close(
-                        symbol=symbol,
-                        side="BUY" if pos.side == "long" else "SELL",
-                        quantity=diff,
-                        exit_price=pos.entry_price  # Best we have
-                    )
-                    
-        # Check for closed positions (CLOSE/FLATTEN signals)
-        for symbol in list(self.known_positions.keys()):
-            if symbol not in current:
-                # POSITION CLOSED - broadcast FLATTEN
-                old_pos = self.known_positions[symbol]
-                logger.info(f"🛑 CLOSED: {old_pos.side.upper()} {old_pos.quantity} {symbol}")
-                
-                await self.broadcaster.broadcast_flatten(symbol=symbol)
-                
-        # Update known positions
-        self.known_positions = current
+        for signal in signals:
+            if signal.action == "OPEN":
+                logger.info(f"🆕 OPEN: {signal.side} {signal.quantity} {signal.symbol} @ {signal.entry_price}")
+            elif signal.action == "CLOSE":
+                logger.info(f"➖ PARTIAL CLOSE: {signal.quantity} {signal.symbol}")
+            else:
+                logger.info(f"🛑 CLOSED: {signal.symbol}")
+            # Queued in order; the broadcaster's sender delivers them without blocking detection
+            self.broadcaster.enqueue(signal)
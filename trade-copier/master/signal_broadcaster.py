@@ -6,10 +6,10 @@ This runs on YOUR machine as the master
 import asyncio
 import logging
 import aiohttp
-from typing import Dict, List, Optional, Set
-from datetime import datetime
-from dataclasses import dataclass, field
-import json
+import socketio
+from typing import Callable, Dict, List, Optional
+from dataclasses import asdict, dataclass, field
+from collections import deque
 
 # Add parent to path for imports
 import sys
@@ -31,80 +31,363 @@ class ConnectedFollower:
     copy_enabled: bool = True
     signals_received: int = 0
     signals_executed: int = 0
+    account_ids: list = field(default_factory=list)
+    current_position: Optional[dict] = None
+    
+    @classmethod
+    def from_dict(cls, data: dict) -> "ConnectedFollower":
+        return cls(
+            client_id=data["client_id"],
+            name=data.get("name", "Unknown"),
+            connected_at=data.get("connected_at", ""),
+            last_heartbeat=data.get("last_heartbeat", ""),
+            copy_enabled=data.get("copy_enabled", True),
+            signals_received=data.get("signals_received", 0),
+            signals_executed=data.get("signals_executed", 0),
+            account_ids=data.get("account_ids", []),
+            current_position=data.get("current_position")
+        )
 
 
 class SignalBroadcaster:
     """
     Broadcasts trade signals from Master to all Followers
     Uses your Flask API as the relay server
+    
+    Signals go through an outbound queue drained by a single sender task: callers
+    never wait on the network, and signals reach the relay in the order they were
+    queued (a signal is retried before the next is sent). An urgent signal (the
+    emergency FLATTEN ALL) supersedes everything: pending signals are dropped and
+    a delivery still retrying is abandoned, so it goes out at once.
+    
+    The sender publishes over one authenticated Socket.IO connection to the relay's
+    /copier-master namespace and waits for the server ack; the same connection
+    pushes follower join/leave/toggle/heartbeat/execution events, so the follower
+    list needs no polling. While that channel is down, signals fall back to
+    POST /copier/broadcast on a keep-alive session.
     """
     
-    def __init__(self, api_url: str, master_key: str):
+    CHANNEL_NAMESPACE = '/copier-master'
+    
+    def __init__(self, api_url: str, master_key: str, max_attempts: int = 3,
+                 on_sent: Optional[Callable[[dict, Optional[int]], None]] = None,
+                 on_followers: Optional[Callable[[List[dict]], None]] = None,
+                 on_execution_report: Optional[Callable[[dict], None]] = None,
+                 on_follower_changes: Optional[Callable[[List[dict], List[str], bool], None]] = None,
+                 ack_timeout: float = 5.0, journal=None, history_size: int = 200):
         """
         Args:
             api_url: Your Flask API URL (e.g. https://quotrading-flask-api.azurewebsites.net)
             master_key: Your master authentication key
+            max_attempts: Delivery attempts per signal before it is dropped
+            on_sent: Optional callback(signal_dict, follower_count or None on failure) run by the sender
+            on_followers: Optional callback(list of follower dicts) on every pushed follower change
+            on_execution_report: Optional callback(report dict) when a follower reports an execution
+            on_follower_changes: Optional callback(upserted follower dicts, removed client_ids, reset)
+                                 with only what a pushed event changed; reset=True means upserted
+                                 is the complete list and any other follower is gone
+            ack_timeout: Seconds to wait for the relay to ack a published signal
+            journal: Optional SignalJournal; every queued/sent/failed signal is appended to it
+            history_size: Recent signals kept in memory for dashboards
         """
         self.api_url = api_url.rstrip('/')
         self.master_key = master_key
+        self.max_attempts = max_attempts
+        self.ack_timeout = ack_timeout
+        self.on_sent = on_sent
+        self.on_followers = on_followers
+        self.on_execution_report = on_execution_report
+        self.on_follower_changes = on_follower_changes
         self.session: Optional[aiohttp.ClientSession] = None
         self.connected_followers: Dict[str, ConnectedFollower] = {}
-        self.signal_history: List[TradeSignal] = []
+        self.signal_history = deque(maxlen=history_size)  # Recent signal dicts, oldest first
+        self.signals_sent_total = 0
+        self.journal = journal
         self.broadcasting = False
+        self._outbox: Optional[asyncio.Queue] = None
+        self._sender_task: Optional[asyncio.Task] = None
+        self._inflight: Optional[asyncio.Future] = None  # Delivery the sender is awaiting
+        self.sio: Optional[socketio.AsyncClient] = None
+        self.channel_connected = False
+        self._channel_task: Optional[asyncio.Task] = None
         
     async def start(self):
-        """Start the broadcaster"""
-        self.session = aiohttp.ClientSession()
+        """Start the broadcaster (must be called from the event loop that will send)"""
+        # One pooled keep-alive connection is reused for every signal (no per-signal TCP/TLS handshake)
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=4, keepalive_timeout=75),
+            timeout=aiohttp.ClientTimeout(total=5)
+        )
+        self._outbox = asyncio.Queue()
+        self._sender_task = asyncio.create_task(self._send_loop())
+        self._open_channel()
         self.broadcasting = True
         logger.info("📡 Signal Broadcaster started")
         
-    async def stop(self):
-        """Stop the broadcaster"""
+    async def stop(self, drain_timeout: float = 5.0):
+        """Stop the broadcaster, giving queued signals up to `drain_timeout` seconds to go out"""
         self.broadcasting = False
+        if self._outbox is not None and not self._outbox.empty():
+            try:
+                await asyncio.wait_for(self._outbox.join(), timeout=drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"⚠️ {self._outbox.qsize()} queued signals not sent")
+        for task in (self._sender_task, self._channel_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        # Signals left behind after the drain timeout are dropped; release their awaiters
+        while self._outbox is not None and not self._outbox.empty():
+            signal, delivered = self._outbox.get_nowait()
+            self._outbox.task_done()
+            if delivered is not None and not delivered.done():
+                delivered.set_result(0)
+        if self.sio and self.sio.connected:
+            await self.sio.disconnect()
         if self.session:
             await self.session.close()
         logger.info("📡 Signal Broadcaster stopped")
     
+    def enqueue(self, signal, urgent: bool = False) -> bool:
+        """
+        Queue a signal (TradeSignal or dict) for delivery and return immediately.
+        Must be called on the broadcaster's event loop thread.
+        
+        urgent: supersede everything queued (emergency FLATTEN ALL) - pending signals
+                are dropped and an in-flight delivery is abandoned
+        """
+        if not self.broadcasting or self._outbox is None:
+            logger.warning("Broadcaster not started")
+            return False
+        if isinstance(signal, TradeSignal):
+            signal = signal.to_dict()
+        if urgent:
+            self._supersede_pending()
+        self._remember(signal)
+        self._outbox.put_nowait((signal, None))
+        if self._outbox.qsize() > 20:
+            logger.warning(f"⚠️ Broadcast backlog: {self._outbox.qsize()} signals queued")
+        return True
+    
     async def broadcast_signal(self, signal: TradeSignal) -> int:
         """
-        Broadcast a trade signal to all connected followers
+        Broadcast a trade signal to all connected followers, in queue order
         
         Returns: Number of followers who received it
         """
-        if not self.broadcasting or not self.session:
+        if not self.broadcasting or self._outbox is None:
             logger.warning("Broadcaster not started")
             return 0
             
+        signal = signal.to_dict()
+        self._remember(signal)
+        delivered = asyncio.get_running_loop().create_future()
+        self._outbox.put_nowait((signal, delivered))
+        return await delivered
+    
+    def _supersede_pending(self):
+        """Drop queued signals and abandon the in-flight one (reported as failed, awaiters get 0)"""
+        dropped = 0
+        while not self._outbox.empty():
+            signal, delivered = self._outbox.get_nowait()
+            self._outbox.task_done()
+            self._finish(signal, delivered, None, event="superseded")
+            dropped += 1
+        if self._inflight is not None and not self._inflight.done():
+            self._inflight.cancel()  # The sender finishes it as superseded
+            dropped += 1
+        if dropped:
+            logger.warning(f"⚠️ {dropped} pending signals superseded by urgent signal")
+    
+    def _finish(self, signal: dict, delivered, count: Optional[int], event: Optional[str] = None):
+        """Journal the outcome, release the awaiter and notify on_sent"""
+        if self.journal:
+            self.journal.record(event or ("failed" if count is None else "sent"), signal, followers=count)
+        if delivered is not None and not delivered.done():
+            delivered.set_result(count or 0)
+        if self.on_sent:
+            try:
+                self.on_sent(signal, count)
+            except Exception as e:
+                logger.error(f"on_sent callback error: {e}")
+    
+    def _remember(self, signal: dict):
         self.signal_history.append(signal)
-        
-        # Send to API relay endpoint with retry
-        for attempt in range(3):
+        self.signals_sent_total += 1
+        if self.journal:
+            self.journal.record("queued", signal)
+    
+    async def _send_loop(self):
+        """Single consumer: delivers queued signals one at a time, preserving order"""
+        while True:
+            signal, delivered = await self._outbox.get()
+            # Delivery runs as its own task so an urgent signal can abandon it
+            self._inflight = asyncio.ensure_future(self._post_signal(signal))
+            try:
+                try:
+                    await asyncio.wait((self._inflight,))
+                except asyncio.CancelledError:
+                    # Stopped mid-delivery: the awaiter gets "0 followers" instead of hanging
+                    self._inflight.cancel()
+                    if delivered is not None and not delivered.done():
+                        delivered.set_result(0)
+                    raise
+                if self._inflight.cancelled():
+                    self._finish(signal, delivered, None, event="superseded")
+                else:
+                    self._finish(signal, delivered, self._inflight.result())
+            finally:
+                self._inflight = None
+                self._outbox.task_done()
+    
+    async def _post_signal(self, signal: dict) -> Optional[int]:
+        """Publish to the relay with retry; returns follower count, or None if every attempt failed"""
+        label = f"{signal.get('action')} {signal.get('side', '')} {signal.get('quantity', '')} {signal.get('symbol', '')}"
+        for attempt in range(self.max_attempts):
+            if self.channel_connected:
+                try:
+                    ack = await self.sio.call('signal', signal, namespace=self.CHANNEL_NAMESPACE,
+                                              timeout=self.ack_timeout)
+                    if isinstance(ack, dict) and 'error' not in ack:
+                        received_count = ack.get("received_count", 0) + ack.get("websocket_count", 0)
+                        logger.info(f"📤 Signal published: {label} → {received_count} followers")
+                        return received_count
+                    logger.warning(f"⚠️ Publish rejected (attempt {attempt+1}/{self.max_attempts}): {ack}")
+                except Exception as e:
+                    logger.warning(f"⚠️ Publish error (attempt {attempt+1}/{self.max_attempts}): {e}")
+                if attempt + 1 < self.max_attempts:
+                    await asyncio.sleep(0.25 * 2 ** attempt)
+                continue
             try:
                 async with self.session.post(
                     f"{self.api_url}/copier/broadcast",
                     json={
                         "master_key": self.master_key,
-                        "signal": signal.to_dict()
-                    },
-                    timeout=aiohttp.ClientTimeout(total=5)
+                        "signal": signal
+                    }
                 ) as resp:
                     if resp.status == 200:
                         data = await resp.json()
-                        received_count = data.get("received_count", 0)
-                        logger.info(f"📤 Signal broadcast: {signal.action} {signal.side} {signal.quantity} {signal.symbol} → {received_count} followers")
+                        received_count = data.get("received_count", 0) + data.get("websocket_count", 0)
+                        logger.info(f"📤 Signal broadcast: {label} → {received_count} followers")
                         return received_count
-                    else:
-                        logger.warning(f"⚠️ Broadcast failed (attempt {attempt+1}/3): {resp.status}")
-                        await asyncio.sleep(0.5)
+                    logger.warning(f"⚠️ Broadcast failed (attempt {attempt+1}/{self.max_attempts}): {resp.status}")
             except Exception as e:
-                logger.warning(f"⚠️ Broadcast error (attempt {attempt+1}/3): {e}")
-                await asyncio.sleep(0.5)
+                logger.warning(f"⚠️ Broadcast error (attempt {attempt+1}/{self.max_attempts}): {e}")
+            if attempt + 1 < self.max_attempts:
+                await asyncio.sleep(0.25 * 2 ** attempt)
         
-        logger.error("❌ Signal broadcast failed after 3 attempts")
-        return 0
+        logger.error(f"❌ Signal broadcast failed after {self.max_attempts} attempts: {label}")
+        return None
+    
+    # ------------------------------------------------------------------
+    # /copier-master channel
+    # ------------------------------------------------------------------
+    
+    def _open_channel(self):
+        """Create the Socket.IO client and keep it connected in the background"""
+        self.sio = socketio.AsyncClient(
+            reconnection=True,
+            reconnection_attempts=0,  # Infinite retries
+            reconnection_delay=1,
+            reconnection_delay_max=10,
+            logger=False,
+            engineio_logger=False
+        )
+        ns = self.CHANNEL_NAMESPACE
+        
+        @self.sio.event(namespace=ns)
+        async def connect():
+            self.channel_connected = True
+            logger.info("🔗 Publisher channel connected")
+        
+        @self.sio.event(namespace=ns)
+        async def disconnect():
+            self.channel_connected = False
+            logger.warning("⚠️ Publisher channel disconnected - using HTTP until it reconnects")
+        
+        @self.sio.on('followers', namespace=ns)
+        async def on_followers(data):
+            self.connected_followers = {
+                f["client_id"]: ConnectedFollower.from_dict(f) for f in (data or {}).get("followers", [])
+            }
+            self._followers_changed(list(self.connected_followers.values()), reset=True)
+        
+        @self.sio.on('follower_joined', namespace=ns)
+        async def on_follower_joined(data):
+            follower = self.connected_followers[data["client_id"]] = ConnectedFollower.from_dict(data)
+            self._followers_changed([follower])
+        
+        @self.sio.on('follower_heartbeat', namespace=ns)
+        async def on_follower_heartbeat(data):
+            follower = self.connected_followers[data["client_id"]] = ConnectedFollower.from_dict(data)
+            self._followers_changed([follower])
+        
+        @self.sio.on('follower_left', namespace=ns)
+        async def on_follower_left(data):
+            if self.connected_followers.pop(data.get("client_id"), None):
+                self._followers_changed(removed=[data["client_id"]])
+        
+        @self.sio.on('follower_toggled', namespace=ns)
+        async def on_follower_toggled(data):
+            follower = self.connected_followers.get(data.get("client_id"))
+            if follower:
+                follower.copy_enabled = data.get("copy_enabled", True)
+                self._followers_changed([follower])
+        
+        @self.sio.on('execution_report', namespace=ns)
+        async def on_execution_report(data):
+            follower = self.connected_followers.get(data.get("client_id"))
+            if follower:
+                follower.signals_executed = data.get("signals_executed", follower.signals_executed)
+                if data.get("current_position") is not None:
+                    follower.current_position = data["current_position"]
+                self._followers_changed([follower])
+            if self.on_execution_report:
+                self.on_execution_report(data)
+        
+        self._channel_task = asyncio.create_task(self._channel_loop())
+    
+    async def _channel_loop(self):
+        """Initial connect with backoff; afterwards python-socketio reconnects by itself"""
+        delay = 1
+        while not self.sio.connected:
+            try:
+                await self.sio.connect(
+                    self.api_url,
+                    namespaces=[self.CHANNEL_NAMESPACE],
+                    auth={"master_key": self.master_key},
+                    transports=['websocket']
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ Publisher channel connect failed ({e}) - retrying in {delay}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+    
+    def _followers_changed(self, upserted: List[ConnectedFollower] = (), removed: List[str] = (),
+                           reset: bool = False):
+        if self.on_follower_changes:
+            try:
+                self.on_follower_changes([asdict(f) for f in upserted], list(removed), reset)
+            except Exception as e:
+                logger.error(f"on_follower_changes callback error: {e}")
+        if self.on_followers:
+            try:
+                self.on_followers(self.follower_dicts())
+            except Exception as e:
+                logger.error(f"on_followers callback error: {e}")
+    
+    def follower_dicts(self) -> List[dict]:
+        """Followers in the /copier/followers JSON shape"""
+        return [asdict(f) for f in self.connected_followers.values()]
     
     async def refresh_followers(self) -> List[ConnectedFollower]:
-        """Get list of currently connected followers from server"""
+        """Get list of currently connected followers (pushed over the channel, else fetched)"""
+        if self.channel_connected:
+            return list(self.connected_followers.values())
         if not self.session:
             return []
             
@@ -118,15 +401,7 @@ class SignalBroadcaster:
                     data = await resp.json()
                     followers = []
                     for f in data.get("followers", []):
-                        follower = ConnectedFollower(
-                            client_id=f["client_id"],
-                            name=f["name"],
-                            connected_at=f["connected_at"],
-                            last_heartbeat=f["last_heartbeat"],
-                            copy_enabled=f.get("copy_enabled", True),
-                            signals_received=f.get("signals_received", 0),
-                            signals_executed=f.get("signals_executed", 0)
-                        )
+                        follower = ConnectedFollower.from_dict(f)
                         followers.append(follower)
                         self.connected_followers[f["client_id"]] = follower
                     return followers
@@ -155,8 +430,9 @@ class SignalBroadcaster:
         """Get broadcaster status for dashboard"""
         return {
             "broadcasting": self.broadcasting,
+            "channel_connected": self.channel_connected,
             "connected_followers": len(self.connected_followers),
-            "total_signals_sent": len(self.signal_history),
+            "total_signals_sent": self.signals_sent_total,
             "followers": [
                 {
                     "id": f.client_id,
@@ -0,0 +1,176 @@
+"""
+Signal Journal - Append-only NDJSON audit log of broadcast signals
+Every signal the master queues, delivers or fails to deliver is appended as
+one JSON line to a rotated journal file by a background writer thread, so
+callers never block on disk and the journal's footprint stays bounded.
+The journal can be replayed or searched by signal_id or time range.
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_ts(value, strict: bool = False) -> Optional[datetime]:
+    """Aware datetime from a datetime or ISO string; unparseable values are None unless strict"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        ts = value
+    else:
+        try:
+            ts = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        except ValueError:
+            if strict:
+                raise ValueError(f"Invalid timestamp: {value!r}")
+            return None
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+class SignalJournal:
+    """Rotated NDJSON journal written off-thread"""
+
+    def __init__(self, path: str, max_bytes: int = 10 * 1024 * 1024, backup_count: int = 20):
+        """
+        Args:
+            path: Journal file (rotated files get .1, .2, ... suffixes, .1 being the newest)
+            max_bytes: Rotate once the current file reaches this size
+            backup_count: Rotated files kept; older ones are deleted
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._size = os.path.getsize(path) if os.path.exists(path) else 0
+        self._writer = threading.Thread(target=self._write_loop, name="signal-journal", daemon=True)
+        self._writer.start()
+
+    # ---- writes -------------------------------------------------------
+
+    def record(self, event: str, signal: dict, **fields) -> dict:
+        """
+        Add an entry (event: 'queued' / 'sent' / 'failed', ...) and return it.
+        Never blocks on disk; the writer thread appends it to the journal.
+        """
+        entry = {"ts": datetime.now(timezone.utc).isoformat(), "event": event,
+                 "signal_id": signal.get("signal_id"), "signal": signal}
+        entry.update(fields)
+        self._queue.put(json.dumps(entry, separators=(",", ":"), default=str))
+        return entry
+
+    def close(self, timeout: float = 5.0):
+        """Flush pending entries and stop the writer"""
+        self._queue.put(None)
+        self._writer.join(timeout)
+
+    def _write_loop(self):
+        f = open(self.path, "a", encoding="utf-8")
+        try:
+            while True:
+                line = self._queue.get()
+                batch = [line]
+                # Drain whatever else is queued so a burst costs one flush
+                while True:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                stop = None in batch
+                for line in batch:
+                    if line is None:
+                        continue
+                    data = line + "\n"
+                    size = len(data.encode("utf-8"))
+                    if self._size and self._size + size > self.max_bytes:
+                        f.close()
+                        self._rotate()
+                        f = open(self.path, "a", encoding="utf-8")
+                    f.write(data)
+                    self._size += size
+                f.flush()
+                if stop:
+                    return
+        except Exception as e:
+            logger.error(f"❌ Signal journal writer stopped: {e}")
+        finally:
+            f.close()
+
+    def _rotate(self):
+        for index in range(self.backup_count, 0, -1):
+            source = self.path if index == 1 else f"{self.path}.{index - 1}"
+            target = f"{self.path}.{index}"
+            if os.path.exists(source):
+                if os.path.exists(target):
+                    os.remove(target)
+                os.rename(source, target)
+        self._size = 0
+
+    # ---- reads --------------------------------------------------------
+
+    def _files(self) -> List[str]:
+        """Journal files oldest first"""
+        files = [f"{self.path}.{index}" for index in range(self.backup_count, 0, -1)]
+        files.append(self.path)
+        return [path for path in files if os.path.exists(path)]
+
+    @staticmethod
+    def _first_ts(path: str) -> Optional[datetime]:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    return _parse_ts(json.loads(line).get("ts"))
+                except ValueError:
+                    continue
+        return None
+
+    def replay(self, since=None, until=None, signal_id: Optional[str] = None) -> Iterator[dict]:
+        """
+        Entries from the journal on disk, oldest first, optionally limited to
+        [since, until] (datetimes or ISO strings) and/or one signal_id.
+        Files entirely before `since` are skipped without being parsed.
+        Raises ValueError (before anything is read) if since/until is not a valid timestamp.
+        """
+        return self._replay(_parse_ts(since, strict=True), _parse_ts(until, strict=True), signal_id)
+
+    def _replay(self, since: Optional[datetime], until: Optional[datetime],
+                signal_id: Optional[str]) -> Iterator[dict]:
+        files = self._files()
+        if since is not None:
+            # Each file ends where the next newer one starts
+            starts = [self._first_ts(path) for path in files]
+            first = 0
+            for index in range(1, len(files)):
+                if starts[index] is not None and starts[index] <= since:
+                    first = index
+            files = files[first:]
+
+        for path in files:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # Torn last line while the writer is mid-append
+                    if signal_id is not None and entry.get("signal_id") != signal_id:
+                        continue
+                    ts = _parse_ts(entry.get("ts"))
+                    if since is not None and (ts is None or ts < since):
+                        continue
+                    if until is not None and ts is not None and ts > until:
+                        return
+                    yield entry
+
+    def search(self, signal_id: Optional[str] = None, since=None, until=None, limit: int = 500) -> List[dict]:
+        """Matching journal entries, oldest first, at most `limit` (the newest ones)"""
+        matches = deque(maxlen=limit)
+        for entry in self.replay(since=since, until=until, signal_id=signal_id):
+            matches.append(entry)
+        return list(matches)
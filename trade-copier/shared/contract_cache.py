@@ -0,0 +1,127 @@
+"""
+Contract Cache - Persistent symbol -> broker contract id map
+Resolving a symbol ("MES") to its front contract ("CON.F.US.MES.Z25") costs a
+broker REST call, so resolved ids are kept in a small JSON file shared by the
+master and follower apps. Each entry expires at the contract's roll date
+(derived from the month code in the id), or after max_age if the id cannot be
+parsed, so a cached id never outlives the contract it points to.
+"""
+
+import json
+import logging
+import os
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from shared.position_diff import CONTRACT_ROOTS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'contract_cache.json')
+
+# Futures month codes
+MONTH_CODES = {"F": 1, "G": 2, "H": 3, "J": 4, "K": 5, "M": 6,
+               "N": 7, "Q": 8, "U": 9, "V": 10, "X": 11, "Z": 12}
+
+# Energy contracts expire in the month before delivery; everything else rolls like the equity indexes
+MONTHLY_ROLL_ROOTS = {"CL", "MCL"}
+
+
+def _third_friday(year: int, month: int) -> date:
+    first = date(year, month, 1)
+    return first + timedelta(days=(4 - first.weekday()) % 7 + 14)
+
+
+def contract_roll_date(contract_id: str) -> Optional[date]:
+    """
+    Date volume moves off this contract, or None if the id has no month code.
+    Equity index futures roll 8 days before the third-Friday expiry (the CME roll
+    Thursday); crude rolls around the 15th of the month before delivery.
+    'CON.F.US.MES.Z25' -> 2025-12-11, 'CON.F.US.CLE.X25' -> 2025-10-15
+    """
+    parts = (contract_id or "").upper().split(".")
+    if len(parts) < 2:
+        return None
+    code = parts[-1]
+    if len(code) < 2 or code[0] not in MONTH_CODES or not code[1:].isdigit():
+        return None
+    month = MONTH_CODES[code[0]]
+    year = 2000 + int(code[1:]) % 100
+    root = CONTRACT_ROOTS.get(parts[-2], parts[-2])  # CON.F.US.CLE.X25 is the CL contract
+    if root in MONTHLY_ROLL_ROOTS:
+        if month == 1:
+            return date(year - 1, 12, 15)
+        return date(year, month - 1, 15)
+    return _third_friday(year, month) - timedelta(days=8)
+
+
+class ContractCache:
+    """JSON-backed {symbol: contract id} with roll-aware expiry"""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_age: timedelta = timedelta(days=7),
+                 retry_after: timedelta = timedelta(hours=1)):
+        """
+        Args:
+            path: Cache file (created on first save)
+            max_age: Expiry for ids with no parseable contract month; also caps every entry
+            retry_after: Expiry for an id whose roll date has already passed (the broker
+                         still listed it as front month - ask again soon)
+        """
+        self.path = path
+        self.max_age = max_age
+        self.retry_after = retry_after
+        self._entries: Dict[str, dict] = {}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Ignoring unreadable contract cache {self.path}: {e}")
+            return
+        for symbol, entry in data.items():
+            try:
+                expires = datetime.fromisoformat(entry["expires"])
+                self._entries[symbol] = {"contract_id": entry["contract_id"], "expires": expires}
+            except (KeyError, TypeError, ValueError):
+                continue
+
+    def save(self):
+        data = {symbol: {"contract_id": entry["contract_id"], "expires": entry["expires"].isoformat()}
+                for symbol, entry in self._entries.items()}
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning(f"⚠️ Could not save contract cache: {e}")
+
+    def get(self, symbol: str, now: Optional[datetime] = None) -> Optional[str]:
+        """Cached contract id, or None if missing or expired"""
+        entry = self._entries.get(symbol)
+        if entry is None or entry["expires"] <= (now or datetime.now(timezone.utc)):
+            return None
+        return entry["contract_id"]
+
+    def put(self, symbol: str, contract_id: str, now: Optional[datetime] = None):
+        now = now or datetime.now(timezone.utc)
+        expires = now + self.max_age
+        roll = contract_roll_date(contract_id)
+        if roll is not None:
+            roll_at = datetime(roll.year, roll.month, roll.day, tzinfo=timezone.utc)
+            expires = min(expires, roll_at) if roll_at > now else now + self.retry_after
+        self._entries[symbol] = {"contract_id": contract_id, "expires": expires}
+
+    def valid(self, now: Optional[datetime] = None) -> Dict[str, str]:
+        """{symbol: contract id} for every unexpired entry"""
+        now = now or datetime.now(timezone.utc)
+        return {s: e["contract_id"] for s, e in self._entries.items() if e["expires"] > now}
+
+    def due(self, symbols, within: timedelta = timedelta(0), now: Optional[datetime] = None) -> List[str]:
+        """Symbols that are missing or expire within `within` (to refresh ahead of the roll)"""
+        cutoff = (now or datetime.now(timezone.utc)) + within
+        return [s for s in symbols if s not in self._entries or self._entries[s]["expires"] <= cutoff]
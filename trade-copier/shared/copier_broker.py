@@ -4,8 +4,14 @@ No dependencies on main bot - completely independent
 """
 
 import asyncio
+import inspect
 import logging
-from typing import Dict, Any, Optional
+from datetime import timedelta
+from typing import Dict, Optional
+
+from shared.contract_cache import ContractCache
+from shared.order_gateway import OrderGateway
+from shared.position_diff import SYMBOL_GROUPS, normalize_symbol
 
 logger = logging.getLogger(__name__)
 
@@ -16,53 +22,56 @@ class CopierBroker:
     Only needs: connect, place_market_order, get_positions
     """
     
-    def __init__(self, username: str, api_token: str):
+    # Contract ids are re-resolved this long before their roll date / expiry
+    CONTRACT_REFRESH_AHEAD = timedelta(days=1)
+    CONTRACT_REFRESH_INTERVAL = 3600.0  # seconds between background expiry checks
+    
+    def __init__(self, username: str, api_token: str, contract_cache: Optional[ContractCache] = None):
         self.username = username
         self.api_token = api_token
         self.connected = False
         self.sdk_client = None
         self.trading_suite = None
-        self._contract_cache: Dict[str, str] = {}
+        # Persistent symbol -> contract id map, warmed at connect so orders never wait on a lookup
+        self.contracts = contract_cache or ContractCache()
+        self._contract_lookups: Dict[str, asyncio.Task] = {}
+        self._contract_refresh_task: Optional[asyncio.Task] = None
+        self.gateway: Optional[OrderGateway] = None
         self.account_balance = 0.0
         self.all_accounts = []  # List of all accounts from list_accounts()
         
+        # Realtime position stream (user hub)
+        self.realtime_client = None
+        self.realtime_connected = False
+        self._live_positions: Dict[str, dict] = {}  # contract id (or symbol) -> position dict (get_positions() shape)
+        self._position_listener = None
+        self._position_event_seq = 0  # Bumped on every user-hub position event
+        self._reconcile_now: Optional[asyncio.Event] = None
+        self._watching = False
+        
+    @staticmethod
+    def _silence_sdk_loggers():
+        """Silence the SDK's loggers (children without their own level inherit the parents')"""
+        for name in ['project_x_py', 'project_x'] + [
+                n for n in logging.Logger.manager.loggerDict if 'project_x' in n.lower()]:
+            lg = logging.getLogger(name)
+            lg.setLevel(logging.CRITICAL + 100)
+            lg.propagate = False
+            lg.disabled = True
+            lg.handlers = []
+    
     async def connect(self) -> bool:
-        """Connect to TopStep broker. All SDK output is suppressed."""
-        import sys
+        """Connect to TopStep broker. SDK logging is silenced."""
         import io
-        
-        # Redirect stdout/stderr to suppress ALL SDK noise
-        old_stdout = sys.stdout
-        old_stderr = sys.stderr
-        sys.stdout = io.StringIO()
-        sys.stderr = io.StringIO()
+        from contextlib import redirect_stderr, redirect_stdout
         
         try:
-            import logging
-            
-            # Suppress SDK loggers
-            def suppress_sdk_logs():
-                for name in list(logging.Logger.manager.loggerDict.keys()):
-                    if 'project_x' in name.lower():
-                        lg = logging.getLogger(name)
-                        lg.setLevel(logging.CRITICAL + 100)
-                        lg.propagate = False
-                        lg.disabled = True
-                        lg.handlers = []
-                for prefix in ['project_x_py', 'project_x']:
-                    lg = logging.getLogger(prefix)
-                    lg.setLevel(logging.CRITICAL + 100)
-                    lg.propagate = False 
-                    lg.disabled = True
-                    lg.handlers = []
-            
-            suppress_sdk_logs()
+            self._silence_sdk_loggers()
             
-            # Import SDK
-            from project_x_py import ProjectX, ProjectXConfig, TradingSuite, TradingSuiteConfig
-            from project_x_py.realtime.core import ProjectXRealtimeClient
-            
-            suppress_sdk_logs()
+            # Import SDK - only the (synchronous) import prints banners; no other task runs while it is redirected
+            with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
+                from project_x_py import OrderSide, ProjectX, ProjectXConfig, TradingSuite, TradingSuiteConfig
+                from project_x_py.realtime.core import ProjectXRealtimeClient
             
             # Initialize and authenticate
             self.sdk_client = ProjectX(
@@ -70,11 +79,9 @@ class CopierBroker:
                 api_key=self.api_token,
                 config=ProjectXConfig()
             )
-            suppress_sdk_logs()
             
             await self.sdk_client.authenticate()
             await asyncio.sleep(0.3)
-            suppress_sdk_logs()
             
             # Get ALL accounts using list_accounts() - async method
             try:
@@ -84,11 +91,8 @@ class CopierBroker:
             
             # Get primary account for balance/id
             account = self.sdk_client.get_account_info()
-            suppress_sdk_logs()
             
             if not account:
-                sys.stdout = old_stdout
-                sys.stderr = old_stderr
                 return False
             
             self.account_balance = float(getattr(account, 'balance', getattr(account, 'equity', 0)))
@@ -97,40 +101,35 @@ class CopierBroker:
             # Create TradingSuite - required for order placement
             # Uses MES as default but can place orders on any symbol via contract_id
             jwt_token = self.sdk_client.get_session_token()
-            suppress_sdk_logs()
             
             if not jwt_token:
-                sys.stdout = old_stdout
-                sys.stderr = old_stderr
                 print("❌ CopierBroker connection failed: Could not get JWT token")
                 return False
                 
             if not self.account_id:
-                sys.stdout = old_stdout
-                sys.stderr = old_stderr
                 print("❌ CopierBroker connection failed: Could not get account ID")
                 return False
             
             # Create TradingSuite - will raise exception on failure
             realtime_client = ProjectXRealtimeClient(jwt_token=jwt_token, account_id=self.account_id)
-            suppress_sdk_logs()
+            self.realtime_client = realtime_client
             self.trading_suite = TradingSuite(
                 client=self.sdk_client,
                 realtime_client=realtime_client,
                 config=TradingSuiteConfig(instrument="MES")
             )
-            suppress_sdk_logs()
+            # Catch loggers the SDK created while connecting - once, not per call
+            self._silence_sdk_loggers()
             
             self.connected = True
             
-            # Restore output
-            sys.stdout = old_stdout
-            sys.stderr = old_stderr
+            # Order hot path: SDK methods, sides and contract ids bound once
+            self.gateway = OrderGateway(self.trading_suite.orders, OrderSide, self.get_contract_id)
+            await self.warm_contracts()
+            self._contract_refresh_task = asyncio.create_task(self._contract_refresh_loop())
             return True
             
         except Exception as e:
-            sys.stdout = old_stdout
-            sys.stderr = old_stderr
             print(f"❌ CopierBroker connection failed: {e}")
             import traceback
             traceback.print_exc()
@@ -138,62 +137,88 @@ class CopierBroker:
     
     async def disconnect(self):
         """Disconnect from broker."""
+        self.stop_watching()
+        if self._contract_refresh_task:
+            self._contract_refresh_task.cancel()
+            self._contract_refresh_task = None
+        if self.realtime_client and self.realtime_connected:
+            try:
+                await self.realtime_client.disconnect()
+            except Exception:
+                pass
+        self.realtime_connected = False
+        self.realtime_client = None
         self.connected = False
         self.sdk_client = None
         self.trading_suite = None
+        self.gateway = None
         
     async def get_contract_id(self, symbol: str) -> Optional[str]:
-        """Get contract ID for a symbol."""
-        if symbol in self._contract_cache:
-            return self._contract_cache[symbol]
-            
+        """Get contract ID for a symbol (cache hit after warm-up; REST only on a miss)."""
+        if symbol.upper().startswith("CON."):
+            return symbol  # Already a contract id (e.g. from get_positions)
+        contract_id = self.contracts.get(symbol)
+        if contract_id:
+            return contract_id
+        return await self._resolve_contract(symbol)
+    
+    async def _resolve_contract(self, symbol: str) -> Optional[str]:
+        """Look a symbol up over REST, sharing one request between concurrent callers"""
+        task = self._contract_lookups.get(symbol)
+        if task is None:
+            task = asyncio.ensure_future(self._search_contract(symbol))
+            self._contract_lookups[symbol] = task
+            task.add_done_callback(lambda t: self._contract_lookups.pop(symbol, None))
+        return await asyncio.shield(task)
+    
+    async def _search_contract(self, symbol: str) -> Optional[str]:
         try:
             instruments = await self.sdk_client.search_instruments(query=symbol)
             if instruments and len(instruments) > 0:
                 contract_id = getattr(instruments[0], 'id', None)
                 if contract_id:
-                    self._contract_cache[symbol] = contract_id
+                    self.contracts.put(symbol, contract_id)
+                    self.contracts.save()
                     return contract_id
         except:
             pass
         return None
     
+    async def warm_contracts(self, symbols=None, within: timedelta = timedelta(0)):
+        """Resolve every tradable symbol missing from (or expiring in) the cache, concurrently"""
+        due = self.contracts.due(symbols or SYMBOL_GROUPS.keys(), within)
+        if due and self.sdk_client:
+            results = await asyncio.gather(*(self._resolve_contract(s) for s in due))
+            missing = [s for s, contract_id in zip(due, results) if not contract_id]
+            logger.info(f"📇 Contract ids resolved: {len(due) - len(missing)}/{len(due)}"
+                        + (f" (not found: {', '.join(missing)})" if missing else ""))
+        if self.gateway:
+            # Expired ids drop out here; the gateway re-resolves them on demand
+            self.gateway.bind_contracts(self.contracts.valid())
+    
+    async def _contract_refresh_loop(self):
+        """Re-resolve contracts ahead of their roll so the order path keeps hitting the cache"""
+        while self.connected:
+            await asyncio.sleep(self.CONTRACT_REFRESH_INTERVAL)
+            try:
+                await self.warm_contracts(within=self.CONTRACT_REFRESH_AHEAD)
+            except Exception as e:
+                logger.error(f"Contract refresh error: {e}")
+    
     async def place_market_order(self, symbol: str, side: str, quantity: int) -> bool:
         """Place a market order using TradingSuite."""
         if not self.connected:
             logger.error("Broker not connected - call connect() first")
             print("❌ Broker not connected - call connect() first")
             return False
-        if not self.trading_suite:
+        if not self.gateway:
             logger.error("TradingSuite not initialized - broker connection incomplete")
             print("❌ TradingSuite not initialized - broker connection incomplete")
             return False
             
         try:
-            contract_id = await self.get_contract_id(symbol)
-            if not contract_id:
-                logger.error(f"Could not find contract for {symbol}")
-                return False
-            
-            # Import OrderSide enum
-            from project_x_py import OrderSide
-            order_side = OrderSide.BUY if side.upper() == "BUY" else OrderSide.SELL
-            
-            # Place order via TradingSuite (like main bot does)
-            order = await self.trading_suite.orders.place_market_order(
-                contract_id=contract_id,
-                side=order_side,
-                size=quantity
-            )
-            
-            # Check for success
-            if order:
-                if hasattr(order, 'success') and order.success:
-                    return True
-                elif hasattr(order, 'order') and order.order:
-                    return True
-            return False
-            
+            # Place order via TradingSuite (like main bot does), through the pre-bound gateway
+            return await self.gateway.market(symbol, side, quantity)
         except Exception as e:
             logger.error(f"Order error: {e}")
             return False
@@ -203,45 +228,41 @@ class CopierBroker:
         if not self.connected:
             logger.error("Broker not connected - call connect() first")
             return False
-        if not self.trading_suite:
+        if not self.gateway:
             logger.error("TradingSuite not initialized - broker connection incomplete")
             return False
             
         try:
-            contract_id = await self.get_contract_id(symbol)
-            if not contract_id:
-                return False
-                
-            from project_x_py import OrderSide
-            order_side = OrderSide.BUY if side.upper() == "BUY" else OrderSide.SELL
-            
-            order = await self.trading_suite.orders.place_stop_order(
-                contract_id=contract_id,
-                side=order_side,
-                size=quantity,
-                stop_price=stop_price
-            )
-            return order is not None
+            return await self.gateway.stop(symbol, side, quantity, stop_price)
         except Exception as e:
             logger.error(f"Stop order error: {e}")
             return False
     
     async def flatten_position(self, symbol: str) -> bool:
-        """Flatten position by closing with opposite order."""
+        """
+        Flatten position by closing with opposite order.
+        Signals carry the root symbol ('MES') while positions are contract ids, so both
+        are normalized; every contract month of the root is closed. 'ALL' closes everything.
+        """
         if not self.connected or not self.sdk_client:
             return False
             
         try:
-            # Get current position
+            root = normalize_symbol(symbol)
+            # Get current positions
             positions = await self.get_positions()
+            success = True
             for pos in positions:
-                if pos.get('symbol', '').upper() == symbol.upper():
-                    qty = pos.get('quantity', 0)
-                    if qty != 0:
-                        # Place opposite order to flatten
-                        side = "SELL" if qty > 0 else "BUY"
-                        return await self.place_market_order(symbol, side, abs(qty))
-            return True  # No position to flatten
+                qty = pos.get('quantity', 0)
+                if qty == 0:
+                    continue
+                if root != "ALL" and normalize_symbol(pos.get('symbol', '')) != root:
+                    continue
+                # Place opposite order on the contract actually held
+                side = "SELL" if qty > 0 else "BUY"
+                if not await self.place_market_order(pos['symbol'], side, abs(qty)):
+                    success = False
+            return success  # True also when there was no position to flatten
         except:
             return False
     
@@ -263,18 +284,16 @@ class CopierBroker:
                 size = getattr(pos, 'size', getattr(pos, 'quantity', 0))
                 is_long = getattr(pos, 'is_long', True)
                 
-                # Get symbol from contract info
-                symbol = getattr(pos, 'symbol', '')
-                if not symbol:
-                    # Try to get from contract_id
-                    contract_id = getattr(pos, 'contract_id', '')
-                    symbol = contract_id  # Use contract_id as fallback
+                # Get symbol from contract info, contract_id as fallback
+                contract_id = getattr(pos, 'contract_id', '') or getattr(pos, 'contractId', '')
+                symbol = getattr(pos, 'symbol', '') or contract_id
                 
                 if size != 0:
                     # Return signed quantity (positive for long, negative for short)
                     qty = int(size) if is_long else -int(size)
                     result.append({
                         'symbol': symbol,
+                        'contract_id': contract_id,
                         'quantity': qty,
                         'entry_price': getattr(pos, 'average_price', getattr(pos, 'avg_price', 0))
                     })
@@ -282,3 +301,166 @@ class CopierBroker:
         except Exception as e:
             logger.error(f"Get positions error: {e}")
             return []
+    
+    # ------------------------------------------------------------------
+    # Realtime position stream
+    # ------------------------------------------------------------------
+    
+    async def start_position_stream(self) -> bool:
+        """
+        Connect the user hub and subscribe to position/order/fill events.
+        Returns False (caller falls back to polling) if the realtime client is unavailable.
+        """
+        if self.realtime_connected:
+            return True
+        if not self.connected or not self.realtime_client:
+            return False
+        try:
+            self._reconcile_now = asyncio.Event()
+            await self.realtime_client.add_callback("position_update", self._on_position_event)
+            await self.realtime_client.add_callback("order_update", self._on_fill_event)
+            await self.realtime_client.add_callback("trade_execution", self._on_fill_event)
+            if not await self.realtime_client.connect():
+                return False
+            if not await self.realtime_client.subscribe_user_updates():
+                return False
+            self.realtime_connected = True
+            logger.info("⚡ Realtime position stream connected")
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ Realtime position stream unavailable, using polling: {e}")
+            return False
+    
+    @staticmethod
+    def _book_key(position: dict) -> str:
+        """Live book key: the contract id when known, so REST and stream entries for one instrument coincide"""
+        return position.get('contract_id') or position['symbol']
+    
+    @staticmethod
+    def _quantities(book: Dict[str, dict]) -> Dict[str, int]:
+        return {key: pos['quantity'] for key, pos in book.items()}
+    
+    def _set_live_position(self, position: dict):
+        key = self._book_key(position)
+        if position['quantity'] == 0:
+            self._live_positions.pop(key, None)
+        else:
+            self._live_positions[key] = position
+    
+    async def _on_position_event(self, data):
+        """User-hub position update: apply to the live book and notify the listener"""
+        payload = data.get('data', data) if isinstance(data, dict) else data
+        events = payload if isinstance(payload, list) else [payload]
+        changed = False
+        for event in events:
+            if not isinstance(event, dict):
+                continue
+            event = event.get('data', event)
+            contract_id = event.get('contractId') or event.get('contract_id') or ''
+            symbol = event.get('symbol') or contract_id
+            if not symbol:
+                continue
+            known = self._live_positions.get(contract_id or symbol)
+            if known and not event.get('symbol'):
+                symbol = known['symbol']  # Keep the symbol the REST book reported for this contract
+            size = int(event.get('size', 0) or 0)
+            # ProjectX position type: 1 = long, 2 = short
+            qty = -size if event.get('type') == 2 else size
+            self._set_live_position({
+                'symbol': symbol,
+                'contract_id': contract_id,
+                'quantity': qty,
+                'entry_price': event.get('averagePrice', event.get('average_price', 0))
+            })
+            changed = True
+        if changed:
+            self._position_event_seq += 1
+            await self._notify_positions()
+    
+    async def _on_fill_event(self, data):
+        """
+        Order fills normally arrive together with a position update; if none follows
+        shortly, ask the watcher for an immediate REST reconcile.
+        """
+        payload = data.get('data', data) if isinstance(data, dict) else data
+        if isinstance(payload, dict):
+            status = payload.get('status')
+            # Order updates: only filled orders (status 2) can move a position
+            if 'status' in payload and status not in (2, 'Filled', 'FILLED'):
+                return
+        # Don't sleep here: the SDK awaits callbacks in order, so waiting would hold back the position event
+        asyncio.get_running_loop().call_later(0.5, self._reconcile_if_no_position_event, self._position_event_seq)
+    
+    def _reconcile_if_no_position_event(self, seq: int):
+        if self._position_event_seq == seq and self._reconcile_now is not None:
+            self._reconcile_now.set()
+    
+    def position_snapshot(self) -> list:
+        """Current positions from the live book, same shape as get_positions()"""
+        return [dict(pos) for pos in self._live_positions.values()]
+    
+    async def _notify_positions(self):
+        if self._position_listener is None:
+            return
+        result = self._position_listener(self.position_snapshot())
+        if inspect.isawaitable(result):
+            await result
+    
+    async def _reconcile(self) -> bool:
+        """REST snapshot replaces the live book; returns True if any quantity differed"""
+        seq = self._position_event_seq
+        positions = await self.get_positions()
+        if self._position_event_seq != seq:
+            return False  # A stream event landed mid-request; the REST view may be older
+        fresh = {self._book_key(pos): pos for pos in positions}
+        changed = self._quantities(fresh) != self._quantities(self._live_positions)
+        self._live_positions = fresh
+        return changed
+    
+    async def watch_positions(self, on_positions, reconcile_interval: float = 5.0,
+                              poll_interval: float = 0.5):
+        """
+        Call `on_positions(list)` (sync or async) whenever the account's positions change,
+        until stop_watching().
+        
+        With the realtime stream, changes are pushed from user-hub events and REST is
+        only a reconciliation every `reconcile_interval` seconds (or right after a fill
+        that produced no position event). Without it, REST is polled every `poll_interval`.
+        """
+        self._watching = True
+        self._position_listener = on_positions
+        streaming = await self.start_position_stream()
+        interval = reconcile_interval if streaming else poll_interval
+        if not streaming:
+            logger.info(f"📡 Polling positions every {poll_interval}s")
+        
+        try:
+            # Initial state always comes from REST
+            self._live_positions = {self._book_key(pos): pos for pos in await self.get_positions()}
+            await self._notify_positions()
+            
+            while self._watching:
+                if streaming:
+                    try:
+                        await asyncio.wait_for(self._reconcile_now.wait(), timeout=interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    self._reconcile_now.clear()
+                else:
+                    await asyncio.sleep(interval)
+                if not self._watching:
+                    break
+                try:
+                    if await self._reconcile():
+                        if streaming:
+                            logger.warning("⚠️ Reconcile corrected positions missed by the stream")
+                        await self._notify_positions()
+                except Exception as e:
+                    logger.error(f"Position reconcile error: {e}")
+        finally:
+            self._position_listener = None
+    
+    def stop_watching(self):
+        self._watching = False
+        if self._reconcile_now is not None:
+            self._reconcile_now.set()
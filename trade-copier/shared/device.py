@@ -0,0 +1,25 @@
+"""
+Device Fingerprint - One id per machine and user for session locking
+The follower launcher validates the license and the signal receiver it starts
+keeps the session alive with heartbeats, so both must report the same device.
+"""
+
+import getpass
+import hashlib
+import platform
+import uuid
+
+
+def get_device_fingerprint() -> str:
+    """Generate unique device fingerprint for session locking."""
+    try:
+        machine_id = str(uuid.getnode())
+    except Exception:
+        machine_id = "unknown"
+    try:
+        username = getpass.getuser()
+    except Exception:
+        username = "unknown"
+    platform_name = platform.system()
+    fingerprint_raw = f"{machine_id}:{username}:{platform_name}"
+    return hashlib.sha256(fingerprint_raw.encode()).hexdigest()[:16]
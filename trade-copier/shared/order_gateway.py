@@ -0,0 +1,77 @@
+"""
+Order Gateway - Pre-bound order submission for the copy hot path
+Everything an order needs besides its arguments (the SDK order methods, the
+OrderSide enum values, resolved contract ids) is bound once when the broker
+connects, so submitting an order is two dict lookups and the broker call:
+no imports, no attribute walks, no logging on success.
+"""
+
+import logging
+from typing import Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class OrderGateway:
+    """Market/stop order fast path bound to one connected TradingSuite"""
+
+    def __init__(self, orders, order_side, resolve_contract: Callable[[str], Awaitable[Optional[str]]]):
+        """
+        Args:
+            orders: TradingSuite.orders (OrderManager)
+            order_side: The SDK's OrderSide enum
+            resolve_contract: Async symbol -> contract id lookup for symbols not bound yet
+        """
+        self._place_market = orders.place_market_order
+        self._place_stop = orders.place_stop_order
+        self._sides = {}
+        for name, value in (("BUY", order_side.BUY), ("SELL", order_side.SELL)):
+            for spelling in (name, name.lower(), name.capitalize()):
+                self._sides[spelling] = value
+        self._resolve_contract = resolve_contract
+        self._contract_ids: Dict[str, str] = {}
+
+    def bind_contracts(self, contracts: Dict[str, str]):
+        """Replace the bound {symbol: contract id} map (after warm-up / each refresh)"""
+        self._contract_ids = dict(contracts)
+
+    async def _bind(self, symbol: str) -> Optional[str]:
+        """Slow path: resolve a symbol that was not bound at connect and keep it"""
+        contract_id = await self._resolve_contract(symbol)
+        if not contract_id:
+            logger.error(f"Could not find contract for {symbol}")
+            return None
+        self._contract_ids[symbol] = contract_id
+        return contract_id
+
+    def _side(self, symbol: str, side: str, quantity: int):
+        """OrderSide for a valid side/size, else None"""
+        order_side = self._sides.get(side)
+        if order_side is None:
+            order_side = self._sides.get(str(side).upper())
+            if order_side is None:
+                logger.error(f"Invalid order side {side!r} for {symbol}")
+                return None
+        if quantity <= 0:
+            logger.error(f"Invalid order size {quantity} for {symbol}")
+            return None
+        return order_side
+
+    async def market(self, symbol: str, side: str, quantity: int) -> bool:
+        """Submit a market order; True if the broker accepted it"""
+        contract_id = self._contract_ids.get(symbol) or await self._bind(symbol)
+        order_side = self._side(symbol, side, quantity)
+        if contract_id is None or order_side is None:
+            return False
+        order = await self._place_market(contract_id=contract_id, side=order_side, size=quantity)
+        return bool(order) and bool(getattr(order, 'success', False) or getattr(order, 'order', None))
+
+    async def stop(self, symbol: str, side: str, quantity: int, stop_price: float) -> bool:
+        """Submit a stop order; True if the broker returned an order"""
+        contract_id = self._contract_ids.get(symbol) or await self._bind(symbol)
+        order_side = self._side(symbol, side, quantity)
+        if contract_id is None or order_side is None:
+            return False
+        order = await self._place_stop(contract_id=contract_id, side=order_side, size=quantity,
+                                       stop_price=stop_price)
+        return order is not None
@@ -0,0 +1,148 @@
+"""
+Order Gateway Harness - Submit-call overhead before the broker call
+Runs CopierBroker.place_market_order against a stubbed SDK whose order call
+returns immediately, so the timings are pure copier-side overhead per order:
+  direct   - awaiting the stub order call alone (floor)
+  gateway  - place_market_order through the pre-bound OrderGateway
+  legacy   - previous place_market_order (per-call import, side parsing, hasattr checks)
+
+Usage:
+    python shared/order_gateway_harness.py --orders 200000
+"""
+
+import argparse
+import asyncio
+import enum
+import os
+import sys
+import tempfile
+import time
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.contract_cache import ContractCache
+from shared.copier_broker import CopierBroker
+from shared.order_gateway import OrderGateway
+
+
+class OrderSide(enum.IntEnum):
+    BUY = 0
+    SELL = 1
+
+
+class _Response:
+    success = True
+    order = None
+
+
+class StubOrders:
+    """TradingSuite.orders stand-in: accepts every order without I/O"""
+
+    def __init__(self):
+        self.placed = 0
+
+    async def place_market_order(self, contract_id, side, size):
+        self.placed += 1
+        return _Response
+
+    async def place_stop_order(self, contract_id, side, size, stop_price):
+        self.placed += 1
+        return _Response
+
+
+def _install_stub_sdk():
+    """Make `from project_x_py import OrderSide` resolve for the legacy path"""
+    module = sys.modules.get('project_x_py') or types.ModuleType('project_x_py')
+    module.OrderSide = OrderSide
+    sys.modules['project_x_py'] = module
+
+
+async def legacy_place_market_order(broker, legacy_cache, symbol, side, quantity):
+    """Same body place_market_order had before the gateway"""
+    if not broker.connected:
+        return False
+    if not broker.trading_suite:
+        return False
+    try:
+        contract_id = legacy_cache.get(symbol)
+        if not contract_id:
+            return False
+        from project_x_py import OrderSide
+        order_side = OrderSide.BUY if side.upper() == "BUY" else OrderSide.SELL
+        order = await broker.trading_suite.orders.place_market_order(
+            contract_id=contract_id,
+            side=order_side,
+            size=quantity
+        )
+        if order:
+            if hasattr(order, 'success') and order.success:
+                return True
+            elif hasattr(order, 'order') and order.order:
+                return True
+        return False
+    except Exception:
+        return False
+
+
+def _broker(orders):
+    cache = ContractCache(os.path.join(tempfile.mkdtemp(), 'contract_cache.json'))
+    cache.put("MES", "CON.F.US.MES.Z99")
+    broker = CopierBroker("bench", "bench", contract_cache=cache)
+    broker.connected = True
+    broker.trading_suite = types.SimpleNamespace(orders=orders)
+    broker.gateway = OrderGateway(orders, OrderSide, broker.get_contract_id)
+    broker.gateway.bind_contracts(cache.valid())
+    return broker
+
+
+async def _time_per_call(make_call, orders):
+    await make_call(0)  # warm-up
+    start = time.perf_counter()
+    for i in range(orders):
+        await make_call(i)
+    return (time.perf_counter() - start) / orders * 1e9
+
+
+async def run(orders):
+    stub = StubOrders()
+    broker = _broker(stub)
+    legacy_cache = {"MES": "CON.F.US.MES.Z99"}
+    sides = ("BUY", "SELL")
+    enum_sides = (OrderSide.BUY, OrderSide.SELL)
+
+    ok = await broker.place_market_order("MES", "BUY", 1) and await broker.place_stop_order("MES", "SELL", 1, 100.0)
+    ok = ok and not await broker.place_market_order("MES", "HOLD", 1)
+    print(f"{'✅' if ok else '❌'} gateway accepts BUY/SELL and rejects invalid sides")
+    if not ok:
+        return None
+
+    return {
+        "direct": await _time_per_call(
+            lambda i: stub.place_market_order(contract_id="CON.F.US.MES.Z99", side=enum_sides[i & 1], size=1), orders),
+        "gateway": await _time_per_call(
+            lambda i: broker.place_market_order("MES", sides[i & 1], 1), orders),
+        "legacy": await _time_per_call(
+            lambda i: legacy_place_market_order(broker, legacy_cache, "MES", sides[i & 1], 1), orders),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=200000)
+    args = parser.parse_args()
+
+    _install_stub_sdk()
+    results = asyncio.run(run(args.orders))
+    if results is None:
+        return 1
+
+    print(f"Stubbed SDK, {args.orders} market orders each")
+    for name, ns in results.items():
+        overhead = "" if name == "direct" else f"  ({(ns - results['direct']) / 1000:+.2f} µs vs direct)"
+        print(f"  {name:<8} {ns / 1000:8.2f} µs/order{overhead}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,209 @@
+"""
+Position Diff - Turns broker position snapshots into copy signals
+Keeps one signed quantity per symbol (long > 0, short < 0) and, for each new
+snapshot, emits the net change for every symbol in a single pass:
+growing a position is OPEN, shrinking it is CLOSE, going flat is FLATTEN,
+and crossing zero (a reversal) is FLATTEN followed by OPEN of the new side.
+Broker contract ids (e.g. CON.F.US.MES.Z25) are normalized to the traded
+root symbol (MES) so every contract month of a symbol nets together.
+FillCoalescer optionally holds snapshots for a short window so partial
+fills of one order reach followers as a single signal.
+"""
+
+import asyncio
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from shared.signal_protocol import TradeSignal, create_open_signal, create_close_signal, create_flatten_signal
+
+
+# SYMBOL GROUPS - Micro contracts map to their full-size equivalents
+# (same table as the cloud API; key = symbol traded, value = base symbol)
+SYMBOL_GROUPS = {
+    # S&P 500 E-mini family
+    "ES": "ES",
+    "MES": "ES",
+    # Nasdaq E-mini family
+    "NQ": "NQ",
+    "MNQ": "NQ",
+    # Dow Jones E-mini family
+    "YM": "YM",
+    "MYM": "YM",
+    # Crude Oil family
+    "CL": "CL",
+    "MCL": "CL",
+    # Russell 2000 family
+    "RTY": "RTY",
+    "M2K": "RTY",
+}
+
+
+# Broker contract ids whose root is not the ticker (CON.F.US.EP.Z25 is the ES contract)
+CONTRACT_ROOTS = {
+    "EP": "ES",
+    "ENQ": "NQ",
+    "CLE": "CL",
+    "MCLE": "MCL",
+}
+
+
+_normalized: Dict[str, str] = {}
+
+
+def normalize_symbol(symbol: str) -> str:
+    """
+    Traded root symbol for a broker symbol or contract id.
+    'CON.F.US.MES.Z25' -> 'MES', 'CON.F.US.EP.Z25' -> 'ES', 'mnq' -> 'MNQ';
+    unknown formats are upper-cased as-is.
+    """
+    cached = _normalized.get(symbol)
+    if cached is not None:
+        return cached
+    root = (symbol or "").strip().upper()
+    if root.startswith("CON."):
+        parts = root.split(".")
+        # CON.F.US.<ROOT>.<MONTH>; older ids put the root last
+        candidates = [CONTRACT_ROOTS.get(part, part) for part in parts[1:]
+                      if part in SYMBOL_GROUPS or part in CONTRACT_ROOTS]
+        if candidates:
+            root = candidates[0]
+        elif len(parts) >= 4:
+            root = parts[3]  # Unknown product: still nets per root, just not warmed/grouped
+    _normalized[symbol] = root
+    return root
+
+
+def _side(quantity: int) -> str:
+    return "BUY" if quantity > 0 else "SELL"
+
+
+class PositionDiffEngine:
+    """Per-symbol signed-quantity book that diffs snapshots into TradeSignals"""
+
+    def __init__(self):
+        self.positions: Dict[str, int] = {}       # symbol -> signed quantity (never 0)
+        self.entry_prices: Dict[str, float] = {}  # symbol -> last reported average price
+
+    @staticmethod
+    def net_positions(broker_positions: Iterable[dict]) -> Tuple[Dict[str, int], Dict[str, float]]:
+        """Broker position dicts ({symbol, quantity, entry_price}) -> (net signed qty, entry price) per symbol"""
+        net: Dict[str, int] = {}
+        prices: Dict[str, float] = {}
+        for pos in broker_positions:
+            quantity = int(pos.get("quantity", 0) or 0)
+            if not quantity:
+                continue
+            symbol = normalize_symbol(pos.get("symbol", ""))
+            if not symbol:
+                continue
+            net[symbol] = net.get(symbol, 0) + quantity
+            prices[symbol] = float(pos.get("entry_price", 0) or 0)
+        return {s: q for s, q in net.items() if q}, prices
+
+    def reset(self, broker_positions: Iterable[dict]):
+        """Adopt a snapshot as the baseline without producing signals"""
+        self.positions, self.entry_prices = self.net_positions(broker_positions)
+
+    def update(self, broker_positions: Iterable[dict]) -> List[TradeSignal]:
+        """
+        Apply a new snapshot and return the signals that move a follower from the
+        previous book to this one. Reducing signals (FLATTEN/CLOSE) come first so
+        followers free margin before adding exposure.
+        """
+        current, prices = self.net_positions(broker_positions)
+        previous = self.positions
+        if current == previous:
+            self.entry_prices.update(prices)
+            return []
+
+        reducing: List[TradeSignal] = []
+        opening: List[TradeSignal] = []
+        for symbol in sorted(previous.keys() | current.keys()):
+            old = previous.get(symbol, 0)
+            new = current.get(symbol, 0)
+            if old == new:
+                continue
+            price = prices.get(symbol, self.entry_prices.get(symbol, 0.0))
+
+            if new == 0:
+                reducing.append(create_flatten_signal(symbol))
+            elif old == 0:
+                opening.append(create_open_signal(symbol, _side(new), abs(new), price))
+            elif (old > 0) != (new > 0):
+                # Reversal: flatten the old side, then open the new one
+                reducing.append(create_flatten_signal(symbol))
+                opening.append(create_open_signal(symbol, _side(new), abs(new), price))
+            elif abs(new) > abs(old):
+                opening.append(create_open_signal(symbol, _side(new), abs(new) - abs(old), price))
+            else:
+                # CLOSE carries the side of the position being reduced; followers send the opposite order
+                reducing.append(create_close_signal(symbol, _side(old), abs(old) - abs(new), price))
+
+        self.positions = current
+        self.entry_prices = {s: prices.get(s, self.entry_prices.get(s, 0.0)) for s in current}
+        return reducing + opening
+
+    def flattens(self, broker_positions: Iterable[dict]) -> bool:
+        """True if applying this snapshot would flatten or reverse any known symbol"""
+        current, _ = self.net_positions(broker_positions)
+        for symbol, old in self.positions.items():
+            new = current.get(symbol, 0)
+            if new == 0 or (old > 0) != (new > 0):
+                return True
+        return False
+
+
+class FillCoalescer:
+    """
+    Optional window in front of a PositionDiffEngine.
+    A changed snapshot starts a `window_seconds` timer; snapshots arriving meanwhile
+    replace it, and when the timer fires only the latest one is diffed - so a
+    partially filled order becomes one net signal per symbol instead of one per piece.
+    Snapshots that flatten or reverse a symbol skip the wait (pending changes are
+    included in that same diff). Must be used from a running asyncio loop.
+    """
+
+    def __init__(self, engine: PositionDiffEngine, emit: Callable[[List[TradeSignal]], None],
+                 window_seconds: float = 0.1):
+        """
+        Args:
+            engine: Diff engine holding the book followers were last sent
+            emit: Called with the signals of each diff (only when non-empty)
+            window_seconds: Coalescing window; 0 disables it (typical 0.05 - 0.25)
+        """
+        self.engine = engine
+        self.emit = emit
+        self.window_seconds = window_seconds
+        self._pending = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def reset(self, broker_positions: Iterable[dict]):
+        self._cancel()
+        self.engine.reset(broker_positions)
+
+    def submit(self, broker_positions: list):
+        """Feed a snapshot; signals are emitted now or when the window closes"""
+        if self.window_seconds <= 0 or self.engine.flattens(broker_positions):
+            self._cancel()
+            self._diff(broker_positions)
+            return
+        self._pending = broker_positions
+        if self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window_seconds, self.flush)
+
+    def flush(self):
+        """Diff the latest pending snapshot now"""
+        self._timer = None
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            self._diff(pending)
+
+    def _cancel(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._pending = None
+
+    def _diff(self, broker_positions):
+        signals = self.engine.update(broker_positions)
+        if signals:
+            self.emit(signals)
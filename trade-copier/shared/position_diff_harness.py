@@ -0,0 +1,243 @@
+"""
+Position Diff Harness - Detection cost per position tick
+Checks the diff engine on a few scripted scenarios (two symbols at once,
+reversal, partial close), the fill coalescing window, the broker's live book
+merging REST and stream entries for one contract, and a follower broker
+flattening its contract-id positions from an engine FLATTEN, then times
+PositionDiffEngine.update() per tick:
+  idle    - snapshot unchanged (the common case on every stream event/reconcile)
+  change  - one symbol's quantity moves every tick
+  legacy  - previous launcher check (first non-zero position only), for reference
+
+Usage:
+    python shared/position_diff_harness.py --symbols 4 --ticks 200000
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.contract_cache import ContractCache
+from shared.copier_broker import CopierBroker
+from shared.position_diff import FillCoalescer, PositionDiffEngine
+
+
+def _pos(symbol, quantity, price=100.0):
+    return {"symbol": symbol, "quantity": quantity, "entry_price": price}
+
+
+def _actions(signals):
+    return [(s.action, s.symbol, s.side, s.quantity) for s in signals]
+
+
+SCENARIOS = [
+    ("two symbols open together",
+     [], [_pos("CON.F.US.MES.Z25", 2), _pos("CON.F.US.MNQ.Z25", -1)],
+     [("OPEN", "MES", "BUY", 2), ("OPEN", "MNQ", "SELL", 1)]),
+    ("reversal long -> short",
+     [_pos("CON.F.US.MES.Z25", 2)], [_pos("CON.F.US.MES.Z25", -1)],
+     [("FLATTEN", "MES", "FLAT", 0), ("OPEN", "MES", "SELL", 1)]),
+    ("partial close + add on another symbol",
+     [_pos("MES", 3), _pos("MNQ", 1)], [_pos("MES", 1), _pos("MNQ", 2)],
+     [("CLOSE", "MES", "BUY", 2), ("OPEN", "MNQ", "BUY", 1)]),
+    ("contract months net together",
+     [_pos("CON.F.US.MES.Z25", 1)], [_pos("CON.F.US.MES.Z25", 1), _pos("CON.F.US.MES.H26", 1)],
+     [("OPEN", "MES", "BUY", 1)]),
+    ("broker roots that are not the ticker",
+     [], [_pos("CON.F.US.EP.Z25", 1), _pos("CON.F.US.ENQ.Z25", -1)],
+     [("OPEN", "ES", "BUY", 1), ("OPEN", "NQ", "SELL", 1)]),
+    ("everything flat",
+     [_pos("MES", 1), _pos("MNQ", -2)], [],
+     [("FLATTEN", "MES", "FLAT", 0), ("FLATTEN", "MNQ", "FLAT", 0)]),
+]
+
+
+def check_scenarios():
+    ok = True
+    for name, before, after, expected in SCENARIOS:
+        engine = PositionDiffEngine()
+        engine.reset(before)
+        got = _actions(engine.update(after))
+        if got != expected:
+            ok = False
+            print(f"❌ {name}: expected {expected}, got {got}")
+        else:
+            print(f"✅ {name}")
+    return ok
+
+
+async def _coalesce(window, steps):
+    """steps: [(delay_seconds, snapshot)]; returns [(ms since start, actions)] per emit"""
+    emitted = []
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    coalescer = FillCoalescer(PositionDiffEngine(),
+                              lambda signals: emitted.append((round((loop.time() - start) * 1000), _actions(signals))),
+                              window)
+    coalescer.reset([])
+    for delay, snapshot in steps:
+        await asyncio.sleep(delay)
+        coalescer.submit(snapshot)
+    await asyncio.sleep(window * 2)
+    return emitted
+
+
+def check_coalescing():
+    ok = True
+    # Three partial fills 20 ms apart inside a 100 ms window -> one OPEN of 3
+    fills = asyncio.run(_coalesce(0.1, [(0, [_pos("MES", 1)]), (0.02, [_pos("MES", 2)]), (0.02, [_pos("MES", 3)])]))
+    if [actions for _, actions in fills] != [[("OPEN", "MES", "BUY", 3)]]:
+        ok = False
+        print(f"❌ partial fills coalesce: {fills}")
+    else:
+        print(f"✅ partial fills coalesce (emitted at {fills[0][0]} ms)")
+    # Flatten while an add is still inside the window: the add is folded into an immediate FLATTEN
+    flat = asyncio.run(_coalesce(0.25, [(0, [_pos("MES", 2)]), (0.3, [_pos("MES", 3)]), (0.01, [])]))
+    expected = [[("OPEN", "MES", "BUY", 2)], [("FLATTEN", "MES", "FLAT", 0)]]
+    if [actions for _, actions in flat] != expected or flat[1][0] - 310 > 50:
+        ok = False
+        print(f"❌ flatten bypasses window: {flat}")
+    else:
+        print("✅ flatten bypasses window")
+    return ok
+
+
+def _follower(positions):
+    """Connected CopierBroker over a stubbed SDK; returns (broker, orders placed)"""
+    broker = CopierBroker("harness", "harness",
+                          contract_cache=ContractCache(os.path.join(tempfile.mkdtemp(), 'contract_cache.json')))
+    broker.connected = True
+    broker.sdk_client = object()
+    orders = []
+
+    async def get_positions():
+        return [dict(p) for p in positions]
+
+    async def place_market_order(symbol, side, quantity):
+        orders.append((symbol, side, quantity))
+        return True
+
+    broker.get_positions = get_positions
+    broker.place_market_order = place_market_order
+    return broker, orders
+
+
+async def _follow(master_before, master_after, follower_positions):
+    """Diff the master book and run the resulting FLATTENs on a follower"""
+    engine = PositionDiffEngine()
+    engine.reset(master_before)
+    broker, orders = _follower(follower_positions)
+    results = [await broker.flatten_position(s.symbol) for s in engine.update(master_after) if s.action == "FLATTEN"]
+    return results, orders
+
+
+def check_follower_flatten():
+    ok = True
+    cases = [
+        ("follower flattens contract-id position",
+         [_pos("CON.F.US.MES.Z25", 2)], [], [_pos("CON.F.US.MES.Z25", 1), _pos("CON.F.US.MNQ.Z25", -1)],
+         [("CON.F.US.MES.Z25", "SELL", 1)]),
+        ("follower flattens every month on reversal",
+         [_pos("CON.F.US.EP.Z25", -1)], [_pos("CON.F.US.EP.Z25", 1)],
+         [_pos("CON.F.US.EP.Z25", -2), _pos("CON.F.US.EP.H26", -1)],
+         [("CON.F.US.EP.Z25", "BUY", 2), ("CON.F.US.EP.H26", "BUY", 1)]),
+    ]
+    for name, before, after, follower_positions, expected in cases:
+        results, orders = asyncio.run(_follow(before, after, follower_positions))
+        if orders != expected or not all(results):
+            ok = False
+            print(f"❌ {name}: expected {expected}, got {orders} ({results})")
+        else:
+            print(f"✅ {name}")
+    return ok
+
+
+async def _stream(rest_positions, events):
+    """Load the live book from REST, then apply user-hub events; engine actions per event"""
+    broker, _ = _follower(rest_positions)
+    broker._live_positions = {broker._book_key(pos): pos for pos in await broker.get_positions()}
+    engine = PositionDiffEngine()
+    engine.reset(broker.position_snapshot())
+    actions = []
+    for event in events:
+        await broker._on_position_event(event)
+        actions.append(_actions(engine.update(broker.position_snapshot())))
+    return actions
+
+
+def check_stream_book():
+    rest = [dict(_pos("MES", 1), contract_id="CON.F.US.MES.Z25")]
+    events = [{"contractId": "CON.F.US.MES.Z25", "type": 1, "size": 2, "averagePrice": 100.0},
+              {"contractId": "CON.F.US.MES.Z25", "type": 1, "size": 0, "averagePrice": 0}]
+    expected = [[("OPEN", "MES", "BUY", 1)], [("FLATTEN", "MES", "FLAT", 0)]]
+    actions = asyncio.run(_stream(rest, events))
+    if actions != expected:
+        print(f"❌ stream events update the REST entry: expected {expected}, got {actions}")
+        return False
+    print("✅ stream events update the REST entry")
+    return True
+
+
+def legacy_check(state, positions):
+    """Same comparison the launcher used before the diff engine (single position only)"""
+    current = None
+    for pos in positions:
+        qty = pos.get('quantity', 0)
+        if qty != 0:
+            current = {'symbol': pos.get('symbol', ''), 'quantity': qty,
+                       'side': 'LONG' if qty > 0 else 'SHORT'}
+            break
+    changed = current != state[0]
+    state[0] = current
+    return changed
+
+
+def _time_per_tick(func, ticks):
+    func(0)  # warm-up
+    start = time.perf_counter()
+    for i in range(ticks):
+        func(i)
+    return (time.perf_counter() - start) / ticks * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--symbols', type=int, default=4)
+    parser.add_argument('--ticks', type=int, default=200000)
+    args = parser.parse_args()
+
+    if not (check_scenarios() and check_coalescing() and check_stream_book() and check_follower_flatten()):
+        return 1
+
+    roots = ["MES", "MNQ", "MYM", "MCL", "M2K", "ES", "NQ", "YM", "CL", "RTY"]
+    symbols = [f"CON.F.US.{roots[i % len(roots)]}.Z{25 + i // len(roots)}" for i in range(args.symbols)]
+    snapshot = [_pos(symbol, i + 1) for i, symbol in enumerate(symbols)]
+    # Alternate between two snapshots where the first symbol is 1 or 2 contracts
+    moved = [_pos(symbols[0], 2)] + snapshot[1:]
+    alternating = (snapshot, moved)
+
+    idle_engine = PositionDiffEngine()
+    idle_engine.reset(snapshot)
+    change_engine = PositionDiffEngine()
+    change_engine.reset(snapshot)
+    legacy_state = [None]
+
+    results = {
+        "idle": _time_per_tick(lambda i: idle_engine.update(snapshot), args.ticks),
+        "change": _time_per_tick(lambda i: change_engine.update(alternating[i & 1]), args.ticks),
+        "legacy": _time_per_tick(lambda i: legacy_check(legacy_state, snapshot), args.ticks),
+    }
+
+    print(f"Snapshot: {args.symbols} symbols, {args.ticks} ticks each")
+    for name, ns in results.items():
+        print(f"  {name:<7} {ns / 1000:8.2f} µs/tick")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())